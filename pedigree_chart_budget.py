@@ -0,0 +1,281 @@
+"""
+Budgets and pruning policies for expand_tree.
+A tree doubles every few generations, so a long run can use up all the memory.
+A budget stops the run before it does, when the tree reaches a number of people,
+the process reaches a memory ceiling or the run reaches a time limit.
+Pruning policies choose which unmarried people of each generation are expanded at all,
+and the budget reports what every generation pruned.
+"""
+
+import os
+import sys
+import time
+from heapq import nsmallest
+from pedigree_chart_classes import Couple, lineage_stream
+
+try:
+    import resource
+except ImportError:
+    # The memory of the process can't be measured on Windows.
+    resource = None
+
+# How many people are expanded between checks of the memory, as measuring it is slower than the others.
+MEMORY_CHECK_EVERY = 1000
+# Linux gives the memory the process is using now in this file, counted in pages.
+STATM = '/proc/self/statm'
+
+
+class Budget:
+    """
+    This class is used to limit an expand_tree run, and to record what it pruned.
+    Give it to expand_tree as budget. When a limit is reached, the person being expanded
+    is the last, everyone after them is left unmarried, and the run stops.
+    Methods are __init__, start, exceeded, prune, record.
+    """
+
+    def __init__(self, max_people=None, max_memory=None, max_seconds=None, policies=()):
+        """
+        Creates an instance of the Budget class.
+
+        Args:
+            max_people (int): The most descendants to hold in the tree.
+            max_memory (int): The most memory the process may use, in bytes.
+            max_seconds (float): The longest the run may take, in seconds.
+            policies (list): Pruning policies, applied in order to the unmarried people
+                of every generation before they are expanded. A policy takes a list of people
+                and returns the list of those to expand, such as legit_only or TopLineages(10).
+        """
+        if max_memory is not None and resource is None:
+            raise ValueError('The memory used can not be measured on this system.')
+        self.max_people = max_people
+        self.max_memory = max_memory
+        self.max_seconds = max_seconds
+        self.policies = list(policies)
+        self.reports = []  # One report for each generation.
+        self.stopped = None  # The limit that stopped the run, if one did.
+        self._pruned = {}
+        self._start = time.monotonic()
+
+    def start(self):
+        """
+        Starts the clock for the time limit.
+        """
+        self._start = time.monotonic()
+
+    def exceeded(self, people, count=0):
+        """
+        Checks whether a limit has been reached. Once one has, it stays reached.
+
+        Args:
+            people (int): The number of descendants in the tree.
+            count (int): How many people have been expanded in the generation,
+                so the memory is only measured every MEMORY_CHECK_EVERY people.
+
+        Returns:
+            bool: True if the run should stop.
+        """
+        if self.stopped is None:
+            if self.max_people is not None and people >= self.max_people:
+                self.stopped = 'people'
+            elif self.max_seconds is not None and time.monotonic() - self._start >= self.max_seconds:
+                self.stopped = 'time'
+            elif (self.max_memory is not None and count % MEMORY_CHECK_EVERY == 0
+                  and memory_used() >= self.max_memory):
+                self.stopped = 'memory'
+            if self.stopped is not None:
+                print('Budget reached:', self.stopped)
+        return self.stopped is not None
+
+    def prune(self, people):
+        """
+        Applies the pruning policies to the unmarried people of a generation.
+
+        Args:
+            people (list): The unmarried people of the generation.
+
+        Returns:
+            list: The people to expand, in the order they were given.
+        """
+        self._pruned = {}
+        for policy in self.policies:
+            kept = policy(people)
+            self._pruned[policy_name(policy)] = len(people) - len(kept)
+            people = kept
+        return people
+
+    def record(self, unmarried, expanded, born):
+        """
+        Records and prints what happened in a generation.
+
+        Args:
+            unmarried (int): The number of unmarried people at the start of the generation.
+            expanded (int): How many of them were expanded.
+            born (int): The number of children born in the generation.
+        """
+        report = {'generation': len(self.reports) + 1,
+                  'unmarried': unmarried,
+                  'pruned': self._pruned,
+                  'expanded': expanded,
+                  'born': born,
+                  'stopped': self.stopped}
+        self.reports.append(report)
+        for name, pruned in self._pruned.items():
+            print('Pruned by', name + ':', pruned)
+        if expanded < unmarried - sum(self._pruned.values()):
+            print('Left unexpanded:', unmarried - sum(self._pruned.values()) - expanded)
+
+
+class TopLineages:
+    """
+    This class is used to keep only the most senior lineages of each generation.
+    People are ranked by primogeniture: down from the first ancestor, legitimate marriages
+    come before illegitimate ones, earlier marriages before later ones
+    and older children before younger ones.
+    Methods are __init__, __call__.
+    """
+
+    def __init__(self, size):
+        """
+        Creates an instance of the TopLineages class.
+
+        Args:
+            size (int): The number of people to keep in each generation.
+        """
+        self.size = size
+        self.__name__ = 'top ' + str(size) + ' lineages'
+
+    def __call__(self, people):
+        kept = set(id(person) for person in nsmallest(self.size, people, key=primogeniture_key))
+        return [person for person in people if id(person) in kept]
+
+
+class RandomSample:
+    """
+    This class is used to keep a random sample of each generation.
+    Each kept person's children stand for the children of everyone like them who was dropped,
+    so every person is given a weight: 1 divided by the fraction kept, for each ancestor
+    who was sampled. Totals over the tree, each person counted by their weight,
+    estimate the totals over the tree that would have been generated without sampling.
+    Methods are __init__, __call__, weight.
+    """
+
+    def __init__(self, fraction):
+        """
+        Creates an instance of the RandomSample class.
+
+        Args:
+            fraction (float): The chance of each person being kept, between 0 and 1.
+        """
+        if not 0 < fraction <= 1:
+            raise ValueError('The fraction kept must be above 0 and no more than 1.')
+        self.fraction = fraction
+        self.weights = {}  # The weight of the children of every kept person, by ID.
+        self.__name__ = 'random sample of ' + str(fraction)
+
+    def __call__(self, people):
+        kept = []
+        for person in people:
+            # In a seeded run each person has their own stream, so the sample does not
+            # depend on who else is in the generation.
+            if lineage_stream(person, 'sample').random() < self.fraction:
+                self.weights[person.id] = self.weight(person) / self.fraction
+                kept.append(person)
+        return kept
+
+    def weight(self, person):
+        """
+        Returns the weight of a person, the number of people they stand for.
+
+        Args:
+            person (Descendant): The person.
+
+        Returns:
+            weight (float): The weight of their parent's children, or 1 for a first ancestor.
+        """
+        if not isinstance(person.parents, Couple):
+            return 1.0
+        parent = person.parents.partner1
+        if parent.id in self.weights:
+            return self.weights[parent.id]
+        return self.weight(parent)
+
+
+def legit_only(people):
+    """
+    Keeps only the people born to a legitimate marriage, and the first ancestors.
+
+    Args:
+        people (list): The unmarried people of a generation.
+
+    Returns:
+        list: The people to expand.
+    """
+    return [person for person in people
+            if not isinstance(person.parents, Couple) or person.parents.legit]
+
+
+def noble_only(people):
+    """
+    Keeps only the people of noble houses, so no Lowborn lines are expanded.
+
+    Args:
+        people (list): The unmarried people of a generation.
+
+    Returns:
+        list: The people to expand.
+    """
+    return [person for person in people if person.house != 'Lowborn']
+
+
+def primogeniture_key(person):
+    """
+    Returns the rank of a person's lineage, lower for more senior lines.
+
+    Args:
+        person (Descendant): The person.
+
+    Returns:
+        key (tuple): For each relationship from the first ancestor down:
+            whether it was illegitimate, its number and the person's place among its children.
+    """
+    key = []
+    while isinstance(person.parents, Couple):
+        couple = person.parents
+        key.append((couple.tag[0] == 'I', int(couple.tag[1:]), couple.kids.index(person)))
+        person = couple.partner1
+    key.reverse()
+    return tuple(key)
+
+
+def policy_name(policy):
+    """
+    Returns the name a policy is reported under.
+
+    Args:
+        policy (callable): The pruning policy.
+
+    Returns:
+        name (str): The name of the function, or the one the policy gave itself.
+    """
+    return getattr(policy, '__name__', type(policy).__name__)
+
+
+def memory_used():
+    """
+    Returns the memory the process is using now.
+    Where that can't be read, such as on macOS, it is the most memory the process has used so far,
+    so a budget that stopped for memory stops every later run in the same process at once.
+
+    Returns:
+        memory (int): The resident memory in bytes.
+    """
+    try:
+        with open(STATM) as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives kilobytes, macOS gives bytes.
+    if sys.platform == 'darwin':
+        return peak
+    return peak * 1024
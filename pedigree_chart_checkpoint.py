@@ -0,0 +1,171 @@
+"""
+Checkpoints for long expand_tree runs.
+A checkpoint file starts with the tree as it was when the run began, and every finished
+generation is appended to it: the new partners, relationships and children, the state of the
+random generators and the number of generations done. Only the new generation is written each
+time, so writing a checkpoint takes as long however big the tree already is.
+"""
+
+import os
+import pickle
+from pedigree_chart_csv import bio_row, load_rows, person_rows
+from pedigree_chart_expand_tree import FamilyTree, expand_generations
+from pedigree_chart_ids import peek_id, reserve_ids
+from pedigree_chart_random import get_state, set_state
+
+
+class Checkpoint:
+    """
+    This class is used to append the generations of a run to a checkpoint file.
+    Give it to expand_tree to write the checkpoint, and to resume_tree to carry on from it.
+    Methods are __init__, start, write_generation, stop, load.
+    """
+
+    def __init__(self, filename):
+        """
+        Creates an instance of the Checkpoint class.
+
+        Args:
+            filename (str): The name of the checkpoint file.
+        """
+        self.filename = filename
+        self.generation = 0  # The number of generations in the checkpoint.
+
+    def start(self, fam_dict, new_dict, max_gen, vectorized=False, budget=None):
+        """
+        Starts a new checkpoint file with the tree as it is before the run.
+
+        Args:
+            fam_dict (dict): The whole tree.
+            new_dict (dict): The unmarried people the run starts from.
+            max_gen (int): The number of generations the run will add.
+            vectorized (bool): Whether the run uses the NumPy sampler.
+            budget (Budget): The budget of the run, if it has one.
+        """
+        rows = []
+        for person in fam_dict.values():
+            rows.extend(person_rows(person))
+        self.generation = 0
+        record = {'max_gen': max_gen,
+                  'vectorized': vectorized,
+                  'budget': budget is not None}
+        self._write(record, rows, new_dict.keys(), 'wb')
+
+    def write_generation(self, people, kids):
+        """
+        Appends a finished generation to the checkpoint.
+
+        Args:
+            people (iterable): The people who were expanded in the generation.
+            kids (iterable): Their children, who are the unmarried people of the next generation.
+        """
+        rows = []
+        # The people themselves are already in the checkpoint, from when they were born.
+        for person in people:
+            rows.extend(person_rows(person)[1:])
+        kid_ids = []
+        for kid in kids:
+            rows.append(bio_row(kid))
+            kid_ids.append(kid.id)
+        self.generation = self.generation + 1
+        self._write({}, rows, kid_ids, 'ab')
+
+    def stop(self, reason, frontier):
+        """
+        Records that the budget of the run stopped it, so resume_tree does not carry on past it.
+
+        Args:
+            reason (str): The limit that stopped the run, as in Budget.stopped.
+            frontier (iterable): The IDs of the unmarried people the run would have expanded next.
+        """
+        self._write({'stopped': reason}, [], frontier, 'ab')
+
+    def _write(self, record, rows, frontier, mode):
+        """
+        Writes a record, with the state the run is in now, and makes sure it is on the disk.
+        """
+        record['generation'] = self.generation
+        # The rows are stored as text, as they would be in a CSV file.
+        record['rows'] = [[str(value) for value in row] for row in rows]
+        record['frontier'] = list(frontier)
+        record['state'] = get_state()
+        record['next_id'] = peek_id()
+        with open(self.filename, mode) as checkpoint_file:
+            pickle.dump(record, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+    def load(self):
+        """
+        Reads every complete record in the checkpoint file.
+        A record that was only partly written, because the run was stopped, is cut off the file.
+
+        Returns:
+            records (list): The records, oldest first.
+        """
+        records = []
+        with open(self.filename, 'r+b') as checkpoint_file:
+            end = 0
+            while True:
+                try:
+                    records.append(pickle.load(checkpoint_file))
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    break
+                end = checkpoint_file.tell()
+            checkpoint_file.truncate(end)
+        if len(records) > 0:
+            self.generation = records[-1]['generation']
+        return records
+
+
+def resume_tree(filename, workers=None, sink=None, keep=True, market=None, budget=None):
+    """
+    Carries on an expand_tree run from its checkpoint, without doing any finished generation again.
+    The tree is built from the rows in the checkpoint, and the random generators carry on
+    from where they were, so the result is the same as if the run had not been stopped.
+    A run that its budget stopped is only carried on with a new budget.
+
+    Args:
+        filename (str): The name of the checkpoint file.
+        workers (int): Number of processes to expand each generation with, as in expand_tree.
+        sink (CsvWriter): If given, every generation still to come is written to it, as in expand_tree.
+        keep (bool): If False, people are dropped once they have been written to the sink.
+        market (MarriageMarket): If given, partners are matched as in expand_tree. It should be given
+            if the run was started with one.
+        budget (Budget): If given, its limits and pruning policies apply to the rest of the run,
+            as in expand_tree. It should be given if the run was started with one.
+
+    Returns:
+        dict: A dictionary representing the finished family tree.
+    """
+    print('\nRESUMING FAMILY TREE:', filename)
+    checkpoint = Checkpoint(filename)
+    records = checkpoint.load()
+    if len(records) == 0:
+        raise ValueError(filename + ' does not have a checkpoint in it.')
+    fam_dict = {}
+    load_rows((row for record in records for row in record['rows']), fam_dict)
+    # The frontier is the unmarried people the run started from and the children of every generation,
+    # less those who have married since, so the rest of the tree does not have to be gone through.
+    frontier = {}
+    for record in records:
+        for person_id in record['frontier']:
+            frontier[person_id] = fam_dict[person_id]
+    fam_dict = FamilyTree(fam_dict, {person_id: person for person_id, person in frontier.items()
+                                     if len(person.marriages) == 0})
+    # The run carries on from the children of the last generation.
+    last = records[-1]
+    new_dict = {person_id: fam_dict[person_id] for person_id in last['frontier']}
+    set_state(last['state'])
+    reserve_ids(last['next_id'] - 1)
+    remaining = records[0]['max_gen'] - last['generation']
+    print('Generations done:', last['generation'], 'Generations left:', remaining)
+    if budget is None:
+        if last.get('stopped') is not None:
+            # The tree is given back as the budget left it.
+            print('The run was stopped by its budget:', last['stopped'])
+            remaining = 0
+        elif records[0].get('budget'):
+            print('The run was started with a budget, but is carried on without one.')
+    return expand_generations(fam_dict, new_dict, remaining, records[0]['vectorized'],
+                              workers, sink, keep, checkpoint, budget, market)
@@ -2,15 +2,52 @@
 Defines classes descendant and couple, and their methods.
 """
 
-from random import randint
+import math
+import random
+import sys
+from bisect import bisect_left
+from pedigree_chart_ids import next_id
+from pedigree_chart_names import pick_name
+from pedigree_chart_random import get_seed, numpy_stream, stream
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is only needed for the vectorized fertility sampler.
+    np = None
+
+#Crisis years are years in which a tradegy occured such as a plauge or civil war
+CRISIS_YEARS = [30,49,80,119,155,192, 250]
+# This is the percentage of people who die in the crisis years
+DEATH_PERCENT = [20,50,20,50,80,40, 100]
+
+# The chance of a legitimate marriage in any year, as randint(0,10) == 0.
+MARRIAGE_CHANCE = 1/11
+
+# Every age a person can live to, one for each value of randint(0,10000) in calculate_death,
+# sorted so the ages above a minimum can be found with a binary search.
+LIFESPANS = sorted(abs(int(-0.01397*draw + 113.00)) for draw in range(0, 10001))
+
+# The lineage key is the lineage path with a separator before every relationship tag and child's number,
+# such as '0/L1.0' for the first child of the first marriage of the initial node, so no two keys are the same.
+# Leaving the separators out gives the lineage path used in labels, '0L10'.
+TAG_SEPARATOR = '/'
+KID_SEPARATOR = '.'
 
 
 class Descendant:
     """
     This class is used to represent an individual.
-    Methods are __init__, generate_legit_marriage, generate_illegit_marriage
+    Methods are __init__, restore, gender, sexuality, death, label, generate_legit_marriage,
+    legit_marriage_years, generate_illegit_marriage, illegit_marriage_years, add_marriage,
+    add_birth_year, gave_birth_in
     """
 
+    # Slots instead of a __dict__ for each person, as trees hold millions of them.
+    # Gender and sexuality are packed into _flags: bit 0 is gender, bits 1-2 are sexuality.
+    __slots__ = ('id', '_flags', 'name', 'house', '_label', 'birth', '_death',
+                 'parents', 'marriages', 'birth_years', 'version')
+
     def __init__(self, birth, gender, parents, num):
         """
         Initialize a new instance of a Descendant.
@@ -22,97 +59,282 @@ class Descendant:
             num (int): The position in the birth order from relationship.
         """
 
-        self.gender = gender  # Gender is represented as an integer, 0 for male and 1 for female.
-        self.name = generate_name(gender)  # Assign the descendant a first name based on their gender.
+        # The lineage path picks the descendant's random stream, so it is only needed in a seeded run.
+        if get_seed() is None:
+            rng = random
+        else:
+            rng = stream(parents_key(parents, num), 'person')
+
+        self.id = next_id()  # The unique ID of the descendant.
+        # Counts the changes to the descendant's marriages, so exports can tell what needs writing again.
+        self.version = 0
+        # Only set for people read from files that use labels as IDs, or cut off from their parents,
+        # who keep their name followed by their lineage key.
+        self._label = None
+        self._flags = gender  # Gender is represented as an integer, 0 for male and 1 for female.
+        self.name = generate_name(gender, rng)  # Assign the descendant a first name based on their gender.
         self.birth = birth  # Record the year of the descendant's birth.
-        self.death = calculate_death(birth)  # Calculate the descendant's death year based on their birth year.
+        # The death year is calculated from the birth year the first time it is needed,
+        # so a whole generation can be drawn at once by assign_deaths.
+        self._death = None
         self.parents = parents  # If the descendant has parents, this should be a Couple. Otherwise, it should be a list of [0, 0, TRUE].
-        self.marriages = []  # Initialize an empty list to store the descendant's marriages.
+        # Partners have (Couple, sexuality, legit) instead, the relationship they married into.
+        # The descendant's marriages. Most people never marry, so they all share
+        # an empty tuple until add_marriage gives them a list.
+        self.marriages = ()
+        # Bitmap of the years in which the descendant gave birth,
+        # bit n is set if a child was born n years after the descendant's birth.
+        self.birth_years = 0
 
         try:
             # If the descendant has parents, they inherit their surname.
             self.house = parents.house
-            # Generate a unique ID for the descendant,
-            # based on their name, parents' ID, and position in birth order.
-            self.label = self.name + parents.label + str(num)
             # Set the descendant's sexuality to 0, representing heterosexual orientation.
             self.sexuality = 0
             # Assign a 5% chance of bisexuality or homosexuality,
             # otherwise keep the sexuality as heterosexual.
-            if randint(0, 99) < 10:
-                self.sexuality = randint(1, 2)
+            if rng.randint(0, 99) < 10:
+                self.sexuality = rng.randint(1, 2)
         except:
             # If the descendant is the initial node (i.e. has no ancestors),
             # generate a random surname.
-            self.house = generate_house(parents[2])
-            # Generate a unique ID for the descendant based on their name and a "0" placeholder
-            self.label = self.name + str(parents[0])
+            self.house = generate_house(parents[2], rng)
             # Set the descendant's sexuality based on the parent's value
             # (0 for heterosexual)
             self.sexuality = parents[1]
             self.death = 70
 
-    def generate_legit_marriage(self, marriage_age):
+    @classmethod
+    def restore(cls, person_id, name, house, gender, sexuality, birth, death, parents):
+        """
+        Creates a Descendant from stored values, for example a row of a CSV file.
+        Nothing is drawn at random and no name files are read.
+
+        Args:
+            person_id (int): The ID of the descendant.
+            name (str): The first name.
+            house (str): The surname.
+            gender (int): 0 for male, 1 for female.
+            sexuality (int): 0 for heterosexual, 1 for bisexual and 2 for homosexual.
+            birth (int): The birth year.
+            death (int): The death year.
+            parents (Couple or list): The marriage the descendant was born from, or a list as in __init__.
+
+        Returns:
+            person (Descendant): The descendant, without marriages.
+        """
+        person = cls.__new__(cls)
+        person.id = person_id
+        person._label = None
+        person._flags = gender | (sexuality << 1)
+        person.name = name
+        person.house = house
+        person.birth = birth
+        person._death = death
+        person.parents = parents
+        person.marriages = ()
+        person.birth_years = 0
+        person.version = 0
+        return person
+
+    @property
+    def gender(self):
+        """
+        The gender, 0 for male and 1 for female.
+        """
+        return self._flags & 1
+
+    @gender.setter
+    def gender(self, gender):
+        self._flags = (self._flags & ~1) | gender
+
+    @property
+    def sexuality(self):
+        """
+        The sexuality, 0 for heterosexual, 1 for bisexual and 2 for homosexual.
+        """
+        return self._flags >> 1
+
+    @sexuality.setter
+    def sexuality(self, sexuality):
+        self._flags = (self._flags & 1) | (sexuality << 1)
+
+    @property
+    def label(self):
+        """
+        The label of the descendant, their name followed by their lineage path.
+        It is worked out from the tree each time, so it is not stored with every person.
+        """
+        return self.name + lineage_path(self)
+
+    @label.setter
+    def label(self, label):
+        self._label = label
+
+    @property
+    def death(self):
+        """
+        The year of death, calculated from the birth year if it has not been drawn yet.
+        """
+        if self._death is None:
+            self._death = calculate_death(self.birth, lineage_stream(self, 'death'))
+        return self._death
+
+    @death.setter
+    def death(self, death):
+        self._death = death
+
+    def generate_legit_marriage(self, marriage_age, vectorized=False, market=None):
         """
         Generate legitimate marriages for the descendant, if possible
 
         Args:
             marriageAge (int): The age of Descendant when they can be married.
+            vectorized (bool): Use the NumPy sampler to generate the children.
+            market (MarriageMarket): If given, partners are matched from the unmarried people in it.
+        """
+        for _ in self.legit_marriage_years(marriage_age, vectorized, market):
+            pass
+
+    def legit_marriage_years(self, marriage_age, vectorized=False, market=None):
+        """
+        Generate legitimate marriages for the descendant one at a time, in order.
+        Yields the year of the next marriage, which is only made when the next year is asked for,
+        so a simulation can make each marriage when it gets to that year.
+
+        Args:
+            marriageAge (int): The age of Descendant when they can be married.
+            vectorized (bool): Use the NumPy sampler to generate the children.
+            market (MarriageMarket): If given, partners are matched from the unmarried people in it.
+
+        Yields:
+            year (int): The year of the next marriage.
         """
 
+        rng = lineage_stream(self, 'legit')
         legit = True  # Whether the children from this marriage will be legitimate.
         count_begin = marriage_age + self.birth
         i = 0  # Counter for the number of legitimate marriages the descendant has had.
+        # There is a 1 in 11 chance of marriage each year, so the years until the next marriage
+        # are drawn in one go from the geometric distribution, instead of one year at a time.
+        # A run of years with no marriage in it is gone through again until there is one,
+        # so the first marriage is always in those years: the years drawn wrap round them.
+        # Once someone has married, the later years of the run can bring more marriages.
+        # The next run starts when the last marriage ends, or the year after it began
+        # if the partner died that same year, so the runs always move on.
         while count_begin < self.death:
-            for year in range(count_begin, self.death):  # Each year the descendant is alive.
-                chance = randint(0, 10)
-                # If the descendant has never been married before,
-                # increase the chance of getting married.
-                # Otherwise, there is a 1 in 11 chance of marriage each year.
-                if ((self.marriages) == 0 and int(chance/2) == 1) or (chance == 0):
-                    # Assign a unique ID to the marriage, indicating it is legitimate.
-                    label = str('L') + str(i)
-                    # Generate an instance of the Couple class for this marriage.
-                    couple = generate_partnership(self, year, legit, label)
-                    count_begin = couple.end  # Update the start year for the next marriage.
-                    i = i + 1  # Increment the counter for legitimate marriages.
-
-
-    def generate_illegit_marriage(self, romance_age):
+            year = count_begin + years_until(MARRIAGE_CHANCE, rng) % (self.death - count_begin)
+            while year < self.death:
+                yield year
+                # Assign a unique ID to the marriage, indicating it is legitimate.
+                label = str('L') + str(i)
+                # Generate an instance of the Couple class for this marriage.
+                couple = generate_partnership(self, year, legit, label, vectorized, market)
+                # Update the start year for the next run of years.
+                count_begin = max(couple.end, year + 1)
+                i = i + 1  # Increment the counter for legitimate marriages.
+                year = year + 1 + years_until(MARRIAGE_CHANCE, rng)
+
+
+    def generate_illegit_marriage(self, romance_age, vectorized=False, market=None):
         """
         Generate illegitimate marriages for the descendant, if possible
 
         Args:
             reomanceAge (int): The age of the Descendant when they can enter a relationship.
+            vectorized (bool): Use the NumPy sampler to generate the children.
+            market (MarriageMarket): If given, partners are matched from the unmarried people in it.
         """
-        if (randint(0, 4) == 0 and self.gender == 0) or (randint(0, 15) == 0 and self.gender == 1) :
+        for _ in self.illegit_marriage_years(romance_age, vectorized, market):
+            pass
+
+    def illegit_marriage_years(self, romance_age, vectorized=False, market=None):
+        """
+        Generate illegitimate marriages for the descendant one at a time, in order.
+        Yields the year of the next relationship, which is only made when the next year is asked for.
+
+        Args:
+            reomanceAge (int): The age of the Descendant when they can enter a relationship.
+            vectorized (bool): Use the NumPy sampler to generate the children.
+            market (MarriageMarket): If given, partners are matched from the unmarried people in it.
+
+        Yields:
+            year (int): The year of the next relationship.
+        """
+        rng = lineage_stream(self, 'illegit')
+        if (rng.randint(0, 4) == 0 and self.gender == 0) or (rng.randint(0, 15) == 0 and self.gender == 1) :
             legit = False # The children born from this relationship are not legitimate
             i = 0 # Counter for the number of illegitimate marriages the descendant has had
             # Calculate the year descendant can begin entering relationships.
             count_begin = romance_age + self.birth
-            partner_count = randint(1,6)
-            while count_begin < self.death:
-                for year in range(count_begin, self.death):
-                    # Probility of entering a relationship is a function of
-                    # number of previous relationships and partner count.
-                    if randint(0,(30 - partner_count + len(self.marriages)))==0 and partner_count>0:
-                        # Assign a unique ID to the marriage, indicating it is illegitimate.
-                        label = str('I') + str(i)
-                        # Generate an instance of the Couple class for this marriage.
-                        generate_partnership(self, year, legit, label)
-                        i = i + 1# Increment the counter for illegitimate marriages.
-                        partner_count = partner_count - 1 # reduce partner_count by 1.
-                count_begin = self.death + 1
+            partner_count = rng.randint(1,6)
+            year = count_begin - 1
+            while partner_count > 0:
+                # Probility of entering a relationship is a function of
+                # number of previous relationships and partner count.
+                # It only changes when there is a relationship, so the years until the next one
+                # are drawn from the geometric distribution.
+                chance = 1 / (31 - partner_count + len(self.marriages))
+                year = year + 1 + years_until(chance, rng)
+                if year >= self.death:
+                    break
+                yield year
+                # Assign a unique ID to the marriage, indicating it is illegitimate.
+                label = str('I') + str(i)
+                # Generate an instance of the Couple class for this marriage.
+                generate_partnership(self, year, legit, label, vectorized, market)
+                i = i + 1# Increment the counter for illegitimate marriages.
+                partner_count = partner_count - 1 # reduce partner_count by 1.
+
+    def add_marriage(self, couple):
+        """
+        Add a relationship to the descendant's marriages.
+
+        Args:
+            couple (Couple): The relationship.
+        """
+        if not self.marriages:
+            self.marriages = [couple]
+        else:
+            self.marriages.append(couple)
+        self.version = self.version + 1
+
+    def add_birth_year(self, year):
+        """
+        Record that the descendant gave birth in a year.
+
+        Args:
+            year (int): The year a child was born.
+        """
+        # Nobody gives birth before they are born, so earlier years are not recorded.
+        if year >= self.birth:
+            self.birth_years |= 1 << (year - self.birth)
 
+    def gave_birth_in(self, year):
+        """
+        Check if the descendant already gave birth in a year.
+
+        Args:
+            year (int): The year to check.
+
+        Returns:
+            bool: True if a child was born to the descendant in that year.
+        """
+        if year < self.birth:
+            return False
+        return (self.birth_years >> (year - self.birth)) & 1 == 1
 
 
 class Couple:
     """
     This class is used to represent an relationship.
-    Methods are __init__, generate_children.
+    Methods are __init__, restore, label, add_kid, generate_children, generate_children_vectorized.
     """
 
-    def __init__(self, partner1, begin, legit, label):
+    __slots__ = ('id', 'partner1', 'partner2', 'tag', '_label', 'house', 'begin', 'end', 'kids', 'legit',
+                 'version')
+
+    def __init__(self, partner1, begin, legit, label, market=None):
         """
         Creates an instance of the Couple class.
 
@@ -120,38 +342,116 @@ class Couple:
             partner1 (Descendant): The first partner in the couple.
             begin (int): The beginning year of the relationship.
             legit (bool): The legitimacy of the relationship.
-            label (int): The ID of the relationship.
+            label (str): The tag of the relationship, 'L' or 'I' followed by its number.
+            market (MarriageMarket): If given, the partner is matched from the unmarried people in it,
+                and only made up if nobody suits.
 
         Attributes:
+            id (int): The unique ID of the relationship.
             partner1 (Descendant): The first partner in the couple.
-            label (str): The ID of the relationship, a set of numbers with 'I' and 'L' throughout.
-            partner2 (Descendant): The second partner in the couple.
+            tag (str): The tag of the relationship among partner1's relationships.
+            partner2 (Descendant): The second partner in the couple, who married into the tree,
+                or a descendant matched by the marriage market.
             house (str): The house of the couple.
             begin (int): The beginning year of the relationship.
             end (int): The end year of the relationship.
             kids (list): A list of children born from the relationship.
             legit (bool): The legitimacy of the relationship.
         """
+        # The ID comes before the partner's and children's, so the IDs follow the order they are made in.
+        self.id = next_id()
         # partner1 is the descendant in the family tree.
         self.partner1 = partner1
-        # The id of this relationship should be a set of numbers with I and L throughout.
-        self.label = partner1.label.split(partner1.name)[1] + str(label)
-        # Generate the partner of this relationship.
-        self.partner2 = generate_partner(partner1, begin, self.label, legit)
-        # If father is a commoner or mother is a commoner, surname is fathers.
-        if (partner1.gender == 0 and partner1.house != 'Lowborn') or (self.partner2.house == 'Lowborn'):
-            self.house = partner1.house
-        else:
-            self.house = self.partner2.house
+        # The label of this relationship is partner1's lineage path followed by the tag.
+        self.tag = sys.intern(str(label))
+        self._label = None  # Only set for relationships read from files that use labels as IDs.
+        rng = lineage_stream(self, 'couple')
+        # Generate the partner of this relationship, unless someone in the tree can be matched.
+        self.partner2 = None
+        if market is not None:
+            self.partner2 = market.match(partner1, begin, legit, rng)
+        if self.partner2 is None:
+            self.partner2 = generate_partner(partner1, begin, self, legit, rng)
+        self.house = calculate_house(partner1, self.partner2)
         self.begin = begin # Year of the start of relationship.
-        self.end = calculate_end(partner1, self.partner2, begin, legit) # end of relationship
-        self.kids = [] # List of kids born from relationship.
+        self.end = calculate_end(partner1, self.partner2, begin, legit, rng) # end of relationship
+        self.kids = () # Kids born from relationship, shared empty tuple until the first is added.
+        self.version = 0 # Counts the changes to kids, so exports can tell what needs writing again.
         self.legit = legit # Legitamacy of relationship.
 
-    def generate_children(self):
+    @classmethod
+    def restore(cls, couple_id, partner1, partner2, begin, end, legit, tag):
+        """
+        Creates a Couple from stored values, for example a row of a CSV file.
+        Nothing is drawn at random, and the partners' marriages are not changed.
+
+        Args:
+            couple_id (int): The ID of the relationship.
+            partner1 (Descendant): The partner who is a descendant in the tree.
+            partner2 (Descendant): The partner who married into the tree.
+            begin (int): The beginning year of the relationship.
+            end (int): The end year of the relationship.
+            legit (bool): The legitimacy of the relationship.
+            tag (str): 'L' or 'I' followed by the number of the relationship.
+
+        Returns:
+            couple (Couple): The relationship, without children.
+        """
+        couple = cls.__new__(cls)
+        couple.id = couple_id
+        couple.partner1 = partner1
+        couple.partner2 = partner2
+        couple.tag = sys.intern(tag)
+        couple._label = None
+        couple.house = calculate_house(partner1, partner2)
+        couple.begin = begin
+        couple.end = end
+        couple.kids = ()
+        couple.legit = legit
+        couple.version = 0
+        return couple
+
+    @property
+    def label(self):
+        """
+        The label of the relationship, a set of numbers with 'I' and 'L' throughout.
+        It is worked out from the tree each time, so it is not stored with every relationship.
+        """
+        if self._label is not None:
+            return self._label
+        return path_of(lineage_key(self))
+
+    @label.setter
+    def label(self, label):
+        self._label = label
+
+    def add_kid(self, kid):
+        """
+        Add a child to the couple, and record the birth year for the mother.
+
+        Args:
+            kid (Descendant): The child born from the relationship.
+        """
+        if not self.kids:
+            self.kids = [kid]
+        else:
+            self.kids.append(kid)
+        self.version = self.version + 1
+        for partner in (self.partner1, self.partner2):
+            if partner.gender == 1:
+                partner.add_birth_year(kid.birth)
+
+    def generate_children(self, vectorized=False):
         """
         Generates children for the couple.
+
+        Args:
+            vectorized (bool): Use the NumPy sampler instead of drawing year by year.
         """
+        if vectorized:
+            self.generate_children_vectorized()
+            return
+        rng = lineage_stream(self, 'kids')
         if self.partner1.gender != self.partner2.gender: #if this is a opposite-sex  relationship
             i = 0 # this is how many children have been born from this relationship
             #define which partner is mother and father
@@ -168,65 +468,241 @@ class Couple:
                 else:
                     prob = -3.1943*(year-wife.birth) + 126.97
                 # for years in which mother already has a child, her fertility is 0.
-                for couple in wife.marriages:
-                    for kid in couple.kids:
-                        if kid.birth == year:
-                            prob = 0
-                threshold = randint(0,99)
+                if wife.gave_birth_in(year):
+                    prob = 0
+                threshold = rng.randint(0,99)
                 if prob > threshold:
                     birth = year
                     # A new instance of descendant is created.
                     # Added to list of kids born from this relationship.
-                    self.kids.append( Descendant(birth, randint(0,1), self, i) )
+                    self.add_kid( Descendant(birth, rng.randint(0,1), self, i) )
                     i = i + 1 # number of kids increments by 1
-                    if randint(0,99) < 4: # 5% probility of having twins
-                        self.kids.append( Descendant(birth, randint(0,1), self, i) )
+                    if rng.randint(0,99) < 4: # 5% probility of having twins
+                        self.add_kid( Descendant(birth, rng.randint(0,1), self, i) )
                         i = i + 1
-                    elif randint(0,9999) == 0: # 1 in 10000 probility of having triplets
-                        self.kids.append( Descendant(birth, randint(0,1), self, i) )
+                    elif rng.randint(0,9999) == 0: # 1 in 10000 probility of having triplets
+                        self.add_kid( Descendant(birth, rng.randint(0,1), self, i) )
                         i = i + 1
-                        self.kids.append( Descendant(birth, randint(0,1), self, i) )
+                        self.add_kid( Descendant(birth, rng.randint(0,1), self, i) )
                         i = i + 1
 
 
-def generate_name(gender):
+    def generate_children_vectorized(self):
+        """
+        Generates children for the couple, drawing every year of the relationship at once.
+        The children follow the same distribution as generate_children.
+        """
+        if np is None:
+            raise ImportError('NumPy is needed to generate children vectorized.')
+        if self.partner1.gender == self.partner2.gender or self.end <= self.begin:
+            return
+        if self.partner1.gender == 0:
+            wife = self.partner2
+        else:
+            wife = self.partner1
+        size = self.end - self.begin
+        # Chance of a birth for every year of the relationship,
+        # which is dependent on legitamcy of relationship and age of mother.
+        chance = fertility_chance(self.legit, self.begin - wife.birth, size)
+        # For years in which mother already has a child, her fertility is 0.
+        if wife.birth_years != 0:
+            chance[birth_year_mask(wife, self.begin, size)] = 0
+        # Draw every year in one go. Rows are uniform draws for:
+        # birth, twins (4 in 100), triplets (1 in 10000) and the gender of up to three kids.
+        draws = numpy_stream(lineage_stream(self, 'kids')).random((6, size))
+        born = np.flatnonzero(draws[0] < chance)
+        if len(born) == 0:
+            return
+        twins = draws[1, born] < 0.04
+        triplets = ~twins & (draws[2, born] < 0.0001)
+        counts = (1 + twins + 2*triplets).tolist()
+        genders = (draws[3:, born] >= 0.5).T.tolist()
+        # Only now create the children, in order of birth.
+        i = 0 # this is how many children have been born from this relationship
+        for offset, count, gender in zip(born.tolist(), counts, genders):
+            for k in range(count):
+                self.add_kid( Descendant(self.begin + offset, int(gender[k]), self, i) )
+                i = i + 1
+
+
+def fertility_chance(legit, age, size):
+    '''
+    Calculates the chance of a birth for each year, from the linear fertility curve
+
+            Args:
+                    legit (bool): legitamacy of relationship
+                    age (int): age of the mother in the first year
+                    size (int): the number of years
+            Returns:
+                    chance (numpy.ndarray): the chance of a birth in each year, from 0 to 1
+    '''
+    ages = np.arange(age, age + size)
+    if legit:
+        prob = -3.1943*ages + 136.97
+    else:
+        prob = -3.1943*ages + 126.97
+    # generate_children has a birth when prob > randint(0,99),
+    # which happens for ceil(prob) of the 100 possible thresholds.
+    return np.clip(np.ceil(prob), 0, 100) / 100
+
+
+def lineage_path(person):
+    '''
+    Returns the lineage path of a person, which is their label without their name
+
+            Args:
+                    person (Descendant): the person
+            Returns:
+                    path (str): the lineage path
+    '''
+    return path_of(lineage_key(person))
+
+
+def path_of(key):
+    '''
+    Returns the lineage path a lineage key is written as in labels, without the separators
+
+            Args:
+                    key (str): the lineage key
+            Returns:
+                    path (str): the lineage path
+    '''
+    return key.replace(TAG_SEPARATOR, '').replace(KID_SEPARATOR, '')
+
+
+def lineage_key(owner):
+    '''
+    Returns the lineage key of a person or relationship, which seeds their random streams
+
+            Args:
+                    owner (Descendant or Couple): the person or relationship
+            Returns:
+                    key (str): the lineage key
+    '''
+    if isinstance(owner, Couple):
+        if owner._label is not None:
+            return owner._label
+        return lineage_key(owner.partner1) + TAG_SEPARATOR + owner.tag
+    if owner._label is not None:
+        # Labels read from files have no separators, and are used as they are.
+        return owner._label[len(owner.name):]
+    parents = owner.parents
+    if isinstance(parents, Couple):
+        # Children are numbered by their position in the birth order.
+        return parents_key(parents, parents.kids.index(owner))
+    return parents_key(parents, None)
+
+
+def parents_key(parents, num):
+    '''
+    Returns the lineage key of a person from who they descend from
+
+            Args:
+                    parents (Couple or list): the parents of the person
+                    num (int): the position of the person in the birth order
+            Returns:
+                    key (str): the lineage key
+    '''
+    if isinstance(parents, Couple):
+        return lineage_key(parents) + KID_SEPARATOR + str(num)
+    # Partners take the key of the relationship they married into.
+    if isinstance(parents[0], Couple):
+        return lineage_key(parents[0])
+    # The initial node has the key 0.
+    return str(parents[0])
+
+
+def lineage_stream(owner, purpose):
+    '''
+    Returns the random stream of a person or relationship, only working out their path in a seeded run
+
+            Args:
+                    owner (Descendant or Couple): the person or relationship
+                    purpose (str): what the stream is used for
+            Returns:
+                    rng (random.Random or module): the stream
+    '''
+    if get_seed() is None:
+        return random
+    return stream(lineage_key(owner), purpose)
+
+
+def birth_year_mask(mother, begin, size):
+    '''
+    Unpacks the birth years of a mother into a boolean array
+
+            Args:
+                    mother (Descendant): the mother
+                    begin (int): the first year of the array
+                    size (int): the number of years in the array
+            Returns:
+                    mask (numpy.ndarray): True for years the mother gave birth in
+    '''
+    offset = begin - mother.birth
+    if offset >= 0:
+        bits = mother.birth_years >> offset
+    else:
+        bits = mother.birth_years << -offset
+    bits = bits & ((1 << size) - 1)
+    packed = np.frombuffer(bits.to_bytes((size+7)//8, 'little'), dtype=np.uint8)
+    return np.unpackbits(packed, bitorder='little')[:size].astype(bool)
+
+
+def generate_name(gender, rng=random):
     '''
     Generates the first name
 
             Args:
                     gender (int): 0 for male, 1 for female
+                    rng (random.Random): the random stream to draw from
 
             Returns:
                     name (str): first name
     '''
     # Pick a name from these csv's depending on gender
     if gender == 0:
-        name = read_name('Fantasymalename.txt')
+        name = read_name('Fantasymalename.txt', rng)
     else:
-        name = read_name('Fantasyfemalename.txt')
+        name = read_name('Fantasyfemalename.txt', rng)
     return name
 
 
-def generate_house(legit):
+def generate_house(legit, rng=random):
     '''
     Generates surname
 
             Args:
                     legit (bool): legitamacy of relationship
+                    rng (random.Random): the random stream to draw from
 
             Returns:
                     name (str): the surname
     '''
     #if the marriage is legit, or 50%, surname is a noblilty one
-    if legit or randint(0,1) == 0:
-        name = read_name('Fantasyhousename.txt')
+    if legit or rng.randint(0,1) == 0:
+        name = read_name('Fantasyhousename.txt', rng)
     else:
         #person is a commoner
         name = 'Lowborn'
     return name
 
 
-def generate_partnership(descendant, begin, legit, label):
+def years_until(chance, rng=random):
+    '''
+    Draws the number of years that go by before an event with the same chance every year.
+    The number is geometric, P(k) = (1 - chance)**k * chance, as if each year were drawn in turn.
+
+            Args:
+                    chance (float): the chance of the event in any one year, below 1
+                    rng (random.Random): the random stream to draw from
+            Returns:
+                    years (int): the number of years without the event, 0 if it happens in the first
+    '''
+    # 1 - random() is never 0, so the logarithm is always defined.
+    return int(math.log(1.0 - rng.random()) / math.log(1.0 - chance))
+
+
+def generate_partnership(descendant, begin, legit, label, vectorized=False, market=None):
     '''
     Collates information to create an instnce of a Couple class with children
 
@@ -235,73 +711,159 @@ def generate_partnership(descendant, begin, legit, label):
                     begin (int): year relationship begins
                     legit (bool): legitamacy of relationship
                     ID (str): unique ID of relationship
+                    vectorized (bool): use the NumPy sampler to generate the children
+                    market (MarriageMarket): if given, the partner is matched from the people in it
             Returns:
                     couple (instance of Couple class): the relationship descendant belongs to
     '''
-    couple = Couple(descendant, begin, legit, label)
-    descendant.marriages.append(couple) # Add this relationship to descendants marriages
-    couple.partner2.marriages.append(couple) # Add this relationship to partners marriages
-    couple.generate_children() # generate children for couple
+    couple = Couple(descendant, begin, legit, label, market)
+    descendant.add_marriage(couple) # Add this relationship to descendants marriages
+    couple.partner2.add_marriage(couple) # Add this relationship to partners marriages
+    couple.generate_children(vectorized) # generate children for couple
     return couple
 
 
-def calculate_death(birth):
+def calculate_house(partner1, partner2):
+    '''
+    Returns the house of a relationship, which its children inherit
+
+            Args:
+                    partner1 (Descendant): the partner who is in the tree
+                    partner2 (Descendant): the partner who married into the tree
+            Returns:
+                    house (str): the house of the relationship
+    '''
+    # If father is a commoner or mother is a commoner, surname is fathers.
+    if (partner1.gender == 0 and partner1.house != 'Lowborn') or (partner2.house == 'Lowborn'):
+        return partner1.house
+    return partner2.house
+
+
+def calculate_death(birth, rng=random):
     '''
     Calculates the year of death
 
             Args:
                     birth (int): the year of birth
+                    rng (random.Random): the random stream to draw from
             Returns:
                     death (int): the year of death
     '''
-    #Crisis years are years in which a tradegy occured such as a plauge or civil war
-    crisis_years = [30,49,80,119,155,192, 250]
-    # This is the percentage of people who die in the crisis years
-    death_percent = [20,50,20,50,80,40, 100]
-    age = abs(int(-0.01397*(randint(0,10000)) + 113.00)) # This is the age that they live to
+    age = abs(int(-0.01397*(rng.randint(0,10000)) + 113.00)) # This is the age that they live to
     death = birth + age # Year of death is birth year and age
     #if you are alive during one of the crisis years, there is a chance you dire in those years.
-    for year, percent in zip(crisis_years, death_percent):
+    for year, percent in zip(CRISIS_YEARS, DEATH_PERCENT):
         if birth < year < death :
-            if randint(0,99) < percent:
+            if rng.randint(0,99) < percent:
                 death = year
     return int(death)
 
 
-def generate_partner(descendant, begin, label, legit):
+def sample_deaths(births):
+    '''
+    Calculates the year of death for many people at once
+
+            Args:
+                    births (list): the year of birth of each person
+            Returns:
+                    deaths (list): the year of death of each person, as calculate_death would give
+    '''
+    if np is None:
+        return [calculate_death(birth) for birth in births]
+    births = np.asarray(births, dtype=np.int64)
+    rng = numpy_stream(random)
+    # Draw the age that everyone lives to in one go.
+    draws = rng.integers(0, 10001, len(births))
+    deaths = births + np.abs(np.trunc(-0.01397*draws + 113.00)).astype(np.int64)
+    # Go through the crisis years in order, as a death in one stops the later ones applying.
+    for year, percent in zip(CRISIS_YEARS, DEATH_PERCENT):
+        hit = (births < year) & (year < deaths) & (rng.integers(0, 100, len(births)) < percent)
+        deaths = np.where(hit, year, deaths)
+    return deaths.tolist()
+
+
+def assign_deaths(people):
+    '''
+    Draws the year of death for everyone who does not have one yet, in one batch
+
+            Args:
+                    people (iterable): instances of Descendant class
+    '''
+    pending = [person for person in people if person._death is None]
+    if get_seed() is not None:
+        # In a seeded run each death comes from the person's own stream,
+        # so it does not depend on who else is in the batch.
+        for person in pending:
+            person._death = calculate_death(person.birth, lineage_stream(person, 'death'))
+        return
+    deaths = sample_deaths([person.birth for person in pending])
+    for person, death in zip(pending, deaths):
+        person._death = death
+
+
+def sample_death_after(birth, begin, rng=random):
+    '''
+    Calculates the year of death of someone known to be alive in the year begin,
+    drawn from calculate_death's distribution conditioned on death >= begin
+
+            Args:
+                    birth (int): the year of birth
+                    begin (int): the year the person must be alive in
+                    rng (random.Random): the random stream to draw from
+            Returns:
+                    death (int): the year of death, or None if nobody born then could live that long
+    '''
+    # Only the ages that reach begin are possible, each is as likely as before.
+    first = bisect_left(LIFESPANS, begin - birth)
+    if first == len(LIFESPANS):
+        return None
+    death = birth + LIFESPANS[rng.randint(first, len(LIFESPANS)-1)]
+    for year, percent in zip(CRISIS_YEARS, DEATH_PERCENT):
+        if birth < year < begin:
+            # They are known to have survived the crisis years before begin.
+            if percent == 100:
+                return None
+        elif birth < year < death:
+            if rng.randint(0,99) < percent:
+                death = year
+    return int(death)
+
+
+def generate_partner(descendant, begin, couple, legit, rng=random):
     '''
     Generates a partner for descendant
 
             Args:
                     descendant (Descendant): person in tree
                     begin (int): year relationship begins
-                    label (str): unique ID of relationship
+                    couple (Couple): the relationship the partner marries into
                     legit (bool): legitamacy of relationship
+                    rng (random.Random): the random stream of the relationship
             Returns:
                     partner (Descendant): the newly generated partner for the descendant
     '''
-    gender = calculate_gender(descendant, legit)
-    birth = calculate_birth(begin, descendant)
+    gender = calculate_gender(descendant, legit, rng)
+    birth = calculate_birth(begin, descendant, rng)
     # Create an instance of descendant for the partner.
-    partner = Descendant(birth, gender, [label, descendant.sexuality, legit], None )
-    i = 0 # This is the number of attempts to calculate year of death for the partner.
+    partner = Descendant(birth, gender, (couple, descendant.sexuality, legit), None )
     # If the calculated death of partner is before the beginning year of the relationship,
-    while partner.death < begin:
-        # Recalculate the partner death.
-        partner.death = calculate_death(partner.birth)
-        i = i + 1
-        if i == 5: # After 5 unsuccessful attempts,
-            partner.death = descendant.death # partners death is the same as the descendants.
+    if partner.death < begin:
+        # Draw a death year that is no earlier than the beginning of the relationship.
+        death = sample_death_after(partner.birth, begin, rng)
+        if death is None: # If nobody born then can live that long,
+            death = descendant.death # partners death is the same as the descendants.
+        partner.death = death
     return partner
 
 
-def calculate_gender(descendant, legit):
+def calculate_gender(descendant, legit, rng=random):
     '''
     Generates a gender for partner of descendant
     
             Args:
                     descendant (instance of Descendant class): person in tree
                     legit (bool): legitamacy of relationship
+                    rng (random.Random): the random stream to draw from
             Returns:
                     gender (int): 0 for male, 1 for female
     '''
@@ -317,17 +879,18 @@ def calculate_gender(descendant, legit):
             gender = descendant.gender
         else:
             #if it is a illegit relationship and descendant is bi, gender is randomly generated.
-            gender = randint(0,1)
+            gender = rng.randint(0,1)
     return gender
 
 
-def calculate_birth(begin, descendant):
+def calculate_birth(begin, descendant, rng=random):
     '''
     Calculates a birth year for partner
 
             Args:
                     descendant (instance of Descendant class): person in tree
                     begin (int): year relationship begins
+                    rng (random.Random): the random stream to draw from
             Returns:
                     birth (int): the year of birth
     '''
@@ -340,14 +903,47 @@ def calculate_birth(begin, descendant):
         age = lower_age
     #If the range of ages exceeds 20 years, the range is shortened to 20 year range
     elif abs(upper_age-lower_age) > 20:
-        age = descendant_age + randint(-10,10)
+        age = descendant_age + rng.randint(-10,10)
     else:
-        age = randint(lower_age,upper_age)
+        age = rng.randint(lower_age,upper_age)
     birth = begin - int(abs(age)) #Calculate year of birth
     return birth
 
 
-def calculate_end(partner1, partner2, begin, legit):
+def partner_ages(begin, descendant):
+    '''
+    Returns the youngest and oldest age calculate_birth can give a partner
+
+            Args:
+                    begin (int): year relationship begins
+                    descendant (instance of Descendant class): person in tree
+            Returns:
+                    ages (tuple): the youngest and the oldest age, in years
+    '''
+    descendant_age = begin - descendant.birth # Calculate the age of the descendant
+    lower_age =  int(abs((descendant_age/2)+7))
+    upper_age = int(abs((descendant_age-7)*2))
+    # A range of more than 20 years is shortened to 10 years either side of the descendant's age.
+    if abs(upper_age-lower_age) > 20:
+        lower_age = descendant_age - 10
+        upper_age = descendant_age + 10
+    return min(lower_age, upper_age), max(lower_age, upper_age)
+
+
+def married_in(person):
+    '''
+    Returns whether a person married into the tree, rather than being a descendant in it
+
+            Args:
+                    person (Descendant): the person
+            Returns:
+                    bool: True for a partner who was made up for a relationship
+    '''
+    # Partners have (Couple, sexuality, legit) as parents, descendants a Couple or a list.
+    return isinstance(person.parents, tuple)
+
+
+def calculate_end(partner1, partner2, begin, legit, rng=random):
     '''
     Calculate the year the relationship ends
 
@@ -356,6 +952,7 @@ def calculate_end(partner1, partner2, begin, legit):
                     partner2 (instance of Descendant class): partner of person in tree
                     begin (int): year relationship begins
                     legit (bool): legitamacy of relationship
+                    rng (random.Random): the random stream to draw from
             Returns:
                     end (int): the last year of the relationship
     '''
@@ -367,7 +964,7 @@ def calculate_end(partner1, partner2, begin, legit):
             end = partner2.death
     #illegit relationships can last up to 20 years or to either partners death
     else:
-        end = randint(0,20) + begin
+        end = rng.randint(0,20) + begin
         #if either partner dies before the end, they end is updated to be their death year.
         if partner1.death < end:
             end = partner1.death
@@ -376,20 +973,14 @@ def calculate_end(partner1, partner2, begin, legit):
     return end
 
 
-def read_name(filename):
+def read_name(filename, rng=random):
     '''
     Picks a random string from a csv
             Args:
                     filename (string): the name of the csv file that will be read
+                    rng (random.Random): the random stream to draw from
             Returns:
                     name (string): name picked from csv file
     '''
-
-    with open(filename, 'r', encoding="utf-8") as test_file: # Read the csv file
-        test_lines = test_file.readlines() # Copy the csv into the list test_lines
-
-
-    linenum = randint(0,len(test_lines)-1) # Choose a random line to pick name from
-    name = test_lines[linenum].rstrip('\n') # Extract chosen name
-
-    return name
+    # The file is only read once, after that the name is picked from memory.
+    return pick_name(filename, rng)
@@ -0,0 +1,498 @@
+"""
+A population store that keeps the tree in columns instead of objects.
+Every person is a row in the people table and every relationship a row in the couples table,
+each field stored in its own compact array. Statistics, filters and exports can then work
+on whole columns at once, and the Descendant and Couple API is still available through views.
+"""
+
+from array import array
+from collections.abc import Mapping
+from pedigree_chart_classes import Couple, Descendant, lineage_key, married_in
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is only needed to hand out columns as NumPy arrays.
+    np = None
+
+# Values of the parents column for people who were not born from a couple in the tree.
+ROOT = -1  # The initial node of the tree.
+PARTNER = -2  # Someone who married into the tree.
+
+# The columns of each table and the array typecode they are stored with.
+PEOPLE_COLUMNS = {'id': 'q', 'birth': 'i', 'death': 'i', 'gender': 'b', 'sexuality': 'b',
+                  'house': 'i', 'name': 'i', 'parents': 'i'}
+COUPLE_COLUMNS = {'id': 'q', 'partner1': 'i', 'partner2': 'i', 'begin': 'i', 'end': 'i',
+                  'legit': 'b', 'house': 'i', 'tag': 'i'}
+
+
+class Population(Mapping):
+    """
+    This class is used to store a family tree as columns.
+    It can be used anywhere fam_dict is used, such as show_info, print_instructions and make_csv.
+    Methods are __init__, from_tree, add_person, add_couple, string, column, select,
+    person, couple, marriage_rows, kid_rows, person_rows, couple_rows, descendant_rows,
+    __getitem__, __iter__, __len__, values.
+    """
+
+    def __init__(self):
+        """
+        Creates an empty instance of the Population class.
+        """
+        self.people = {column: array(code) for column, code in PEOPLE_COLUMNS.items()}
+        self.couples = {column: array(code) for column, code in COUPLE_COLUMNS.items()}
+        # Labels are worked out from the tree, apart from those read from files that use labels as IDs.
+        self.labels = {}  # Labels of people that were read from files, by row.
+        self.couple_labels = {}  # Labels of couples that were read from files, by row.
+        # Names, houses and tags are stored once and referred to by their position in strings.
+        self.strings = []
+        self._string_ids = {}
+        # The rows of the descendants, the people a fam_dict would hold, by ID.
+        self._index = {}
+        # Made from the columns the first time they are needed, and dropped when a row is added.
+        self._marriages = None
+        self._kids = None
+
+    @classmethod
+    def from_tree(cls, fam_dict):
+        """
+        Creates a Population from a tree of Descendant and Couple objects.
+
+        Args:
+            fam_dict (dict): A dictionary of Descendant objects, or a LazyTree.
+
+        Returns:
+            population (Population): The tree in columns, in the same order as make_csv writes it.
+        """
+        population = cls()
+        couple_rows = {}
+        # Couples whose partner is a descendant who has not been added yet, by the partner's ID.
+        waiting = {}
+        # People whose parents have not been added, by the parents' couple.
+        orphans = {}
+
+        def add_couple(couple, partner1, partner2):
+            couple_row = population.add_couple(couple, partner1, partner2)
+            couple_rows[id(couple)] = couple_row
+            # Children added before their parents are joined to them now. They keep their labels,
+            # as not all of their brothers and sisters may be in the tree to count their place from.
+            for kid_row in orphans.pop(id(couple), []):
+                population.people['parents'][kid_row] = couple_row
+
+        for person in fam_dict.values():
+            if married_in(person) and person.parents[0].partner1.id in fam_dict:
+                # A partner who married in is added with the relationship, by the partner who heads it.
+                continue
+            parents = ROOT
+            if isinstance(person.parents, Couple):
+                parents = couple_rows.get(id(person.parents), ROOT)
+            row = population.add_person(person, parents)
+            if parents == ROOT and not isinstance(person.parents, list):
+                # A partial tree, such as the frontier or a neighbourhood, may not hold the parents.
+                # The person is stored as a root, and keeps the lineage key worked out from their parents.
+                population.labels[row] = person.name + lineage_key(person)
+                if isinstance(person.parents, Couple):
+                    orphans.setdefault(id(person.parents), []).append(row)
+            for couple, partner1 in waiting.pop(person.id, []):
+                add_couple(couple, partner1, row)
+            for couple in person.marriages:
+                # Couples are added with the partner who heads them.
+                if couple.partner1 != person:
+                    continue
+                if married_in(couple.partner2):
+                    partner = population.add_person(couple.partner2, PARTNER)
+                elif couple.partner2.id in population._index:
+                    partner = population._index[couple.partner2.id]
+                else:
+                    waiting.setdefault(couple.partner2.id, []).append((couple, row))
+                    continue
+                add_couple(couple, row, partner)
+        return population
+
+    def string(self, text):
+        """
+        Returns the ID of a name or house, adding it to the strings if it is new.
+
+        Args:
+            text (str): The name or house.
+
+        Returns:
+            string_id (int): The position of the text in strings.
+        """
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(text)
+            self._string_ids[text] = string_id
+        return string_id
+
+    def add_person(self, person, parents):
+        """
+        Adds a row to the people table.
+
+        Args:
+            person (Descendant): The person to add.
+            parents (int): The row of the couple they were born from, or ROOT or PARTNER.
+
+        Returns:
+            row (int): The row of the person.
+        """
+        people = self.people
+        row = len(people['id'])
+        people['id'].append(person.id)
+        people['birth'].append(person.birth)
+        people['death'].append(person.death)
+        people['gender'].append(person.gender)
+        people['sexuality'].append(person.sexuality)
+        people['house'].append(self.string(person.house))
+        people['name'].append(self.string(person.name))
+        people['parents'].append(parents)
+        if person._label is not None:
+            self.labels[row] = person._label
+        if parents != PARTNER:
+            self._index[person.id] = row
+        self._marriages = None
+        self._kids = None
+        return row
+
+    def add_couple(self, couple, partner1, partner2):
+        """
+        Adds a row to the couples table.
+
+        Args:
+            couple (Couple): The relationship to add.
+            partner1 (int): The row of the partner who is a descendant.
+            partner2 (int): The row of the partner who married into the tree,
+                or of a descendant matched by the marriage market.
+
+        Returns:
+            row (int): The row of the couple.
+        """
+        couples = self.couples
+        row = len(couples['id'])
+        couples['id'].append(couple.id)
+        couples['partner1'].append(partner1)
+        couples['partner2'].append(partner2)
+        couples['begin'].append(couple.begin)
+        couples['end'].append(couple.end)
+        # Legitimacy read back from a CSV file is the text 'True' or 'False'.
+        couples['legit'].append(bool(couple.legit))
+        couples['house'].append(self.string(couple.house))
+        couples['tag'].append(self.string(couple.tag))
+        if couple._label is not None:
+            self.couple_labels[row] = couple._label
+        self._marriages = None
+        return row
+
+    def column(self, name, table='people'):
+        """
+        Returns a whole column, for statistics and filters.
+
+        Args:
+            name (str): The name of the column, such as 'birth' or 'legit'.
+            table (str): 'people' or 'couples'.
+
+        Returns:
+            column (numpy.ndarray or array.array): A copy of the column,
+                as a NumPy array if NumPy is installed.
+        """
+        values = getattr(self, table)[name]
+        if np is None:
+            return array(values.typecode, values)
+        # A copy, as an array cannot grow while NumPy is looking at its memory.
+        return np.array(values)
+
+    def select(self, mask):
+        """
+        Returns the people picked by a mask over the people table.
+
+        Args:
+            mask (iterable): One truth value per row, such as column('death') - column('birth') > 80.
+
+        Returns:
+            people (list): A view of every person whose value in the mask is true.
+        """
+        return [self.person(row) for row, keep in enumerate(mask) if keep]
+
+    def person(self, row):
+        """
+        Returns a view of a row of the people table.
+
+        Args:
+            row (int): The row of the person.
+
+        Returns:
+            person (PersonView): The person.
+        """
+        return PersonView(self, row)
+
+    def couple(self, row):
+        """
+        Returns a view of a row of the couples table.
+
+        Args:
+            row (int): The row of the couple.
+
+        Returns:
+            couple (CoupleView): The couple.
+        """
+        return CoupleView(self, row)
+
+    def partner_couple_row(self, row):
+        """
+        Returns the row of the couple a partner married into.
+        """
+        partner2 = self.couples['partner2']
+        return next(couple for couple in self.marriage_rows(row) if partner2[couple] == row)
+
+    def marriage_rows(self, row):
+        """
+        Returns the rows of the couples a person is a partner in.
+        """
+        if self._marriages is None:
+            # One pass over the partner columns finds every person's marriages.
+            self._marriages = {}
+            for partner in ('partner1', 'partner2'):
+                for couple, person in enumerate(self.couples[partner]):
+                    self._marriages.setdefault(person, []).append(couple)
+            for couples in self._marriages.values():
+                couples.sort()
+        return self._marriages.get(row, [])
+
+    def kid_rows(self, row):
+        """
+        Returns the rows of the children of a couple, in birth order.
+        """
+        if self._kids is None:
+            # One pass over the parents column finds every couple's children.
+            self._kids = {}
+            for person, parents in enumerate(self.people['parents']):
+                if parents >= 0:
+                    self._kids.setdefault(parents, []).append(person)
+        return self._kids.get(row, [])
+
+    def person_rows(self, root=True, partner=False):
+        """
+        Generates a row of data for every person, in the order make_csv writes them.
+
+        Args:
+            root (any): The value of the parents field for the initial node.
+            partner (any): The value of the parents field for people who married into the tree.
+
+        Returns:
+            generator: Tuples of ID, name, house, gender, sexuality, birth, death and parents.
+        """
+        people = self.people
+        strings = self.strings
+        couple_ids = self.couples['id']
+        for row, person_id in enumerate(people['id']):
+            parents = people['parents'][row]
+            if parents >= 0:
+                parents = couple_ids[parents]
+            else:
+                parents = root if parents == ROOT else partner
+            yield (person_id,
+                   strings[people['name'][row]],
+                   strings[people['house'][row]],
+                   people['gender'][row],
+                   people['sexuality'][row],
+                   people['birth'][row],
+                   people['death'][row],
+                   parents)
+
+    def couple_rows(self):
+        """
+        Generates a row of data for every couple.
+
+        Returns:
+            generator: Tuples of ID, partner IDs, begin, end and legitimacy.
+        """
+        couples = self.couples
+        person_ids = self.people['id']
+        for row, couple_id in enumerate(couples['id']):
+            yield (couple_id,
+                   person_ids[couples['partner1'][row]],
+                   person_ids[couples['partner2'][row]],
+                   couples['begin'][row],
+                   couples['end'][row],
+                   bool(couples['legit'][row]))
+
+    def descendant_rows(self):
+        """
+        Returns the rows of the descendants, the people a fam_dict would hold, in the order they were added.
+        """
+        return self._index.values()
+
+    def values(self):
+        """
+        Generates a view of every descendant, as a fam_dict would hold them.
+
+        Returns:
+            generator: The descendants, in the order they were added.
+        """
+        for row in self._index.values():
+            yield PersonView(self, row)
+
+    def __getitem__(self, person_id):
+        return PersonView(self, self._index[person_id])
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class PersonView(Descendant):
+    """
+    This class is used to look at a row of the people table as a Descendant.
+    Views are read only, and a new one is made each time a person is looked up.
+    """
+
+    __slots__ = ('_store', '_row')
+
+    # A stored person never changes.
+    version = 0
+
+    def __init__(self, store, row):
+        """
+        Creates a view of a person.
+
+        Args:
+            store (Population): The population the person is stored in.
+            row (int): The row of the person.
+        """
+        self._store = store
+        self._row = row
+
+    def __eq__(self, other):
+        return isinstance(other, PersonView) and other._store is self._store and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._store), self._row))
+
+    @property
+    def id(self):
+        return self._store.people['id'][self._row]
+
+    @property
+    def _label(self):
+        return self._store.labels.get(self._row)
+
+    @property
+    def name(self):
+        return self._store.strings[self._store.people['name'][self._row]]
+
+    @property
+    def house(self):
+        return self._store.strings[self._store.people['house'][self._row]]
+
+    @property
+    def birth(self):
+        return self._store.people['birth'][self._row]
+
+    @property
+    def death(self):
+        return self._store.people['death'][self._row]
+
+    @property
+    def gender(self):
+        return self._store.people['gender'][self._row]
+
+    @property
+    def sexuality(self):
+        return self._store.people['sexuality'][self._row]
+
+    @property
+    def parents(self):
+        parents = self._store.people['parents'][self._row]
+        if parents >= 0:
+            return CoupleView(self._store, parents)
+        # People without parents in the tree have what the simulation gives them.
+        if parents == PARTNER:
+            couple = CoupleView(self._store, self._store.partner_couple_row(self._row))
+            return (couple, self.sexuality, couple.legit)
+        return [0, self.sexuality, True]
+
+    @property
+    def marriages(self):
+        return [CoupleView(self._store, row) for row in self._store.marriage_rows(self._row)]
+
+    @property
+    def birth_years(self):
+        # The mothers' birth years are worked out from the children, as they are not stored.
+        years = 0
+        if self.gender == 1:
+            for couple in self._store.marriage_rows(self._row):
+                for kid in self._store.kid_rows(couple):
+                    years |= 1 << (self._store.people['birth'][kid] - self.birth)
+        return years
+
+
+class CoupleView(Couple):
+    """
+    This class is used to look at a row of the couples table as a Couple.
+    Views are read only, and a new one is made each time a couple is looked up.
+    """
+
+    __slots__ = ('_store', '_row')
+
+    # A stored relationship never changes.
+    version = 0
+
+    def __init__(self, store, row):
+        """
+        Creates a view of a couple.
+
+        Args:
+            store (Population): The population the couple is stored in.
+            row (int): The row of the couple.
+        """
+        self._store = store
+        self._row = row
+
+    def __eq__(self, other):
+        return isinstance(other, CoupleView) and other._store is self._store and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._store), self._row))
+
+    @property
+    def id(self):
+        return self._store.couples['id'][self._row]
+
+    @property
+    def tag(self):
+        return self._store.strings[self._store.couples['tag'][self._row]]
+
+    @property
+    def _label(self):
+        return self._store.couple_labels.get(self._row)
+
+    @property
+    def partner1(self):
+        return PersonView(self._store, self._store.couples['partner1'][self._row])
+
+    @property
+    def partner2(self):
+        return PersonView(self._store, self._store.couples['partner2'][self._row])
+
+    @property
+    def house(self):
+        return self._store.strings[self._store.couples['house'][self._row]]
+
+    @property
+    def begin(self):
+        return self._store.couples['begin'][self._row]
+
+    @property
+    def end(self):
+        return self._store.couples['end'][self._row]
+
+    @property
+    def legit(self):
+        return bool(self._store.couples['legit'][self._row])
+
+    @property
+    def kids(self):
+        return [PersonView(self._store, row) for row in self._store.kid_rows(self._row)]
@@ -5,30 +5,123 @@ Example file is included in this project.
 
 #import classes
 import csv
-from pedigree_chart_classes import Couple, Descendant
+import sys
+from pedigree_chart_classes import Couple, Descendant, married_in
+from pedigree_chart_columns import PARTNER, Population
+from pedigree_chart_ids import next_id, reserve_ids
 
+# The header row of the CSV file.
+HEADER = ['ID', 'name', 'house', 'gender', 'sexuality', 'DOB', 'DOD', 'ParentsID']
 
-def write_bio(person, writer):
+
+class CsvWriter:
+    """
+    This class is used to write people to a CSV file in large batches.
+    It can be given to expand_tree as a sink, so every generation is written as soon as it is finished.
+    Methods are __init__, write_person, write_generation, add_row, flush, close.
     """
-    Write a row of data about a person to a CSV file.
+
+    def __init__(self, filename, buffer_rows=10000):
+        """
+        Opens the CSV file and writes the header row.
+
+        Args:
+            filename (str): The name of the CSV file to write to.
+            buffer_rows (int): How many rows to collect before writing them all at once.
+        """
+        self.filename = filename
+        self.buffer_rows = buffer_rows
+        self._file = open(filename, 'w', newline='', encoding="utf-8", buffering=1 << 20)
+        self._writer = csv.writer(self._file)
+        self._rows = [HEADER]
+
+    def write_person(self, person, fam_dict=None):
+        """
+        Adds the rows of a person, and of their partners and relationships.
+
+        Args:
+            person (Descendant): The person to write.
+            fam_dict (dict): The tree being written, if it may not hold everyone's parents.
+        """
+        rows = self._rows
+        rows.extend(person_rows(person, fam_dict))
+        if len(rows) >= self.buffer_rows:
+            self.flush()
+
+    def write_generation(self, people, fam_dict=None):
+        """
+        Adds the rows of a group of people, such as a finished generation.
+
+        Args:
+            people (iterable): The people to write.
+            fam_dict (dict): The tree being written, if it may not hold everyone's parents.
+        """
+        for person in people:
+            self.write_person(person, fam_dict)
+
+    def add_row(self, row):
+        """
+        Adds a row that has already been put together.
+
+        Args:
+            row (list): The values of the row.
+        """
+        self._rows.append(row)
+        if len(self._rows) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the collected rows to the file.
+        """
+        self._writer.writerows(self._rows)
+        self._rows = []
+        self._file.flush()
+
+    def close(self):
+        """
+        Writes the collected rows and closes the file.
+        """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def bio_row(person, fam_dict=None):
+    """
+    Puts together a row of data about a person.
+    The ParentsID column follows the same rule as a Population, so make_csv and snapshot_to_csv agree.
+    It is the ID of the relationship the person was born from, if that is in the tree,
+    FALSE for a partner written with the relationship they married into, and TRUE for everyone else,
+    such as the initial node and people released from or left without their parents in a partial tree.
 
     Args:
         person (Descendant): An instance of the descendant class.
-        writer (csv.writer): A csv writer instance to write to a file.
+        fam_dict (dict): The tree being written, if it may not hold everyone's parents.
 
     Returns:
-        None
+        data (list): The row.
     """
     # Determine the value for the ParentsID column based on the person's parentage.
-    if isinstance(person.parents, Couple):
-        parents_label = person.parents.label
-    elif person.label.split(person.name)[1] == ('0'):
-        parents_label = 'TRUE'
+    # A relationship is in the tree if the partner who heads it is.
+    if married_in(person):
+        head = person.parents[0].partner1
+    elif isinstance(person.parents, Couple):
+        head = person.parents.partner1
+    else:
+        head = None
+    if head is not None and (fam_dict is None or head.id in fam_dict):
+        parents_label = 'FALSE' if married_in(person) else person.parents.id
     else:
-        parents_label = 'FALSE'
+        parents_label = 'TRUE'
 
-    # Write a row of data about the person to the CSV file.
-    data = [person.label,
+    return [person.id,
             person.name,
             person.house,
             person.gender,
@@ -36,34 +129,84 @@ def write_bio(person, writer):
             person.birth,
             person.death,
             parents_label]
-    writer.writerow(data)
 
 
-def write_marriage(couple, writer):
+def person_rows(person, fam_dict=None):
     """
-    Write a row of data about a marriage to a CSV file.
+    Puts together the rows of a person, followed by the partners and relationships they head.
+    A partner matched from the tree by the marriage market has their own row as a descendant,
+    and a relationship is only written with the person who heads it.
+
+    Args:
+        person (Descendant): An instance of the descendant class.
+        fam_dict (dict): The tree being written, if it may not hold everyone's parents.
+
+    Returns:
+        rows (list): The rows.
+    """
+    if fam_dict is not None and married_in(person) and person.parents[0].partner1.id in fam_dict:
+        # A partner is written with the relationship, by the partner who heads it.
+        return []
+    rows = [bio_row(person, fam_dict)]
+    for couple in person.marriages:
+        if couple.partner1 != person:
+            continue
+        if married_in(couple.partner2):
+            rows.append(bio_row(couple.partner2))
+        rows.append(marriage_row(couple))
+    return rows
+
+
+def marriage_row(couple):
+    """
+    Puts together a row of data about a marriage.
 
     Args:
         couple (Couple): An instance of the Couple class.
-        writer (csv.writer): A csv writer instance to write to a file.
 
     Returns:
-        None
+        data (list): The row.
     """
-    # Write a row of data about the marriage to the CSV file.
-    data = [couple.label,
-            couple.partner1.label,
-            couple.partner2.label,
+    return [couple.id,
+            couple.partner1.id,
+            couple.partner2.id,
             couple.begin,
             couple.end,
             couple.legit]
-    writer.writerow(data)
 
 
+def write_bio(person, writer):
+    """
+    Write a row of data about a person to a CSV file.
+
+    Args:
+        person (Descendant): An instance of the descendant class.
+        writer (csv.writer): A csv writer instance to write to a file.
+
+    Returns:
+        None
+    """
+    writer.writerow(bio_row(person))
+
+
+def write_marriage(couple, writer):
+    """
+    Write a row of data about a marriage to a CSV file.
+
+    Args:
+        couple (Couple): An instance of the Couple class.
+        writer (csv.writer): A csv writer instance to write to a file.
+
+    Returns:
+        None
+    """
+    writer.writerow(marriage_row(couple))
+
 
 def read_bio(row):
     """
     Reads and classifies information in the row, and creates an instance of the Descendant class.
+    Nothing is drawn at random, the values are taken from the row as they are.
 
     Args:
         row (list): A row of data from the CSV file.
@@ -72,58 +215,121 @@ def read_bio(row):
         A Descendant instance with information assigned from the input row.
     """
     label = row[0]
-    name = row[1]
-    house = row[2]
-    gender = int(row[3])
-    sexuality = int(row[4])
-    birth = int(row[5])
-    death = int(row[6])
-    # Create an instance of Descendant class.
-    person = Descendant(birth, gender, [0,0,0], 0)
-    # Assign all information about the person.
-    person.label = label
-    person.name = name
-    person.house = house
-    person.sexuality = sexuality
-    person.death = death
+    # Older files use the label as the ID, newer ones an integer.
+    person_id = int(label) if label.isdigit() else next_id()
+    # Names and houses repeat across the tree, so every person shares one copy of each.
+    person = Descendant.restore(person_id,
+                                sys.intern(row[1]),
+                                sys.intern(row[2]),
+                                int(row[3]),
+                                int(row[4]),
+                                int(row[5]),
+                                int(row[6]),
+                                [0, 0, True])
+    if not label.isdigit():
+        person.label = label
     return person
 
 
-def find_parents(row, person, marriage_dict):
+def read_couple_bio(partner1, partner2, row, tag, partner_married_in=True):
+    """
+    Returns an instance of the Couple class from information in the CSV.
+
+    Args:
+        partner1 (Descendant): The first partner in the couple.
+        partner2 (Descendant): The second partner in the couple.
+        row (list): A row of data from the CSV file.
+        tag (str): 'L' or 'I' followed by the number of the relationship.
+        partner_married_in (bool): False if partner2 is a descendant, matched by the marriage market.
+
+    Returns:
+        A Couple instance with information assigned from the input row.
+    """
+    label = row[0]
+    legit = read_bool(row[5])
+    couple_id = int(label) if label.isdigit() else next_id()
+    couple = Couple.restore(couple_id, partner1, partner2, int(row[3]), int(row[4]), legit, tag)
+    if not label.isdigit():
+        couple.label = label
+    # The partner's label is worked out from the relationship they married into.
+    # A descendant keeps the parents they were born to.
+    if partner_married_in:
+        partner2.parents = (couple, partner2.sexuality, legit)
+    return couple
+
+
+def read_bool(text):
+    """
+    Reads a truth value as written by make_csv or by hand.
+
+    Args:
+        text (str): The text in the CSV, such as 'True' or 'FALSE'.
+
+    Returns:
+        bool: The value.
+    """
+    return text.strip().lower() in ('true', '1', 'yes')
+
+
+def find_person(people, person_id, row):
+    """
+    Finds a partner of a relationship among the people read from the CSV.
+
+    Args:
+        people (dict): Everyone in the file, by the ID used in the file.
+        person_id (str): The ID of the partner.
+        row (list): The relationship row, for the error message.
+
+    Returns:
+        person (Descendant): The partner.
+    """
+    if person_id not in people:
+        raise ValueError('Relationship ' + row[0] + ' has partner ' + person_id + ', who is not in the file.')
+    return people[person_id]
+
+
+def find_parents(parents, person, marriage_dict):
     """
     Appends a person to the marriage which is stored in the dictionary,
     using the ID of the marriage the person is born from.
 
     Args:
-        row (list): A row of data from the CSV file.
+        parents (str): The ID of the marriage the person is born from.
         person (Descendant): The person to append to the marriage.
         marriage_dict (dict): A dictionary of rlationships.
     """
-    marriage_dict[row[7]].kids.append(person)
-    person.parents = marriage_dict[row[7]]
+    if parents not in marriage_dict:
+        raise ValueError('Person ' + person.label + ' is born from ' + parents + ', which is not in the file.')
+    person.parents = marriage_dict[parents]
+    # Adding the kid also records the birth year for the mother.
+    marriage_dict[parents].add_kid(person)
 
 
-def read_couple_bio(partner1, partner2, row):
+def write_population(population, writer):
     """
-    Returns an instance of the Couple class from information in the CSV.
+    Write the rows of a Population to a CSV file, straight from its columns.
 
     Args:
-        partner1 (Descendant): The first partner in the couple.
-        partner2 (Descendant): The second partner in the couple.
-        row (list): A row of data from the CSV file.
+        population (Population): The tree stored in columns.
+        writer (CsvWriter): The writer to add the rows to.
 
     Returns:
-        A Couple instance with information assigned from the input row.
+        None
     """
-    # Create an instance of Couple class.
-    couple = Couple(partner1, int(row[3]), row[5], row[0])
-    couple.end = int(row[4]) # End year of relationship is row[4]
-    couple.label = row[0]
-    couple.partner2 = partner2
-    # Append this relationship in each their marriages list.
-    couple.partner1.marriages.append(couple)
-    couple.partner2.marriages.append(couple)
-    return couple
+    people = list(population.person_rows('TRUE', 'FALSE'))
+    couples = list(population.couple_rows())
+    partner2 = population.couples['partner2']
+    # The couples of each descendant, so they can be written after them as make_csv does.
+    marriages = {}
+    for couple, partner1 in enumerate(population.couples['partner1']):
+        marriages.setdefault(partner1, []).append(couple)
+    for row in population.descendant_rows():
+        writer.add_row(people[row])
+        for couple in marriages.get(row, []):
+            # A descendant matched as a partner is written as a descendant.
+            if population.people['parents'][partner2[couple]] == PARTNER:
+                writer.add_row(people[partner2[couple]])
+            writer.add_row(couples[couple])
 
 
 def make_csv(filename, fam_dict):
@@ -139,32 +345,43 @@ def make_csv(filename, fam_dict):
     """
     print('\nWRITING CSV:', filename)
 
-    # Open CSV file for writing.
-    with open(filename, 'w', newline='', encoding="utf-8") as csv_file:
-        writer = csv.writer(csv_file)
-
-        # Write the header row to the CSV file.
-        header = ['ID', 'name', 'house', 'gender', 'sexuality', 'DOB', 'DOD', 'ParentsID']
-        writer.writerow(header)
+    # Open CSV file for writing, the header row is written by the writer.
+    with CsvWriter(filename) as writer:
+        # A Population is written from its columns, without making any objects.
+        if isinstance(fam_dict, Population):
+            write_population(fam_dict, writer)
+        else:
+            # Every person is followed by their partners and relationships.
+            writer.write_generation(fam_dict.values(), fam_dict)
 
-        # For each person in the dictionary:
-        for person in fam_dict.values():
 
-            # Write a row about the person to the CSV file.
-            write_bio(person, writer)
+def read_rows(filename):
+    """
+    Reads a CSV file one row at a time, so a file of any size can be gone through.
 
-            # For each relationship:
-            for couple in person.marriages:
-                # Write a row about the partner to the CSV file.
-                write_bio(couple.partner2, writer)
+    Args:
+        filename (str): The name of the CSV file.
 
-                # Write a row about the relationship information to the CSV file.
-                write_marriage(couple, writer)
+    Returns:
+        generator: Every row after the header.
+    """
+    with open(filename, newline='', encoding="utf-8") as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=',')
+        # Skip the header row.
+        next(csv_reader, None)
+        for row in csv_reader:
+            # Skip empty rows, such as the end row.
+            if len(row) == 0 or row[0] == '':
+                continue
+            yield row
 
 
 def read_csv(filename, fam_dict):
     """
     Takes the data in the CSV and outputs it into a dictionary format.
+    The rows can be in any order, as the links between people and relationships
+    are only made once the whole file has been read.
+    The rows are streamed, but the memory used is not bounded: see load_rows.
 
     Args:
         filename (str): The name of the CSV file.
@@ -174,34 +391,62 @@ def read_csv(filename, fam_dict):
         A dictionary of Descendant and Couple instances with their IDs as keys.
     """
     print('\nREADING CSV:', filename)
+    load_rows(read_rows(filename), fam_dict)
+
+
+def load_rows(rows, fam_dict):
+    """
+    Makes people and relationships from rows in the CSV layout, in any order.
+    Person rows are made into people as they are read, and are not kept.
+    Until the second pass, every relationship row is kept, with a list of the descendants.
+    The relationships can only be numbered once all of them have been read.
+    So on top of the tree itself, which is returned whole, the memory used grows with the file.
+
+    Args:
+        rows (iterable): The rows, each a list of strings as read from a CSV file.
+        fam_dict (dict): The dictionary to store the descendants in, by ID.
+    """
+    people = {} # Everyone in the file, by the ID used in the file.
+    descendant_ids = set() # The IDs used in the file for descendants.
+    descendants = [] # Descendants and the ID of the relationship they were born from, in file order.
+    couple_rows = [] # Relationship rows, made into couples once everyone has been read.
+    for row in rows:
+        # Relationship rows are shorter than person rows.
+        if len(row) < 7:
+            couple_rows.append(row)
+        else:
+            person = read_bio(row)
+            people[row[0]] = person
+            # Partners are not descendants of anyone, so they are not stored in fam_dict.
+            if row[7] != 'FALSE':
+                descendants.append((person, None if row[7] == 'TRUE' else row[7]))
+                descendant_ids.add(row[0])
+
+    # Relationships are numbered in the order they are made, legitimate ones first,
+    # and each kind in order of the year they began. IDs are also given out in that order.
+    couple_rows.sort(key=lambda row: (not read_bool(row[5]), int(row[3]),
+                                      int(row[0]) if row[0].isdigit() else 0))
     marriage_dict = {}
-    # Open the CSV file.
-    with open(filename, encoding="utf-8") as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',')
-        line_count = 0
-        for row in csv_reader:
-            print(row)
-            # If it is beyond the header row and before the end row.
-            if line_count != 0 and row[0] != '':
-                # If it is a partner row.
-                if len(row) < 7:
-                    # Create an instance of Couple class.
-                    couple = read_couple_bio(partner1, partner2, row)
-                    # Store info in dictionary.
-                    marriage_dict[couple.label] = couple
-                else:
-                    # If person is descendant, they are counted as partner 1.
-                    if row[7] == ('TRUE'):
-                        # Create an instance of Descendant class.
-                        partner1 = read_bio(row)
-                        fam_dict[partner1.label] = partner1
-                    # If they are not a descendant of anyone, they are counted as partner 2.
-                    elif row[7] == ('FALSE'):
-                        partner2 = read_bio(row)
-                    # Otherwise, they are an unmarried descendant.
-                    else:
-                        partner1 = read_bio(row)
-                        # Search through the csv for the marriage the person was born from.
-                        find_parents(row, partner1, marriage_dict)
-                        fam_dict[partner1.label] = partner1 # Store person in dicitonary
-            line_count = line_count + 1
+    counts = {}
+    for row in couple_rows:
+        partner1 = find_person(people, row[1], row)
+        partner2 = find_person(people, row[2], row)
+        kind = 'L' if read_bool(row[5]) else 'I'
+        number = counts.get((row[1], kind), 0)
+        counts[(row[1], kind)] = number + 1
+        couple = read_couple_bio(partner1, partner2, row, kind + str(number), row[2] not in descendant_ids)
+        partner1.add_marriage(couple)
+        partner2.add_marriage(couple)
+        marriage_dict[row[0]] = couple
+
+    # Children are added in the order they were born, twins in the order of their IDs.
+    kids = [(person, parents) for person, parents in descendants if parents is not None]
+    kids.sort(key=lambda kid: (kid[0].birth, kid[0].id))
+    for person, parents in kids:
+        find_parents(parents, person, marriage_dict)
+
+    for person, parents in descendants:
+        fam_dict[person.id] = person # Store person in dicitonary
+    # New people must not be given the IDs that were read.
+    reserve_ids(max([person.id for person in people.values()] +
+                    [couple.id for couple in marriage_dict.values()], default=-1))
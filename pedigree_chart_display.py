@@ -2,6 +2,19 @@
 #Display information about the tree or how to graph it.
 """
 
+import sys
+from pedigree_chart_classes import Descendant, married_in
+
+# How many characters of instructions are collected before they are written to the stream.
+DOT_BUFFER = 1 << 20
+
+# The small point that joins partners, and joins their children to them.
+POINT = '[shape=circle,label="",height=0.01,width=0.01];'
+
+# The start and the end of the graph.
+DOT_HEADER = 'digraph {\nnode [shape=box];\nedge [dir=none];'
+DOT_FOOTER = '{ rank=same;}\n}'
+
 def show_info(fam_dict):
     """
     Print out family information in text.
@@ -27,7 +40,10 @@ def show_info(fam_dict):
             print_info(person) # Print the personal information.
             for couple in person.marriages:
                 # For every relationship person has, display partner.
+                # A descendant matched as a partner is shown with the person who heads the relationship.
                 partner = couple.partner2
+                if partner == person:
+                    partner = couple.partner1
                 print(' Partner: ', end="")
                 print_info(partner)
                 if len(couple.kids) > 0:
@@ -51,137 +67,483 @@ def print_info(person):
     print(person.name, person.house, person.birth, person.death)
 
 
-def print_person(person):
+def print_person(person, file=None):
     """
     Output the instructions to display an individual's box in the graph.
     
     Args:
     person (Descendant): The individual whose information will be displayed.
+    file (file): The text file to write to, or the standard output if None.
     
     Returns:
     None
     """
+    print(person_box(person), file=file)
+
+
+def person_box(person, box=None):
+    """
+    Put together the instructions to display an individual's box in the graph.
+
+    Args:
+    person (Descendant): The individual whose information will be displayed.
+    box (tuple): If given, the (x, y, width) of the box from a Layout, to pin it in place.
+
+    Returns:
+    str: The line of instructions.
+    """
     # Define the color of the box according to the gender
     if person.gender == 0:
         colour = 'azure2'  # blue for male
     else:
         colour = 'bisque'  # pink for female
-    # Output the details necessary to display the box.
     # The displayed information is their name, year of birth, and year of death.
-    print(person.label,
-          '[label="',
-          person.name,
-          person.house,
-          r'\n',
-          person.birth,
-          ' † ',
-          person.death,
-          '",style=filled,fillcolor=',
-          colour,'];')
+    return (f'{person.id} [label=" {person.name} {person.house} \\n {person.birth}  †  {person.death} '
+            f'",style=filled,fillcolor= {colour} {pinned(box)}];')
 
 
-
-def print_list(fam_dict):
+def print_list(fam_dict, file=None):
     """
     Cycle through all the people in the dictionary and their partners,
     to print their box information.
 
     Args:
     fam_dict (dict): a dictionary containing Person objects, with unique IDs as keys.
+    file (file): The text file to write to, or the standard output if None.
     """
-    for person in fam_dict.values():
-        print_person(person) # Print the individual box information.
-        #If this person has been married, print information about their partners.
-        if len(person.marriages) > 0 :
-            # Cycle through all their relationships.
-            for marriage in person.marriages:
-                print_person(marriage.partner2)
+    writer = DotWriter(file, header=False)
+    writer.write_boxes(fam_dict.values())
+    writer.close()
 
 
-def print_marriage_connections(couple, i):
+def print_marriage_connections(couple, i, file=None):
     """
     Print out the graphviz instructions for the relationship connections.
 
     Args:
     couple (Couple): a couple object containing information about a couple's relationship.
     i (int): a unique identifier for this relationship connection.
+    file (file): The text file to write to, or the standard output if None.
+    """
+    print(marriage_block(couple, 'h' + str(i)), file=file)
+
+
+def marriage_block(couple, marriage_label, kids=None, layout=None):
+    """
+    Put together the graphviz instructions for a relationship connection,
+    going through the children once.
+
+    Args:
+    couple (Couple): a couple object containing information about a couple's relationship.
+    marriage_label (str): The ID of the connection, which must start with 'h'.
+    kids (list): The children to connect, or None for all of the couple's children.
+    layout (Layout): If given, the points are pinned where it puts them.
+
+    Returns:
+    str: The lines of instructions.
     """
-    husband = couple.partner1
-    wife = couple.partner2
-    kids = couple.kids
-    marriage_label = str('h'+str(i)) # Each connection must have its own ID that starts with 'h'.
-    # Print the instructions.
     # If they are of the same gen, i.e. partners, they will be on the same level in the graph.
-    print('{ rank=same;')
-    print( husband.label, '  -> ', marriage_label, ' -> ', wife.label ,';')
-    print( marriage_label,'[shape=circle,label="",height=0.01,width=0.01];}')
-    if len(kids) > 0 :
-        print('{ rank=same;')
-        # For all the kids born from this relationship
-        for j in range(0, len(kids)):
-            # Every child is identified by the connectionID and the number of children before them.
-            kid_label = marriage_label + ('_')+ str(j)
-            print(kid_label, end='')
-            # If this is the last kid, print,
-            if j+1 == len(kids):
-                print(';')
-            # If there are more kids to be added,
-            else:
-                print('->',end='')
-        # For every child of this relationship
-        for j in range(0, len(kids)):
-            kid_label = marriage_label + ('_')+ str(j)
-            # Print the instructions for each child
-            print(kid_label,end='')
-            print('[shape=circle,label="",height=0.01,width=0.01];')
-        print('}')
-        pos = round(len(kids)/2) # Parents are positioned at halfway between all their children.
-        print(marriage_label, ' -> ', marriage_label + ('_') + str(0), ';')
-        # For every child:
-        for j in range(0, len(kids)):
-            # This is the IDspecific to graphviz instructions.
-            kid_label = marriage_label + ('_')+ str(j)
-            # This relates the graphviz ID to their dictionary ID.
-            print(kid_label, ' -> ', kids[j].label , ';')
-
-
-def print_all_marriage(fam_dict, i):
+    lines = ['{ rank=same;',
+             f'{couple.partner1.id}   ->  {marriage_label}  ->  {couple.partner2.id} ;',
+             f'{marriage_label} {point(layout and layout.marriage_point(couple))}}}']
+    if kids is None:
+        kids = couple.kids
+    if len(kids) > 0:
+        # Every child is identified by the connection ID and the number of children before them.
+        # The kids' points are chained on one level, and each point leads down to its child.
+        chain = []
+        points = []
+        edges = []
+        for j, kid in enumerate(kids):
+            kid_label = f'{marriage_label}_{j}'
+            chain.append(kid_label)
+            points.append(kid_label + point(layout and layout.kid_point(couple, kid)))
+            edges.append(f'{kid_label}  ->  {kid.id} ;')
+        lines.append('{ rank=same;')
+        lines.append('->'.join(chain) + ';')
+        lines.extend(points)
+        lines.append('}')
+        lines.append(f'{marriage_label}  ->  {marriage_label}_0 ;')
+        lines.extend(edges)
+    return '\n'.join(lines)
+
+
+def pinned(position):
+    """
+    Put together the attribute that pins a box or point in place, for neato -n.
+
+    Args:
+    position (tuple): The (x, y) of the centre, followed by anything else, or None.
+
+    Returns:
+    str: The attribute, or nothing if there is no position.
+    """
+    if not position:
+        return ''
+    return f',pos="{position[0]:.0f},{position[1]:.0f}!"'
+
+
+def point(position):
+    """
+    Put together the attributes of a small connection point.
+
+    Args:
+    position (tuple): The (x, y) of the point from a Layout, or None.
+
+    Returns:
+    str: The attributes.
+    """
+    if not position:
+        return POINT
+    return POINT[:-2] + pinned(position) + '];'
+
+
+def print_all_marriage(fam_dict, i, file=None):
     """
     Prints connections between married couples and their children.
 
     Parameters:
     fam_dict (dict): A dictionary containing information about individuals and their relationships.
     i (int): An integer that is used for connection ID.
+    file (file): The text file to write to, or the standard output if None.
 
     Returns:
-    None
+    i (int): The connection ID to use for the next relationship.
     """
-    for person in fam_dict.values():
-        # If a person has been married,
-        # print the connetions between them, their partner and children.
-        if len(person.marriages) > 0 :
-            for marriage in person.marriages:
-                print_marriage_connections(marriage, i) # Print individual marriage connections.
-                i = i + 1 # Increment i, which will be used for the connection ID.
+    writer = DotWriter(file, header=False, start=i)
+    writer.write_connections(fam_dict.values())
+    writer.close()
+    return writer.next_connection
 
 
-def print_instructions(fam_dict):
+def print_instructions(fam_dict, file=None):
     """
     Prints instructions for generating a family tree on Graphviz.
 
     Parameters:
     fam_dict (dict): A dictionary containing information about individuals and their relationships.
+    file (file): The text stream to write to, or the standard output if None.
 
     Returns:
     None
     """
     # I recommend using an online Graphviz application.
-    print('\n\nPRINTING GRAPHVIZ INSTRUCTIONS')
-    print('\n\ndigraph {')
-    print('node [shape=box];')
-    print('edge [dir=none];')
-    print_list(fam_dict) # The individual  box information about each person must be printed first.
-    i=0
-    print_all_marriage(fam_dict, i) # The instructions about each person is printed. connection
-    print('{ rank=same;}')
-    print('}')
+    print('\n\nPRINTING GRAPHVIZ INSTRUCTIONS\n\n')
+    with DotWriter(file) as writer:
+        writer.write_tree(fam_dict)
+
+
+def make_dot(output, fam_dict):
+    """
+    Write instructions for generating a family tree on Graphviz to a file or a stream.
+
+    Args:
+    output (str or file): The name of the file to write to, or a text stream,
+        such as an open file, the stdin of a dot process or an io.StringIO.
+    fam_dict (dict): A dictionary containing information about individuals and their relationships.
+
+    Returns:
+    None
+    """
+    with DotWriter(output) as writer:
+        writer.write_tree(fam_dict)
+
+
+class DotWriter:
+    """
+    This class is used to write the Graphviz instructions to a text stream in large blocks.
+    Each box and connection is put together as one string, and the strings are collected
+    and written DOT_BUFFER characters at a time, so a big tree is not held up by many small writes.
+    It can be given to expand_tree as a sink, or as a stage of a Pipeline,
+    and then writes the boxes and connections of each generation as soon as it is finished.
+    Methods are __init__, write_tree, write_generation, write_boxes, write_connections,
+    write_box, write_couple, flush, close.
+    """
+
+    def __init__(self, output=None, header=True, start=0, buffer_size=DOT_BUFFER, layout=None):
+        """
+        Opens the stream and writes the start of the graph.
+
+        Args:
+            output (str or file): The name of a file to write to, or a text stream,
+                such as an open file, the stdin of a dot process, a socket's makefile('w')
+                or an io.StringIO. If None, the standard output is used.
+            header (bool): Write the start of the graph now, and its end when the writer is closed.
+            start (int): The connection ID of the first relationship.
+            buffer_size (int): How many characters to collect before writing them all at once.
+            layout (Layout): If given, every box and point is pinned where it puts them, for neato -n.
+        """
+        self._own = isinstance(output, str)
+        if self._own:
+            self.filename = output
+            self._stream = open(output, 'w', encoding="utf-8", buffering=1 << 20)
+        else:
+            self.filename = None
+            self._stream = sys.stdout if output is None else output
+        self.header = header
+        self.buffer_size = buffer_size
+        self.layout = layout
+        self.next_connection = start  # The connection ID of the next relationship.
+        self._parts = []
+        self._size = 0
+        self._closed = False
+        if header:
+            self._add(DOT_HEADER)
+
+    def write_tree(self, fam_dict):
+        """
+        Writes the boxes of everyone in a tree, followed by all the connections, as print_instructions does.
+
+        Args:
+            fam_dict (dict): A dictionary containing information about individuals and their relationships.
+        """
+        # The individual box information about each person must be written first.
+        self.write_boxes(fam_dict.values())
+        self.write_connections(fam_dict.values())
+
+    def write_generation(self, people):
+        """
+        Writes the boxes of a group of people, and the connections of the relationships they head.
+
+        Args:
+            people (iterable): The people to write.
+        """
+        people = list(people)
+        self.write_boxes(people)
+        self.write_connections(people)
+
+    def write_boxes(self, people):
+        """
+        Writes the boxes of a group of people, and of the partners who married into their relationships.
+
+        Args:
+            people (iterable): The people to write.
+        """
+        for person in people:
+            self.write_box(person)
+            for marriage in person.marriages:
+                # A descendant matched as a partner has their own box already.
+                if marriage.partner1 == person and married_in(marriage.partner2):
+                    self.write_box(marriage.partner2)
+
+    def write_connections(self, people):
+        """
+        Writes the connections between a group of people, their partners and children.
+
+        Args:
+            people (iterable): The people to write.
+        """
+        for person in people:
+            for marriage in person.marriages:
+                # Each relationship is connected once, from the partner who heads it.
+                if marriage.partner1 != person:
+                    continue
+                self.write_couple(marriage)
+
+    def write_box(self, person):
+        """
+        Writes the box of one person.
+
+        Args:
+            person (Descendant): The person.
+        """
+        self._add(person_box(person, self.layout and self.layout.box(person)))
+
+    def write_couple(self, couple, kids=None):
+        """
+        Writes the connections of one relationship, with the next connection ID.
+
+        Args:
+            couple (Couple): The relationship.
+            kids (list): The children to connect, or None for all of them.
+        """
+        self._add(marriage_block(couple, 'h' + str(self.next_connection), kids, self.layout))
+        self.next_connection = self.next_connection + 1
+
+    def flush(self):
+        """
+        Writes the collected instructions to the stream.
+        """
+        if len(self._parts) > 0:
+            self._parts.append('')
+            self._stream.write('\n'.join(self._parts))
+            self._parts = []
+            self._size = 0
+        self._stream.flush()
+
+    def close(self):
+        """
+        Writes the end of the graph, and closes the stream if the writer opened it.
+        A stream that was given to the writer is left open.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.header:
+            self._add(DOT_FOOTER)
+        self.flush()
+        if self._own:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _add(self, text):
+        """
+        Collects a block of lines, and writes the collected blocks once there are enough of them.
+        """
+        self._parts.append(text)
+        self._size = self._size + len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+
+class DotFile:
+    """
+    This class is used to keep a file of Graphviz instructions up to date as a tree grows,
+    without writing all of it again each time.
+    Every person's box is a fragment of the file, and so is every relationship, with the box
+    of the partner who married in. Each fragment is kept with the version of its person or relationship,
+    which goes up when their marriages or children change, so an update only puts together
+    the fragments whose version has changed, and the fragments of people who are new.
+    New fragments are written at the end of the file, before the end of the graph.
+    A fragment that comes out different, or belongs to someone no longer in the tree,
+    means the file is written again from that fragment on.
+    Graphviz takes a box's label and colour wherever it is in the graph,
+    so a person's box can come after the connections of their parents.
+    Methods are __init__, update, render.
+    """
+
+    def __init__(self, filename):
+        """
+        Creates an instance of the DotFile class. The file is written by the first update.
+
+        Args:
+            filename (str): The name of the file to keep up to date.
+        """
+        self.filename = filename
+        self._keys = []  # The keys of the fragments, in the order they are in the file.
+        # The fragments by key: the person's ID, or the connection ID of the relationship.
+        # Each is [version, instructions as bytes, the update it was last seen in].
+        self._fragments = {}
+        self._updates = 0  # How many times the file has been updated.
+
+    def update(self, fam_dict):
+        """
+        Brings the file up to date with a tree, for example after expand_tree has added generations to it.
+
+        Args:
+            fam_dict (dict): A dictionary containing information about individuals and their relationships.
+
+        Returns:
+            int: The number of fragments that were put together again.
+        """
+        self._updates = self._updates + 1
+        seen = self._updates
+        new_keys = []
+        changed = set()
+        rendered = 0
+        for person in fam_dict.values():
+            rendered = rendered + self._check(person.id, person, seen, new_keys, changed)
+            for couple in person.marriages:
+                # Each relationship is a fragment once, from the partner who heads it.
+                if couple.partner1 == person:
+                    rendered = rendered + self._check('h' + str(couple.id), couple, seen, new_keys, changed)
+        # Find where the file first differs, going through the fragments that are already in it.
+        fragments = self._fragments
+        offset = len(DOT_HEADER) + 1
+        start = None  # The place in the file to write from, and the first fragment to write there.
+        kept = []
+        for key in self._keys:
+            fragment = fragments[key]
+            if fragment[2] != seen:
+                # The person or relationship is no longer in the tree.
+                del fragments[key]
+                if start is None:
+                    start = (offset, len(kept))
+                continue
+            if start is None:
+                if key in changed:
+                    start = (offset, len(kept))
+                else:
+                    offset = offset + len(fragment[1])
+            kept.append(key)
+        self._keys = kept + new_keys
+        if self._updates == 1:
+            self._write(0, 0, 'wb')
+        elif start is not None:
+            self._write(start[0], start[1], 'r+b')
+        elif len(new_keys) > 0:
+            # Only the end of the graph has to be written again, after the new fragments.
+            self._write(offset, len(kept), 'r+b')
+        return rendered
+
+    def render(self, item):
+        """
+        Puts together the fragment of a person or a relationship.
+
+        Args:
+            item (Descendant or Couple): The person, or the relationship.
+
+        Returns:
+            bytes: The instructions, ending with a new line.
+        """
+        if isinstance(item, Descendant):
+            text = person_box(item)
+        else:
+            text = marriage_block(item, 'h' + str(item.id))
+            # A descendant matched as a partner has a fragment of their own.
+            if married_in(item.partner2):
+                text = person_box(item.partner2) + '\n' + text
+        return (text + '\n').encode('utf-8')
+
+    def _check(self, key, item, seen, new_keys, changed):
+        """
+        Puts together a fragment again if it is new or its version has changed.
+
+        Returns:
+            int: 1 if the fragment was put together, 0 if not.
+        """
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            self._fragments[key] = [item.version, self.render(item), seen]
+            new_keys.append(key)
+            return 1
+        fragment[2] = seen
+        if fragment[0] == item.version:
+            return 0
+        fragment[0] = item.version
+        text = self.render(item)
+        # Marrying changes the version of a person, but not their box.
+        if text != fragment[1]:
+            fragment[1] = text
+            changed.add(key)
+        return 1
+
+    def _write(self, offset, first, mode):
+        """
+        Writes the fragments from the first given one onwards, and the end of the graph, at a place in the file.
+        """
+        fragments = self._fragments
+        with open(self.filename, mode) as dot_file:
+            if mode == 'wb':
+                dot_file.write((DOT_HEADER + '\n').encode('utf-8'))
+            else:
+                dot_file.seek(offset)
+                dot_file.truncate()
+            block = []
+            size = 0
+            for key in self._keys[first:]:
+                text = fragments[key][1]
+                block.append(text)
+                size = size + len(text)
+                # The fragments are written DOT_BUFFER bytes at a time.
+                if size >= DOT_BUFFER:
+                    dot_file.write(b''.join(block))
+                    block = []
+                    size = 0
+            block.append((DOT_FOOTER + '\n').encode('utf-8'))
+            dot_file.write(b''.join(block))
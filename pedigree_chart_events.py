@@ -0,0 +1,164 @@
+"""
+A simulation that moves the family tree through time one event at a time,
+instead of a whole generation at a time.
+Births, marriages, the ends of relationships and deaths wait in a queue ordered by year,
+so the tree can be stopped at any year. Only living people have events waiting,
+so each step costs as much as the living population, however big the tree has grown.
+"""
+
+import heapq
+from itertools import count
+from pedigree_chart_expand_tree import MARRIAGE_AGE, ROMANCE_AGE, as_tree
+
+# The kinds of event. Events in the same year happen in the order they were planned.
+BIRTH = 0
+MARRIAGE = 1
+END = 2
+DEATH = 3
+
+
+class Simulation:
+    """
+    This class is used to grow a family tree in order of time.
+    The people, relationships and children are made by the same rules as expand_tree,
+    but each marriage is only made in the year it begins, and each child only joins
+    the tree in the year they are born. As relationships are made in order of time,
+    the chance of an affair depends on the marriages a person has had so far,
+    not on every marriage they will ever have, so the trees are not the same as expand_tree's.
+    Methods are __init__, simulate_until, simulate_events, step, start_life.
+    """
+
+    def __init__(self, fam_dict, vectorized=False):
+        """
+        Creates an instance of the Simulation class.
+
+        Args:
+            fam_dict (dict): The tree to start from, such as make_initial_tree gives.
+                Its unmarried people are alive at the start, everyone else is left as they are.
+            vectorized (bool): Use the NumPy sampler to generate children.
+        """
+        self.fam_dict = as_tree(fam_dict)
+        self.vectorized = vectorized
+        self.living = {}  # The people who are alive, by ID.
+        self.couples = {}  # The relationships that have not ended yet, by ID.
+        self.events = 0  # The number of events so far.
+        # Waiting events, as (year, order, kind, subject). The order keeps events of the
+        # same year in the order they were planned, such as twins in their birth order.
+        self._queue = []
+        self._order = count()
+        people = list(self.fam_dict.frontier.values())
+        # The clock starts at the first birth among the people the tree starts from.
+        self.year = min((person.birth for person in people), default=0)
+        for person in people:
+            self.start_life(person)
+
+    def simulate_until(self, year):
+        """
+        Carries out every event up to and including a year.
+
+        Args:
+            year (int): The year to stop at.
+
+        Returns:
+            FamilyTree: The family tree as it is at the end of the year.
+        """
+        # Print a message to indicate how far the simulation is going.
+        print('\nSIMULATING UNTIL', year)
+        while len(self._queue) > 0 and self._queue[0][0] <= year:
+            self.step()
+        self.year = max(self.year, year)
+        print('Living Pop:', len(self.living))
+        return self.fam_dict
+
+    def simulate_events(self, number):
+        """
+        Carries out a number of events, or every event that is left if there are fewer.
+
+        Args:
+            number (int): The number of events.
+
+        Returns:
+            FamilyTree: The family tree after the events.
+        """
+        for _ in range(number):
+            if len(self._queue) == 0:
+                break
+            self.step()
+        return self.fam_dict
+
+    def step(self):
+        """
+        Carries out the next event.
+
+        Returns:
+            tuple: The year, kind and subject of the event.
+        """
+        year, _, kind, subject = heapq.heappop(self._queue)
+        self.year = year
+        self.events = self.events + 1
+        if kind == BIRTH:
+            # The child joins their parents and the tree, and is unmarried.
+            kid, couple = subject
+            couple.add_kid(kid)
+            self.fam_dict[kid.id] = kid
+            self.fam_dict.frontier[kid.id] = kid
+            self.start_life(kid)
+        elif kind == MARRIAGE:
+            self.marry(*subject)
+        elif kind == END:
+            self.couples.pop(subject.id, None)
+        else:
+            self.living.pop(subject.id, None)
+        return year, kind, subject
+
+    def start_life(self, person):
+        """
+        Plans the death and the first relationships of a descendant.
+
+        Args:
+            person (Descendant): The descendant, who has just been born.
+        """
+        self.living[person.id] = person
+        self._plan(person.death, DEATH, person)
+        self._plan_marriage(person, person.legit_marriage_years(MARRIAGE_AGE, self.vectorized))
+        self._plan_marriage(person, person.illegit_marriage_years(ROMANCE_AGE, self.vectorized))
+
+    def marry(self, person, marriages):
+        """
+        Makes a relationship in the year it begins, and plans what follows from it.
+
+        Args:
+            person (Descendant): The descendant.
+            marriages (generator): The descendant's legit_marriage_years or illegit_marriage_years,
+                which makes the relationship when it is asked for the next year.
+        """
+        before = len(person.marriages)
+        self._plan_marriage(person, marriages)
+        for couple in person.marriages[before:]:
+            # The descendant is no longer unmarried.
+            self.fam_dict.frontier.pop(person.id, None)
+            self.couples[couple.id] = couple
+            self._plan(couple.end, END, couple)
+            partner = couple.partner2
+            self.living[partner.id] = partner
+            self._plan(partner.death, DEATH, partner)
+            # The children are made with the relationship, but only join it when they are born.
+            kids = couple.kids
+            couple.kids = ()
+            couple.version = couple.version + 1
+            for kid in kids:
+                self._plan(kid.birth, BIRTH, (kid, couple))
+
+    def _plan_marriage(self, person, marriages):
+        """
+        Plans the next relationship from a generator of relationship years, if there is one.
+        """
+        year = next(marriages, None)
+        if year is not None:
+            self._plan(year, MARRIAGE, (person, marriages))
+
+    def _plan(self, year, kind, subject):
+        """
+        Adds an event to the queue.
+        """
+        heapq.heappush(self._queue, (year, next(self._order), kind, subject))
@@ -2,24 +2,36 @@
 This file generates the tree and new generations, from a dictionary fortmat.
 """
 
+import copy
+from concurrent.futures import ProcessPoolExecutor
 from random import randint
-from pedigree_chart_classes import Descendant
+from pedigree_chart_classes import Descendant, assign_deaths, lineage_key
+from pedigree_chart_ids import next_id
+from pedigree_chart_random import get_seed, seed_random, set_seed, stream
 
+# The minimum age for legal marriage and the minimum age for illegitimate relationships.
+MARRIAGE_AGE = 18
+ROMANCE_AGE = 16
 
-def make_initial_tree(start_year):
+
+def make_initial_tree(start_year, seed=None):
     """
     Generates a person with no ancestors to start the tree.
 
     Args:
         start_year (int): The birth year of the person to create as the root of the tree.
+        seed (int): If given, the root seed of the run, so the same seed always gives the same tree.
 
     Returns:
-        Dict: A dictionary representing the initial family tree with the root node.
+        FamilyTree: A dictionary representing the initial family tree with the root node.
     """
 
     # Print a message to indicate that we're making the initial tree.
     print('\nMAKING INITIAL TREE')
 
+    if seed is not None:
+        set_seed(seed)
+
     # Create a new person with no ancestors using the Descendant class.
     # Randomly determine the gender of the person using randint(0, 1),
     # where 0 represents male and 1 represents female.
@@ -27,73 +39,455 @@ def make_initial_tree(start_year):
     # as well as setting sexuality as straight to increase chance of having children.
     # Set the position of child produced in relationship as None,
     # as person is not created from any relationship.
-    ancestor = Descendant(start_year, randint(0, 1), [0, 0, True], None)
+    ancestor = Descendant(start_year, stream('0', 'root').randint(0, 1), [0, 0, True], None)
 
-    # Create a new dictionary to represent the family tree and add the root node to it.
-    fam_dict = {ancestor.label: ancestor}
+    # Create a new family tree and add the root node to it.
+    fam_dict = FamilyTree({ancestor.id: ancestor})
 
     # Return the dictionary representing the initial family tree.
     return fam_dict
 
 
-def expand_tree(fam_dict, max_gen):
+def expand_tree(fam_dict, max_gen, vectorized=False, workers=None, seed=None, sink=None, keep=True,
+                checkpoint=None, budget=None, market=None):
     """
     Generates new generations to add to the family tree.
+    A FamilyTree is expanded in place, starting from its frontier, so adding generations costs
+    only as much as the new people. Any other dictionary is made into a FamilyTree first.
 
     Args:
         Dict (dict): A dictionary representing the current family tree.
         max_gen (int): The maximum number of generations to generate.
+        vectorized (bool): Use the NumPy sampler to generate children, needs numpy installed.
+        workers (int): Number of processes to expand each generation with.
+            If None or 1, everything runs in this process.
+            On Windows, the calling script must be guarded by if __name__ == '__main__'.
+        seed (int): If given, the root seed of the run. Every person draws from a stream
+            made from the seed and their lineage path, so the tree is the same
+            whether it is built serially, in parallel or one subtree at a time.
+        sink (CsvWriter): If given, every generation is written to it as soon as it is finished,
+            the people who were already married first and the unmarried people at the end.
+            Anything with write_generation(people) and flush() can be used,
+            such as a Pipeline, which writes to several exports while the next generation is generated.
+        keep (bool): If False, people are dropped once they have been written to the sink,
+            so only the newest generation is held in memory.
+        checkpoint (Checkpoint): If given, every finished generation is appended to it,
+            so the run can be carried on with resume_tree if it is stopped.
+        budget (Budget): If given, its pruning policies choose who is expanded in each generation,
+            and the run stops early when it reaches one of its limits, leaving the rest unmarried.
+            What each generation pruned is recorded in budget.reports.
+            With workers, the limits are only checked between generations.
+        market (MarriageMarket): If given, partners are matched from the unmarried people
+            of the same generation where they can be, so houses marry into each other.
+            People who are taken as a partner are not expanded themselves.
+            It can't be used with workers, as the whole generation has to be in one process.
 
     Returns:
-        dict: A dictionary representing the updated family tree.
+        FamilyTree: The updated family tree,
+            or only its unmarried people if keep is False.
     """
     # Print a message to indicate that we're expanding the family tree.
     print('\nEXPANDING FAMILY TREE')
 
-    # Split the dictionary into two groups: married and unmarried people.
-    [old_dict, new_dict] = split_dict(fam_dict)
+    if seed is not None:
+        set_seed(seed)
+
+    # The unmarried people are kept in the tree's frontier, so the tree doesn't need splitting.
+    fam_dict = as_tree(fam_dict)
+    # Anyone who married after they were put in the tree is not unmarried any more.
+    frontier = fam_dict.frontier
+    for person_id in [key for key, person in frontier.items() if len(person.marriages) > 0]:
+        del frontier[person_id]
+    new_dict = dict(frontier)
+
+    # The checkpoint starts with the tree as it is now.
+    if checkpoint is not None:
+        checkpoint.start(fam_dict, new_dict, max_gen, vectorized, budget)
+
+    return expand_generations(fam_dict, new_dict, max_gen, vectorized, workers, sink, keep, checkpoint,
+                              budget, market)
+
+
+def expand_generations(fam_dict, new_dict, max_gen, vectorized=False, workers=None, sink=None, keep=True,
+                       checkpoint=None, budget=None, market=None):
+    """
+    Generates new generations below some of the unmarried people of a tree, in place.
+    The arguments are the same as for expand_tree.
+
+    Args:
+        fam_dict (FamilyTree): The whole tree, including the people in new_dict.
+        new_dict (dict): The unmarried people to expand first.
+
+    Returns:
+        FamilyTree: The updated family tree,
+            or only its unmarried people if keep is False.
+    """
+
+    # People who are already married will not change, so they can be written straight away.
+    if sink is not None:
+        old_people = [person for key, person in fam_dict.items() if key not in new_dict]
+        sink.write_generation(old_people)
+        if not keep:
+            release_written(sink, old_people)
+            for person in old_people:
+                del fam_dict[person.id]
 
     # Set the minimum age for legal marriage and the minimum age for illegitimate relationships.
-    marriage_age = 18
-    romance_age = 16
+    marriage_age = MARRIAGE_AGE
+    romance_age = ROMANCE_AGE
+
+    if market is not None and workers is not None and workers > 1:
+        raise ValueError('The marriage market needs the whole generation in one process, so it can not use workers.')
+
+    # The time limit starts with the generations.
+    if budget is not None:
+        budget.start()
+
+    # The same processes are used for every generation.
+    executor = None
+    if workers is not None and workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        # Iterate through each generation, creating marriages and generating children.
+        for _ in range(0, max_gen):
+            # Stop, leaving the tree as it is, once the budget has run out.
+            if budget is not None and budget.exceeded(len(fam_dict)):
+                break
+
+            # Print a message indicating that we're starting a new generation.
+            print('\nNew Gen!')
+
+            # Create a new dictionary to store the children generated in this generation.
+            kid_dict = {}
+            frontier = fam_dict.frontier
+
+            # For each unmarried person, generate marriages and potential children.
+            # The people that are pruned stay unmarried.
+            people = new_dict.values()
+            if budget is not None:
+                people = budget.prune(list(people))
+            # Everyone who is unmarried can be matched, even the people that were pruned.
+            if market is not None:
+                market.open(new_dict.values())
+            if executor is not None:
+                expand_parallel(executor, workers, list(people), marriage_age, romance_age, vectorized)
+            elif budget is None:
+                for person in people:
+                    expand_person(person, marriage_age, romance_age, vectorized, market)
+            else:
+                people = expand_within(budget, fam_dict, people, marriage_age, romance_age, vectorized,
+                                       market)
+
+            # For each new child, add to the kid_dict and the tree.
+            # People who married are no longer in the frontier, and their children are.
+            for person in new_dict.values():
+                if len(person.marriages) > 0:
+                    del frontier[person.id]
+                for couple in person.marriages:
+                    for child in couple.kids:
+                        kid_dict[child.id] = child
+                        fam_dict[child.id] = child
+
+            # Nobody needs the death year of the new children until the next generation,
+            # so draw them for the whole generation in one call.
+            assign_deaths(kid_dict.values())
+
+            # The newly-weds are finished, so write them to the sink.
+            if sink is not None:
+                sink.write_generation(new_dict.values())
+
+            # Append the generation to the checkpoint, so the run can be carried on from here.
+            if checkpoint is not None:
+                checkpoint.write_generation(new_dict.values(), kid_dict.values())
+
+            # The newly-weds are already in the tree. If they are not kept, drop them from it.
+            if not keep and sink is not None:
+                release_written(sink, new_dict.values())
+                for person in new_dict.values():
+                    del fam_dict[person.id]
+
+            # Print the number of unmarried people in the previous generation and the new generation.
+            print('Previous Unmarried Pop:',len(new_dict))
+            if budget is not None:
+                budget.record(len(new_dict), len(people), len(kid_dict))
+
+            new_dict = kid_dict
+            print('Current Unmarried Pop:',len(new_dict))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # A run its budget stopped is not carried on past the budget when it is resumed.
+    if checkpoint is not None and budget is not None and budget.stopped is not None:
+        checkpoint.stop(budget.stopped, new_dict.keys())
+
+    # The unmarried people of the last generation are written last.
+    if sink is not None:
+        sink.write_generation(new_dict.values())
+        sink.flush()
+
+    # Return the updated family tree.
+    return fam_dict
+
+
+
+def expand_person(person, marriage_age, romance_age, vectorized=False, market=None):
+    """
+    Generates the marriages and children of one person.
+
+    Args:
+        person (Descendant): The person to expand.
+        marriage_age (int): The minimum age for legal marriage.
+        romance_age (int): The minimum age for illegitimate relationships.
+        vectorized (bool): Use the NumPy sampler to generate children.
+        market (MarriageMarket): If given, partners are matched from the people in it.
+    """
+    # Someone the market has already matched as a partner is married into another lineage.
+    if market is not None and len(person.marriages) > 0:
+        return
+
+    # Generate legitimate marriages for the person if they are old enough.
+    Descendant.generate_legit_marriage(person, marriage_age, vectorized, market)
 
-    # Iterate through each generation, creating marriages and generating children.
-    for _ in range(0, max_gen):
-        # Print a message indicating that we're starting a new generation.
-        print('\nNew Gen!')
+    # Generate illegitimate marriages for the person if they are old enough.
+    Descendant.generate_illegit_marriage(person, romance_age, vectorized, market)
 
-        # Create a new dictionary to store the children generated in this generation.
-        kid_dict = {}
 
-        # For each unmarried person, generate marriages and potential children.
-        for person in new_dict.values():
+def expand_within(budget, fam_dict, people, marriage_age, romance_age, vectorized=False, market=None):
+    """
+    Expands the people of a generation one at a time, until the budget runs out.
 
-            # Generate legitimate marriages for the person if they are old enough.
-            Descendant.generate_legit_marriage(person, marriage_age)
+    Args:
+        budget (Budget): The budget of the run.
+        fam_dict (FamilyTree): The tree, before the children of the generation are added.
+        people (list): The people to expand, in order.
+        marriage_age (int): The minimum age for legal marriage.
+        romance_age (int): The minimum age for illegitimate relationships.
+        vectorized (bool): Use the NumPy sampler to generate children.
+        market (MarriageMarket): If given, partners are matched from the people in it.
 
-            # Generate illegitimate marriages for the person if they are old enough.
-            Descendant.generate_illegit_marriage(person, romance_age)
+    Returns:
+        list: The people that were expanded.
+    """
+    born = 0  # The children born so far in the generation, who are not in the tree yet.
+    for count, person in enumerate(people):
+        if budget.exceeded(len(fam_dict) + born, count):
+            return people[:count]
+        expand_person(person, marriage_age, romance_age, vectorized, market)
+        for couple in person.marriages:
+            if couple.partner1 is person:
+                born = born + len(couple.kids)
+    return people
+
+
+def expand_parallel(executor, workers, people, marriage_age, romance_age, vectorized=False):
+    """
+    Expands a generation across processes.
+    Each person's marriages and children depend only on that person,
+    so the generation is cut into shards of neighbouring lineages.
 
-            # For each new child, add to the kid_dict.
-            for couple in person.marriages:
-                for child in couple.kids:
-                    kid_dict[child.label] = child
+    Args:
+        executor (ProcessPoolExecutor): The processes to run the shards in.
+        workers (int): The number of processes.
+        people (list): The unmarried people of the generation, in order.
+        marriage_age (int): The minimum age for legal marriage.
+        romance_age (int): The minimum age for illegitimate relationships.
+        vectorized (bool): Use the NumPy sampler to generate children.
+    """
+    # Use a few shards per process, so a slow shard doesn't hold up the others.
+    shard_count = min(len(people), workers * 4)
+    if shard_count == 0:
+        return
+    size = -(-len(people) // shard_count)
+    shards = [people[i:i + size] for i in range(0, len(people), size)]
+    # In a seeded run every person has their own streams, made from the root seed.
+    # Otherwise every shard gets its own random stream, seeded from this process' stream.
+    seeds = [randint(0, 2**63) for _ in shards]
+    # Copies are sent to the processes without their parents,
+    # otherwise the whole tree would be copied along with them.
+    results = executor.map(expand_shard,
+                           [[detach(person) for person in shard] for shard in shards],
+                           seeds,
+                           [get_seed()] * len(shards),
+                           [marriage_age] * len(shards),
+                           [romance_age] * len(shards),
+                           [vectorized] * len(shards))
+    # map returns the shards in the order they were sent, so the merge is always the same,
+    # and gives out the IDs in the same order as a serial run would.
+    for shard, expanded in zip(shards, results):
+        for person, clone in zip(shard, expanded):
+            merge_person(person, clone)
+
+
+def expand_shard(people, number, root_seed, marriage_age, romance_age, vectorized):
+    """
+    Expands a shard of people. This runs in a worker process.
 
-        # Add the newly-weds to the married dictionary.
-        old_dict = old_dict|new_dict
+    Args:
+        people (list): Detached copies of the people to expand.
+        number (int): The seed for this shard's random stream, used if the run is not seeded.
+        root_seed (int): The root seed of the run, or None.
+        marriage_age (int): The minimum age for legal marriage.
+        romance_age (int): The minimum age for illegitimate relationships.
+        vectorized (bool): Use the NumPy sampler to generate children.
 
-        # Print the number of unmarried people in the previous generation and the new generation.
-        print('Previous Unmarried Pop:',len(new_dict))
+    Returns:
+        list: The same people, now with their marriages and children.
+    """
+    set_seed(root_seed)
+    if root_seed is None:
+        seed_random(number)
+    for person in people:
+        expand_person(person, marriage_age, romance_age, vectorized)
+    return people
 
-        new_dict = kid_dict
-        print('Current Unmarried Pop:',len(new_dict))
 
-    # Combine the old and new dictionaries to create the final family tree.
-    fam_dict = old_dict|new_dict
+def detach(person):
+    """
+    Makes a copy of a person that does not link back into the tree.
 
-    # Return the updated family tree.
-    return fam_dict
+    Args:
+        person (Descendant): The person to copy.
 
+    Returns:
+        Descendant: The copy, with no parents and no marriages.
+    """
+    clone = copy.copy(person)
+    # The lineage key is worked out from the parents, so the copy keeps it to make its streams from.
+    clone.label = person.name + lineage_key(person)
+    clone.parents = None
+    clone.marriages = ()
+    return clone
+
+
+def merge_person(person, clone):
+    """
+    Copies the marriages made for a detached copy back onto the person in the tree.
+    The IDs given out in the worker process are replaced with IDs from this process.
+
+    Args:
+        person (Descendant): The person in the tree.
+        clone (Descendant): The expanded copy of the person.
+    """
+    person.marriages = clone.marriages
+    person.birth_years = clone.birth_years
+    person.death = clone.death
+    # The marriages were added to the copy, so the person's own count has to be moved on.
+    person.version = person.version + 1
+    for couple in person.marriages:
+        # The relationship should point at the person in the tree, not the copy.
+        couple.partner1 = person
+        # A relationship takes its ID before the partner and children are made.
+        couple.id = next_id()
+        couple.partner2.id = next_id()
+        for kid in couple.kids:
+            kid.id = next_id()
+
+
+def release(people):
+    """
+    Cuts written people off from their ancestors, so the generations before them can be freed.
+    Each person keeps their name and lineage key as their label, as they can no longer be worked out
+    from their parents.
+
+    Args:
+        people (iterable): The people that have been written.
+    """
+    for person in people:
+        person.label = person.name + lineage_key(person)
+        person.parents = [0, 0, True]
+
+
+def release_written(sink, people):
+    """
+    Releases people once they have been written to a sink.
+    A sink that writes in the background, such as a Pipeline, has its own release,
+    which waits until the people have been written.
+
+    Args:
+        sink (CsvWriter): The sink the people were written to.
+        people (iterable): The people that have been written.
+    """
+    getattr(sink, 'release', release)(people)
+
+
+class FamilyTree(dict):
+    """
+    This class is used to represent a family tree: a dictionary of the descendants, keyed by ID,
+    that also keeps a frontier of the people who are not married yet.
+    expand_tree updates the frontier as people marry and are born, so it never has to
+    go through the whole tree to find who to expand next.
+    Everything that adds or removes people, such as read_csv storing them, keeps the frontier up to date.
+    Methods are __init__, __setitem__, __delitem__, update, setdefault, pop, popitem, clear.
+    """
+
+    def __init__(self, people=(), frontier=None):
+        """
+        Creates an instance of the FamilyTree class.
+
+        Args:
+            people (dict): The people to put in the tree, keyed by ID.
+            frontier (dict): The unmarried people of the tree, keyed by ID, if they are known already.
+                If None, the frontier is found by going through the people once.
+        """
+        dict.__init__(self, people)
+        if frontier is None:
+            frontier = split_dict(self)[1]
+        self.frontier = frontier
+
+    def __setitem__(self, key, person):
+        dict.__setitem__(self, key, person)
+        if len(person.marriages) == 0:
+            self.frontier[key] = person
+        else:
+            self.frontier.pop(key, None)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.frontier.pop(key, None)
+
+    def __ior__(self, people):
+        self.update(people)
+        return self
+
+    def update(self, *people, **more):
+        for key, person in dict(*people, **more).items():
+            self[key] = person
+
+    def setdefault(self, key, person=None):
+        if key not in self:
+            self[key] = person
+        return dict.__getitem__(self, key)
+
+    def pop(self, key, *default):
+        self.frontier.pop(key, None)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, person = dict.popitem(self)
+        self.frontier.pop(key, None)
+        return key, person
+
+    def clear(self):
+        dict.clear(self)
+        self.frontier.clear()
+
+
+def as_tree(fam_dict):
+    """
+    Returns a dictionary as a FamilyTree.
+    A FamilyTree is returned as it is, anything else is copied into a new one.
+
+    Args:
+        fam_dict (dict): A dictionary representing the family tree.
+
+    Returns:
+        FamilyTree: The family tree.
+    """
+    if isinstance(fam_dict, FamilyTree):
+        return fam_dict
+    return FamilyTree(fam_dict)
 
 
 def split_dict(fam_dict):
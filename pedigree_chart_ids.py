@@ -0,0 +1,56 @@
+"""
+Hands out the integer IDs of people and relationships.
+Every person and couple gets the next number when it is created, so an ID costs the same
+however deep in the tree it is. The old labels, made from names and lineage paths,
+are still worked out from the tree when they are asked for.
+"""
+
+from itertools import count
+
+# The numbers still to be handed out.
+_ids = count()
+
+
+def next_id():
+    """
+    Returns a new ID.
+
+    Returns:
+        new_id (int): A number that has not been handed out before.
+    """
+    return next(_ids)
+
+
+def peek_id():
+    """
+    Returns the ID that will be handed out next, without handing it out.
+
+    Returns:
+        new_id (int): The next ID.
+    """
+    global _ids
+    new_id = next(_ids)
+    _ids = count(new_id)
+    return new_id
+
+
+def reserve_ids(used):
+    """
+    Makes sure IDs that are already in use, such as those read from a file, are not handed out again.
+
+    Args:
+        used (int): The highest ID in use.
+    """
+    global _ids
+    _ids = count(max(next(_ids), used + 1))
+
+
+def reset_ids(start=0):
+    """
+    Starts handing out IDs from a number again, for example before building a new tree.
+
+    Args:
+        start (int): The first ID to hand out.
+    """
+    global _ids
+    _ids = count(start)
@@ -0,0 +1,379 @@
+"""
+Works out where every box and connection of the graph goes, so Graphviz doesn't have to.
+The tree already knows each person's generation and the order of each couple's children,
+so the boxes are placed with a tidy tree layout in linear time. Each descendant is placed
+together with the partners who married into their relationships, as one unit, and each unit
+is centred over its children. The positions are written as pinned pos attributes,
+so the graph can be drawn with neato -n in seconds instead of waiting for dot to lay it out.
+"""
+
+from pedigree_chart_classes import married_in
+from pedigree_chart_display import DotWriter
+
+# Sizes in points, the unit Graphviz uses for positions.
+CHAR_WIDTH = 7  # The width of a character of a label.
+BOX_PADDING = 16  # The space around the label inside a box.
+BOX_HEIGHT = 36  # The height of a box, with two lines of label.
+BOX_GAP = 20  # The space between boxes next to each other.
+ROW_HEIGHT = 120  # The distance from one generation to the next.
+POINT_GAP = 6  # The distance between the connection points of a person's relationships.
+MARGIN = 20  # The space around the whole graph.
+
+
+class Layout:
+    """
+    This class is used to work out the positions of a tree's boxes and connection points.
+    Generations go down the page. Within a generation, each descendant's box is followed
+    by the boxes of the partners who married into their relationships. The units are placed by
+    the Reingold-Tilford algorithm, in the linear time version by Buchheim, Junger and Leipert,
+    so the subtrees are packed as close as they can be without overlapping.
+    A descendant matched as a partner by the marriage market is placed with their own parents.
+    Methods are __init__, box, marriage_point, kid_point, generation.
+    """
+
+    def __init__(self, fam_dict):
+        """
+        Creates an instance of the Layout class, and works out every position.
+
+        Args:
+            fam_dict (dict): A dictionary representing the family tree.
+                It can be only part of a tree, such as a neighbourhood: anyone whose parents are not in it
+                starts a tree of their own, and the trees are placed side by side.
+        """
+        self.boxes = {}  # The centre and width of every box, as (x, y, width), by person ID.
+        self.points = {}  # The point of every relationship, as (x, y), by couple ID.
+        self._generations = {}  # The generation of every person, by ID.
+        self.width = 0
+        self.height = 0
+        # Partners who married in are placed next to the person they married, not as units of their own.
+        nodes = {person.id: _Node(person) for person in fam_dict.values() if not married_in(person)}
+        # The children of each unit are the children of the relationships its descendant heads.
+        root = _Node(None)
+        for node in nodes.values():
+            person = node.person
+            widths = [box_width(person)]
+            for couple in person.marriages:
+                if couple.partner1 != person:
+                    continue
+                if couple.partner2.id not in nodes:
+                    node.partners.append(couple.partner2)
+                    widths.append(box_width(couple.partner2))
+                for kid in couple.kids:
+                    child = nodes.get(kid.id)
+                    if child is not None and child.parent is None:
+                        child.parent = node
+                        child.number = len(node.children)
+                        node.children.append(child)
+            node.widths = widths
+            node.width = sum(widths) + BOX_GAP * (len(widths) - 1)
+        # Everyone without parents in the tree hangs from a root that is not drawn.
+        for node in nodes.values():
+            if node.parent is None:
+                node.parent = root
+                node.number = len(root.children)
+                root.children.append(node)
+        if len(root.children) == 0:
+            return
+        first_walk(root)
+        deepest = second_walk(root)
+        left = min(node.x - node.width / 2 for node in nodes.values())
+        for node in nodes.values():
+            self._place(node, MARGIN - left, deepest)
+        # The points go between partners, who may be in other units, so they are placed after every box.
+        for node in nodes.values():
+            self._place_points(node)
+        self.width = max(x + width / 2 for x, _, width in self.boxes.values()) + MARGIN
+        self.height = deepest * ROW_HEIGHT + BOX_HEIGHT + MARGIN * 2
+
+    def box(self, person):
+        """
+        Returns where a person's box is.
+
+        Args:
+            person (Descendant): The person.
+
+        Returns:
+            tuple: The centre and width of the box, as (x, y, width), or None if they are not in the layout.
+        """
+        return self.boxes.get(person.id)
+
+    def marriage_point(self, couple):
+        """
+        Returns where the point that joins a couple is.
+
+        Args:
+            couple (Couple): The relationship.
+
+        Returns:
+            tuple: The position, as (x, y), or None if the relationship is not in the layout.
+        """
+        return self.points.get(couple.id)
+
+    def kid_point(self, couple, kid):
+        """
+        Returns where the point that joins a child to their parents' relationship is:
+        just above the child's box, or under the relationship if the child is not in the layout.
+
+        Args:
+            couple (Couple): The parents' relationship.
+            kid (Descendant): The child.
+
+        Returns:
+            tuple: The position, as (x, y), or None if the relationship is not in the layout.
+        """
+        point = self.points.get(couple.id)
+        if point is None:
+            return None
+        box = self.boxes.get(kid.id)
+        if box is None:
+            return point[0], point[1] - ROW_HEIGHT / 2
+        return box[0], box[1] + BOX_HEIGHT / 2 + POINT_GAP * 2
+
+    def generation(self, person):
+        """
+        Returns the generation a person is drawn in, 0 for the first.
+
+        Args:
+            person (Descendant): The person.
+
+        Returns:
+            int: The generation, or None if they are not in the layout.
+        """
+        return self._generations.get(person.id)
+
+    def _place(self, node, shift, deepest):
+        """
+        Works out the positions of a unit's boxes.
+        """
+        # Graphviz puts y upwards, so the first generation is the highest.
+        y = (deepest - node.depth) * ROW_HEIGHT + BOX_HEIGHT / 2 + MARGIN
+        x = node.x + shift - node.width / 2
+        for partner, width in zip([node.person] + node.partners, node.widths):
+            self.boxes[partner.id] = (x + width / 2, y, width)
+            self._generations[partner.id] = node.depth
+            x = x + width + BOX_GAP
+
+    def _place_points(self, node):
+        """
+        Works out the positions of the points of the relationships a unit's descendant heads.
+        """
+        person = node.person
+        person_x, y, _ = self.boxes[person.id]
+        number = 0
+        for couple in person.marriages:
+            if couple.partner1 != person:
+                continue
+            # Each relationship gets its own point, a little lower than the last, halfway to the partner.
+            partner = self.boxes.get(couple.partner2.id)
+            point_x = person_x
+            if partner is not None:
+                point_x = (person_x + partner[0]) / 2
+            self.points[couple.id] = (point_x, y - BOX_HEIGHT / 2 - POINT_GAP * (number + 1))
+            number = number + 1
+
+
+class _Node:
+    """
+    A unit of the layout: a descendant and the partners who married into their relationships.
+    """
+
+    __slots__ = ('person', 'partners', 'widths', 'width', 'children', 'parent', 'number', 'depth', 'x',
+                 'prelim', 'midpoint', 'mod', 'shift', 'change', 'thread', 'ancestor')
+
+    def __init__(self, person):
+        self.person = person
+        self.partners = []
+        self.widths = []
+        self.width = 0
+        self.children = []
+        self.parent = None
+        self.number = 0  # The position of the unit among its brothers and sisters.
+        self.depth = -1
+        self.x = 0
+        self.prelim = 0
+        self.midpoint = 0  # The middle of the unit's children.
+        self.mod = 0
+        self.shift = 0
+        self.change = 0
+        self.thread = None
+        self.ancestor = self
+
+
+def box_width(person):
+    """
+    Returns the width of a person's box, from the length of their label.
+
+    Args:
+        person (Descendant): The person.
+
+    Returns:
+        width (int): The width in points.
+    """
+    # The label is ' name house ' above ' birth  †  death '.
+    characters = max(len(person.name) + len(person.house) + 3, len(str(person.birth)) + len(str(person.death)) + 7)
+    return characters * CHAR_WIDTH + BOX_PADDING
+
+
+def separation(left, right):
+    """
+    Returns the distance between the centres of two units next to each other.
+    """
+    return (left.width + right.width) / 2 + BOX_GAP
+
+
+def first_walk(root):
+    """
+    Places every unit relative to its parent, from the children up.
+    """
+    # The units are gone through without recursion, children before their parents.
+    order = [root]
+    for current in order:
+        order.extend(current.children)
+    for current in reversed(order):
+        if len(current.children) == 0:
+            continue
+        # Each child is placed next to the one before it, then moved right until their subtrees don't overlap.
+        default_ancestor = current.children[0]
+        for child in current.children:
+            place_next_to(child)
+            default_ancestor = apportion(child, default_ancestor)
+        execute_shifts(current)
+        current.midpoint = (current.children[0].prelim + current.children[-1].prelim) / 2
+    place_next_to(root)
+
+
+def place_next_to(node):
+    """
+    Places a unit next to the one before it, or over the middle of its children if it is the first.
+    """
+    left = None
+    if node.number > 0:
+        left = node.parent.children[node.number - 1]
+    if left is not None:
+        node.prelim = left.prelim + separation(left, node)
+        if len(node.children) > 0:
+            node.mod = node.prelim - node.midpoint
+    else:
+        node.prelim = node.midpoint
+
+
+def apportion(node, default_ancestor):
+    """
+    Moves a subtree right, just far enough that it does not overlap the subtrees to its left.
+    """
+    if node.number == 0:
+        return default_ancestor
+    siblings = node.parent.children
+    inner_right = outer_right = node
+    inner_left = siblings[node.number - 1]
+    outer_left = siblings[0]
+    shift_inner_right = inner_right.mod
+    shift_outer_right = outer_right.mod
+    shift_inner_left = inner_left.mod
+    shift_outer_left = outer_left.mod
+    while next_right(inner_left) is not None and next_left(inner_right) is not None:
+        inner_left = next_right(inner_left)
+        inner_right = next_left(inner_right)
+        outer_left = next_left(outer_left)
+        outer_right = next_right(outer_right)
+        outer_right.ancestor = node
+        shift = ((inner_left.prelim + shift_inner_left) - (inner_right.prelim + shift_inner_right)
+                 + separation(inner_left, inner_right))
+        if shift > 0:
+            ancestor = inner_left.ancestor
+            if ancestor.parent is not node.parent:
+                ancestor = default_ancestor
+            move_subtree(ancestor, node, shift)
+            shift_inner_right = shift_inner_right + shift
+            shift_outer_right = shift_outer_right + shift
+        shift_inner_left = shift_inner_left + inner_left.mod
+        shift_inner_right = shift_inner_right + inner_right.mod
+        shift_outer_left = shift_outer_left + outer_left.mod
+        shift_outer_right = shift_outer_right + outer_right.mod
+    # Thread the shorter side to the longer one, so its contour can be followed later.
+    if next_right(inner_left) is not None and next_right(outer_right) is None:
+        outer_right.thread = next_right(inner_left)
+        outer_right.mod = outer_right.mod + shift_inner_left - shift_outer_right
+    if next_left(inner_right) is not None and next_left(outer_left) is None:
+        outer_left.thread = next_left(inner_right)
+        outer_left.mod = outer_left.mod + shift_inner_right - shift_outer_left
+        default_ancestor = node
+    return default_ancestor
+
+
+def next_left(node):
+    """
+    Returns the next unit down the left contour of a subtree.
+    """
+    return node.children[0] if len(node.children) > 0 else node.thread
+
+
+def next_right(node):
+    """
+    Returns the next unit down the right contour of a subtree.
+    """
+    return node.children[-1] if len(node.children) > 0 else node.thread
+
+
+def move_subtree(left, right, shift):
+    """
+    Moves a subtree right, and spreads the move over the subtrees between it and the one it was moved away from.
+    """
+    subtrees = right.number - left.number
+    right.change = right.change - shift / subtrees
+    right.shift = right.shift + shift
+    left.change = left.change + shift / subtrees
+    right.prelim = right.prelim + shift
+    right.mod = right.mod + shift
+
+
+def execute_shifts(node):
+    """
+    Carries out the moves spread over a unit's children.
+    """
+    shift = 0
+    change = 0
+    for child in reversed(node.children):
+        child.prelim = child.prelim + shift
+        child.mod = child.mod + shift
+        change = change + child.change
+        shift = shift + child.shift + change
+
+
+def second_walk(root):
+    """
+    Adds up the moves of every unit's ancestors to give its final position, and its generation.
+
+    Returns:
+        int: The deepest generation.
+    """
+    deepest = 0
+    stack = [(root, 0, -1)]
+    while len(stack) > 0:
+        node, mod, depth = stack.pop()
+        node.x = node.prelim + mod
+        node.depth = depth
+        deepest = max(deepest, depth)
+        for child in node.children:
+            stack.append((child, mod + node.mod, depth + 1))
+    return deepest
+
+
+def write_layout(output, fam_dict, layout=None):
+    """
+    Writes Graphviz instructions with every position pinned, to be drawn with neato -n.
+    The instructions are the same as make_dot writes, with a pos attribute on every box and point.
+
+    Args:
+        output (str or file): The name of the file to write to, or a text stream, as for DotWriter.
+        fam_dict (dict): A dictionary representing the family tree.
+        layout (Layout): The positions, if they have already been worked out.
+
+    Returns:
+        Layout: The positions.
+    """
+    if layout is None:
+        layout = Layout(fam_dict)
+    with DotWriter(output, layout=layout) as writer:
+        writer.write_tree(fam_dict)
+    return layout
@@ -0,0 +1,217 @@
+"""
+A family tree that only builds the lineages that are looked at.
+Only the unexpanded people and the root seed are kept. A person's marriages and
+children are generated when they are looked up or iterated over, and dropped
+again when they have not been used for a while. As every person draws from their
+own seeded stream, generating them again always gives the same people.
+People who are generated again get the same IDs, made from their lineage keys, so the boxes and
+connections of a person written at different times always match. The tree is keyed by label.
+"""
+
+import hashlib
+from collections import OrderedDict
+from collections.abc import Mapping
+from pedigree_chart_classes import KID_SEPARATOR, Couple, lineage_key, lineage_path, married_in
+from pedigree_chart_expand_tree import MARRIAGE_AGE, ROMANCE_AGE, as_tree, expand_person
+from pedigree_chart_random import get_seed
+
+# IDs made from lineage keys have this bit set, so they are never IDs given out by next_id.
+LINEAGE_IDS = 1 << 62
+
+
+class LazyTree(Mapping):
+    """
+    This class is used to represent a family tree whose later generations are generated on demand.
+    It can be used anywhere fam_dict is used, such as show_info, print_instructions and make_csv.
+    Everyone can be looked up by label, and the people in fam_dict also by ID.
+    Methods are __init__, __getitem__, __iter__, __len__, values, items, materialize, evict.
+    """
+
+    def __init__(self, fam_dict, max_gen, capacity=10000, vectorized=False):
+        """
+        Creates an instance of the LazyTree class.
+
+        Args:
+            fam_dict (dict): The tree built so far. Its unmarried people are the frontier.
+            max_gen (int): The number of generations to add below the frontier.
+            capacity (int): The most people to keep expanded at once.
+            vectorized (bool): Use the NumPy sampler to generate children.
+        """
+        if get_seed() is None:
+            raise ValueError('A lazy tree needs a seeded run, see pedigree_chart_random.set_seed.')
+        if capacity < 1:
+            raise ValueError('A lazy tree must be able to keep at least one person expanded.')
+        self.fam_dict = fam_dict
+        self.max_gen = max_gen
+        self.capacity = capacity
+        self.vectorized = vectorized
+        # The unexpanded people, and their lineage paths for lookups.
+        self._frontier = dict(as_tree(fam_dict).frontier)
+        self._labels = {person.label: person for person in fam_dict.values()}
+        self._paths = {}
+        for person in self._frontier.values():
+            self._paths.setdefault(lineage_path(person), []).append(person)
+        # People whose marriages are currently generated, least recently used first.
+        self._expanded = OrderedDict()
+        self._size = None
+
+    def materialize(self, person, depth):
+        """
+        Generates the marriages and children of a person, if they are not already there.
+
+        Args:
+            person (Descendant): The person to expand.
+            depth (int): How many generations may still be added below the person.
+        """
+        if id(person) in self._expanded:
+            self._expanded.move_to_end(id(person))
+        elif depth > 0:
+            expand_person(person, MARRIAGE_AGE, ROMANCE_AGE, self.vectorized)
+            name_lineage(person)
+            self._expanded[id(person)] = person
+        else:
+            return
+        # Ancestors are always used more recently than their descendants,
+        # so a person is never dropped while a lineage below them is in use.
+        parents = person.parents
+        while isinstance(parents, Couple) and id(parents.partner1) in self._expanded:
+            self._expanded.move_to_end(id(parents.partner1))
+            parents = parents.partner1.parents
+        while len(self._expanded) > self.capacity:
+            self.evict(next(iter(self._expanded.values())))
+
+    def evict(self, person):
+        """
+        Drops the marriages and children of a person, and of everyone expanded below them.
+
+        Args:
+            person (Descendant): The person to drop the lineage of.
+        """
+        for couple in person.marriages:
+            for kid in couple.kids:
+                if id(kid) in self._expanded:
+                    self.evict(kid)
+        del self._expanded[id(person)]
+        # The person goes back to how they were before they were expanded.
+        person.marriages = ()
+        person.birth_years = 0
+        person.version = person.version + 1
+
+    def values(self):
+        """
+        Generates every person in the tree, expanding each lineage as it is reached.
+
+        Returns:
+            generator: The people, each lineage following the person it comes from.
+        """
+        for key, person in self.fam_dict.items():
+            if key in self._frontier:
+                yield from self._walk(person, self.max_gen)
+            else:
+                yield person
+
+    def items(self):
+        """
+        Generates the label and person of everyone in the tree.
+
+        Returns:
+            generator: Tuples of (label, person).
+        """
+        for person in self.values():
+            yield person.label, person
+
+    def __iter__(self):
+        for person in self.values():
+            yield person.label
+
+    def __len__(self):
+        # Counting needs a walk through the whole tree, so it is only done once.
+        if self._size is None:
+            self._size = sum(1 for _ in self.values())
+        return self._size
+
+    def __getitem__(self, label):
+        if isinstance(label, int):
+            person = self.fam_dict.get(label)
+        else:
+            person = self._labels.get(label)
+        if person is not None:
+            if person.id in self._frontier:
+                self.materialize(person, self.max_gen)
+            return person
+        if not isinstance(label, str):
+            raise KeyError(label)
+        # The lineage path starts at the first digit, after the name.
+        start = next((i for i, char in enumerate(label) if char.isdigit()), len(label))
+        path = label[start:]
+        # Start from the frontier people whose lineage path the label continues.
+        for end in range(1, len(path)):
+            for person in self._paths.get(path[:end], []):
+                found = self._find(person, self.max_gen, label, path)
+                if found is not None:
+                    return found
+        raise KeyError(label)
+
+    def _walk(self, person, depth):
+        """
+        Expands a person and generates them and everyone below them.
+        """
+        self.materialize(person, depth)
+        # Keep hold of the children, in case the person is dropped while the caller
+        # is still going through them.
+        couples = list(person.marriages)
+        yield person
+        for couple in couples:
+            for kid in list(couple.kids):
+                yield from self._walk(kid, depth - 1)
+
+    def _find(self, person, depth, label, path):
+        """
+        Looks for a person with a label below a person, expanding only the lineage that leads to them.
+        """
+        self.materialize(person, depth)
+        for couple in person.marriages:
+            if not path.startswith(couple.label):
+                continue
+            for kid in couple.kids:
+                if kid.label == label:
+                    self.materialize(kid, depth - 1)
+                    return kid
+                if depth > 1 and path.startswith(lineage_path(kid)):
+                    found = self._find(kid, depth - 1, label, path)
+                    if found is not None:
+                        return found
+        return None
+
+
+def name_lineage(person):
+    """
+    Gives the relationships, partners and children of a person IDs made from their lineage keys,
+    so they get the same IDs every time they are generated.
+
+    Args:
+        person (Descendant): The person who has just been expanded.
+    """
+    for couple in person.marriages:
+        key = lineage_key(couple)
+        couple.id = lineage_id(key, 'couple')
+        if married_in(couple.partner2):
+            couple.partner2.id = lineage_id(key, 'partner')
+        for number, kid in enumerate(couple.kids):
+            kid.id = lineage_id(key + KID_SEPARATOR + str(number), 'person')
+
+
+def lineage_id(key, kind):
+    """
+    Makes an ID from a lineage key. A relationship and the partner who married into it
+    share a key, so the kind of thing the ID is for is part of what the ID is made from.
+
+    Args:
+        key (str): The lineage key.
+        kind (str): 'person', 'partner' or 'couple'.
+
+    Returns:
+        int: The ID, which fits in 63 bits.
+    """
+    digest = hashlib.blake2b((kind + ':' + key).encode('utf-8'), digest_size=8).digest()
+    return LINEAGE_IDS | (int.from_bytes(digest, 'big') >> 2)
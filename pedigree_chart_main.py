@@ -4,10 +4,21 @@
 # All names used in this project were taken from https://blog.reedsy.com/character-name-generator/
 """
 
+import pedigree_chart_budget
+import pedigree_chart_checkpoint
+import pedigree_chart_columns
 import pedigree_chart_display
+import pedigree_chart_events
 import pedigree_chart_expand_tree
+import pedigree_chart_layout
+import pedigree_chart_lazy
+import pedigree_chart_market
+import pedigree_chart_pipeline
 import pedigree_chart_csv
+import pedigree_chart_snapshot
 import pedigree_chart_sql
+import pedigree_chart_subgraph
+import pedigree_chart_svg
 import pedigree_chart_web
 
 fam_dict = {} #Family is contained in this dictionary
@@ -17,6 +28,8 @@ fam_dict = {} #Family is contained in this dictionary
 
 # Generate starting person.
 #fam_dict = pedigree_chart_expand_tree.make_initial_tree(0) # Argument is the beginning year.
+# Add seed=1 to get the same tree every time it is run.
+#fam_dict = pedigree_chart_expand_tree.make_initial_tree(0, seed=1)
 
 # Read and put family from csv into a dictionary format.
 #pedigree_chart_csv.read_csv('pedigree_chart_test_file.csv', fam_dict) #Example csv can be found in folder.
@@ -24,6 +37,36 @@ fam_dict = {} #Family is contained in this dictionary
 # Expand family tree.
 # Second argument is how many generations to add.
 #fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 2)
+# Add vectorized=True to draw children with NumPy, if it is installed.
+#fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 2, vectorized=True)
+# Add workers=4 to expand each generation across 4 processes.
+#fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 2, workers=4)
+# Write every generation to a csv as soon as it is finished. With keep=False,
+# written generations are not kept, and only the last generation is returned.
+#with pedigree_chart_csv.CsvWriter('pedigree_chart_test_file.csv') as sink:
+#    fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 2, sink=sink)
+# Or write to csv, the database and a graphviz file in the background, while the next generation is generated.
+#with pedigree_chart_pipeline.Pipeline([pedigree_chart_csv.CsvWriter('pedigree_chart_test_file.csv'), pedigree_chart_sql.DatabaseWriter(), pedigree_chart_display.DotWriter('pedigree_chart.gv')]) as sink:
+#    fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 2, sink=sink)
+# Keep a checkpoint of every generation, and carry on from it if the run was stopped.
+#fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 2, checkpoint=pedigree_chart_checkpoint.Checkpoint('pedigree_chart.ckpt'))
+#fam_dict = pedigree_chart_checkpoint.resume_tree('pedigree_chart.ckpt')
+# Stop before the tree gets too big, and only expand the legitimate lines of the 100 most senior lineages.
+#budget = pedigree_chart_budget.Budget(max_people=1000000, max_seconds=600, policies=[pedigree_chart_budget.legit_only, pedigree_chart_budget.TopLineages(100)])
+#fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 15, budget=budget)
+# A checkpointed run its budget stopped is only carried on with a new budget.
+#fam_dict = pedigree_chart_checkpoint.resume_tree('pedigree_chart.ckpt', budget=pedigree_chart_budget.Budget(max_people=2000000))
+# Match partners from the unmarried people of each generation, so houses marry into each other.
+#fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 2, market=pedigree_chart_market.MarriageMarket())
+# In a seeded run, later generations can instead be generated only when they are looked at.
+#fam_dict = pedigree_chart_lazy.LazyTree(fam_dict, 15)
+# Or move the tree through time one event at a time, and stop it at a year.
+#simulation = pedigree_chart_events.Simulation(fam_dict)
+#fam_dict = simulation.simulate_until(150)
+
+# Store the tree in columns. It can be used like fam_dict, and columns can be worked on at once.
+#fam_dict = pedigree_chart_columns.Population.from_tree(fam_dict)
+#lifespans = fam_dict.column('death') - fam_dict.column('birth')
 
 # Print current family tree data as text.
 #pedigree_chart_display.show_info(fam_dict)
@@ -31,8 +74,31 @@ fam_dict = {} #Family is contained in this dictionary
 # Write data from dictionary into csv.
 #pedigree_chart_csv.make_csv('pedigree_chart_test_file.csv', fam_dict)
 
+# Save the tree as a binary snapshot, and read it back.
+#pedigree_chart_snapshot.write_snapshot('pedigree_chart_tree.snap', fam_dict)
+#pedigree_chart_snapshot.read_snapshot('pedigree_chart_tree.snap', fam_dict)
+
 # Print instructions to be inputted into Graphviz to display family tree.
 #pedigree_chart_display.print_instructions(fam_dict)
+# Or write them to a file, or pipe them straight into an installed dot.
+#pedigree_chart_display.make_dot('pedigree_chart.gv', fam_dict)
+#import subprocess
+#dot = subprocess.Popen(['dot', '-Tsvg', '-o', 'pedigree_chart.svg'], stdin=subprocess.PIPE, text=True, encoding='utf-8')
+#pedigree_chart_display.make_dot(dot.stdin, fam_dict)
+#dot.stdin.close()
+#dot.wait()
+# Or work out the layout here, and draw it in seconds with: neato -n -Tsvg pedigree_chart.gv -o pedigree_chart.svg
+#pedigree_chart_layout.write_layout('pedigree_chart.gv', fam_dict)
+# Or draw it as a picture without Graphviz, whole or in tiles of 4 generations, or of one house each.
+#pedigree_chart_svg.write_svg('pedigree_chart.svg', fam_dict)
+#pedigree_chart_svg.write_tiles('pedigree_chart', fam_dict, 'generation', 4)
+# A big tree is easier to look at around one person: their ancestors and descendants within 3 generations.
+#pedigree_chart_subgraph.write_subgraph('pedigree_chart_focus.gv', fam_dict, 'Oda0L06', 'both', 3, legit_only=True)
+# Keep a file of instructions up to date while the tree grows, writing only what has changed.
+#dot_file = pedigree_chart_display.DotFile('pedigree_chart.gv')
+#dot_file.update(fam_dict)
+#fam_dict = pedigree_chart_expand_tree.expand_tree(fam_dict, 2)
+#dot_file.update(fam_dict)
 
 # Generate a database in mySQL, resetting the previous database.
 # You will have to add your own host, username and password to this code to get it to work.
@@ -42,5 +108,7 @@ fam_dict = {} #Family is contained in this dictionary
 # You will need to have generate a database already.
 #pedigree_chart_web.run_web_table()
 
-# Find a specific person in people table.
-#pedigree_chart_sql.request_person_record( 'Oda0L06' )
+# Find a specific person in people table, by their ID.
+#pedigree_chart_sql.request_person_record( 17 )
+# The ID of a person can be found from their label in the tree.
+#pedigree_chart_sql.request_person_record( pedigree_chart_subgraph.find_person(fam_dict, 'Oda0L06').id )
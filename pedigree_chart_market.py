@@ -0,0 +1,201 @@
+"""
+A marriage market, which matches people in the tree with each other instead of making up partners.
+The unmarried people of a generation are kept in buckets by gender, birth year, sexuality and
+whether they were born in wedlock, so a partner is found by looking in the few buckets
+that fit, not by comparing everyone with everyone.
+When nobody suits, a partner is made up as before.
+"""
+
+from pedigree_chart_classes import Couple, partner_ages
+
+# How many people are looked at in each bucket before moving on to the next,
+# so people who can't be matched, such as siblings, don't slow the search down.
+BUCKET_TRIES = 4
+
+
+class MarriageMarket:
+    """
+    This class is used to match the unmarried people of a generation as partners.
+    Give it to expand_tree as market. Partners are matched by the same rules a made-up
+    partner follows: their gender, an age that calculate_birth could give, being alive when
+    the relationship begins, and a sexuality that suits the relationship. Marriages are only
+    made between people who were both born in wedlock or both born out of it.
+    Brothers and sisters, including half ones, are never matched.
+    Methods are __init__, open, add, remove, match.
+    """
+
+    def __init__(self):
+        """
+        Creates an instance of the MarriageMarket class.
+        """
+        self._buckets = {}  # Lists of people, by (gender, birth, sexuality, born in wedlock).
+        self._places = {}  # The bucket and position of everyone in the market, by ID.
+        self.matched = 0  # The number of relationships made with someone in the market.
+        self.made_up = 0  # The number of relationships made with a made-up partner.
+
+    def open(self, people):
+        """
+        Empties the market and puts a generation's unmarried people in it.
+
+        Args:
+            people (iterable): The unmarried people.
+        """
+        self._buckets = {}
+        self._places = {}
+        for person in people:
+            if len(person.marriages) == 0:
+                self.add(person)
+
+    def add(self, person):
+        """
+        Puts a person in the market.
+
+        Args:
+            person (Descendant): The person.
+        """
+        key = (person.gender, person.birth, person.sexuality, born_in_wedlock(person))
+        bucket = self._buckets.setdefault(key, [])
+        self._places[person.id] = (key, len(bucket))
+        bucket.append(person)
+
+    def remove(self, person):
+        """
+        Takes a person out of the market, if they are in it.
+
+        Args:
+            person (Descendant): The person.
+        """
+        place = self._places.pop(person.id, None)
+        if place is None:
+            return
+        key, index = place
+        bucket = self._buckets[key]
+        # The last person in the bucket takes their place, so nothing has to be moved along.
+        last = bucket.pop()
+        if last is not person:
+            bucket[index] = last
+            self._places[last.id] = (key, index)
+
+    def match(self, descendant, begin, legit, rng):
+        """
+        Finds a partner for a relationship, and takes both partners out of the market.
+
+        Args:
+            descendant (Descendant): The person the relationship is generated for.
+            begin (int): The year the relationship begins.
+            legit (bool): The legitimacy of the relationship.
+            rng (random.Random): The random stream of the relationship.
+
+        Returns:
+            partner (Descendant): The partner, or None if nobody in the market suits.
+        """
+        # The descendant is spoken for now, whoever they end up with.
+        self.remove(descendant)
+        youngest, oldest = partner_ages(begin, descendant)
+        keys = [(gender, sexuality, wedlock)
+                for gender in partner_genders(descendant, legit)
+                for sexuality in partner_sexualities(descendant, gender, legit)
+                for wedlock in partner_wedlock(descendant, legit)]
+        births = list(range(begin - oldest, begin - youngest + 1))
+        rng.shuffle(births)
+        rng.shuffle(keys)
+        for birth in births:
+            for gender, sexuality, wedlock in keys:
+                bucket = self._buckets.get((gender, birth, sexuality, wedlock))
+                if not bucket:
+                    continue
+                for index in range(len(bucket) - 1, max(len(bucket) - 1 - BUCKET_TRIES, -1), -1):
+                    partner = bucket[index]
+                    if partner.death >= begin and not siblings(descendant, partner):
+                        self.remove(partner)
+                        self.matched = self.matched + 1
+                        return partner
+        self.made_up = self.made_up + 1
+        return None
+
+
+def born_in_wedlock(person):
+    """
+    Returns whether a person was born to a legitimate marriage. The first ancestors count as born in wedlock.
+
+    Args:
+        person (Descendant): The person.
+
+    Returns:
+        bool: True if they were born in wedlock.
+    """
+    return not isinstance(person.parents, Couple) or bool(person.parents.legit)
+
+
+def partner_genders(descendant, legit):
+    """
+    Returns the genders a partner can have, as calculate_gender would give them.
+
+    Args:
+        descendant (Descendant): The person the relationship is generated for.
+        legit (bool): The legitimacy of the relationship.
+
+    Returns:
+        list: The genders, 0 for male and 1 for female.
+    """
+    if legit or descendant.sexuality == 0:
+        return [1 - descendant.gender]
+    if descendant.sexuality == 2:
+        return [descendant.gender]
+    return [0, 1]
+
+
+def partner_sexualities(descendant, gender, legit):
+    """
+    Returns the sexualities a partner of a gender can have.
+    Marriages are arranged, so anyone can be married. Other relationships need a partner
+    who is attracted to the descendant's gender.
+
+    Args:
+        descendant (Descendant): The person the relationship is generated for.
+        gender (int): The gender of the partner.
+        legit (bool): The legitimacy of the relationship.
+
+    Returns:
+        list: The sexualities, 0 for heterosexual, 1 for bisexual and 2 for homosexual.
+    """
+    if legit:
+        return [0, 1, 2]
+    if gender == descendant.gender:
+        return [1, 2]
+    return [0, 1]
+
+
+def partner_wedlock(descendant, legit):
+    """
+    Returns whether a partner can have been born in wedlock.
+    Marriages are only made between people born alike, other relationships with anyone.
+
+    Args:
+        descendant (Descendant): The person the relationship is generated for.
+        legit (bool): The legitimacy of the relationship.
+
+    Returns:
+        list: True, False or both.
+    """
+    if legit:
+        return [born_in_wedlock(descendant)]
+    return [True, False]
+
+
+def siblings(person, other):
+    """
+    Returns whether two people have a parent in common, as far as the tree knows.
+
+    Args:
+        person (Descendant): One person.
+        other (Descendant): The other person.
+
+    Returns:
+        bool: True if they are brothers or sisters, or half ones.
+    """
+    if not isinstance(person.parents, Couple) or not isinstance(other.parents, Couple):
+        return False
+    return (person.parents is other.parents
+            or person.parents.partner1 is other.parents.partner1
+            or person.parents.partner2 is other.parents.partner2)
@@ -0,0 +1,100 @@
+"""
+Keeps the name lists in memory so names can be picked without reading files.
+Each list is loaded once into a pool, and only reloaded when its file changes.
+"""
+
+import os
+import random
+import sys
+import time
+
+# How many seconds to wait before checking a name file for changes again.
+RELOAD_INTERVAL = 1.0
+
+# Pools of names, stored by their filename or registered key.
+# Each entry is [names (tuple), mtime of file, time of last check],
+# mtime is None for pools that were registered in memory.
+_pools = {}
+
+
+def load_pool(filename):
+    """
+    Read a name file into an immutable pool.
+
+    Args:
+        filename (str): The name of the text file, one name per line.
+
+    Returns:
+        names (tuple): All the names in the file.
+    """
+    with open(filename, 'r', encoding="utf-8") as name_file:
+        # Intern the names so every person shares the same string objects.
+        names = tuple(sys.intern(line.rstrip('\n')) for line in name_file)
+    if len(names) == 0:
+        raise ValueError('Name file ' + filename + ' is empty.')
+    return names
+
+
+def register_pool(key, names):
+    """
+    Add a pool of names that lives only in memory, for example per-region name lists.
+
+    Args:
+        key (str): The key used to pick from the pool, as passed to pick_name.
+        names (iterable): The names in the pool.
+    """
+    names = tuple(sys.intern(name) for name in names)
+    if len(names) == 0:
+        raise ValueError('Pool ' + key + ' has no names.')
+    _pools[key] = [names, None, 0]
+
+
+def get_pool(key):
+    """
+    Return the pool of names for a key, loading or reloading the file if needed.
+
+    Args:
+        key (str): A registered key or the name of a name file.
+
+    Returns:
+        names (tuple): The names in the pool.
+    """
+    entry = _pools.get(key)
+    if entry is not None:
+        # Registered pools never touch the disk.
+        if entry[1] is None:
+            return entry[0]
+        # Only look at the file again once the reload interval has passed.
+        now = time.monotonic()
+        if now - entry[2] < RELOAD_INTERVAL:
+            return entry[0]
+        entry[2] = now
+        if os.stat(key).st_mtime == entry[1]:
+            return entry[0]
+    # The pool is new or its file has changed, so (re)load it.
+    mtime = os.stat(key).st_mtime
+    names = load_pool(key)
+    _pools[key] = [names, mtime, time.monotonic()]
+    return names
+
+
+def pick_name(key, rng=random):
+    """
+    Pick a random name from a pool.
+
+    Args:
+        key (str): A registered key or the name of a name file.
+        rng (random.Random): The random stream to draw from.
+
+    Returns:
+        name (str): The name picked from the pool.
+    """
+    names = get_pool(key)
+    return names[rng.randint(0, len(names)-1)]
+
+
+def clear_pools():
+    """
+    Forget all pools, so every file is read again on next use.
+    """
+    _pools.clear()
@@ -0,0 +1,177 @@
+"""
+A pipeline that writes the finished generations of expand_tree while the next ones are generated.
+Each export, such as a CsvWriter, a DatabaseWriter or a DotWriter, is a stage with a thread of its own.
+Every finished generation is handed to the stages through bounded queues, so generating
+generation N+1 overlaps with writing generation N, and when a stage falls behind,
+expand_tree waits for it instead of piling up generations in memory.
+"""
+
+import threading
+from queue import Queue
+from pedigree_chart_expand_tree import release
+
+# How many finished generations can wait for a stage before expand_tree has to wait for it.
+MAX_WAITING = 2
+
+# Tells a stage to write what it has collected.
+_FLUSH = object()
+
+
+class Pipeline:
+    """
+    This class is used to run several exports in the background while a tree is generated.
+    Give it to expand_tree as sink. It writes every generation to all of its stages,
+    each in its own thread, and closes them when it is closed.
+    A stage is anything with write_generation(people) and flush(), and close() if it has a file to close.
+    Methods are __init__, write_generation, release, flush, close.
+    """
+
+    def __init__(self, stages, max_waiting=MAX_WAITING):
+        """
+        Creates an instance of the Pipeline class, and starts a thread for every stage.
+
+        Args:
+            stages (list): The exports to write to, such as CsvWriter('tree.csv') and DotWriter('tree.gv').
+            max_waiting (int): How many generations can wait for each stage.
+        """
+        self.stages = list(stages)
+        self._queues = [Queue(maxsize=max_waiting) for _ in self.stages]
+        self._error = None  # The first error a stage raised.
+        self._last = None  # The generation handed to the stages last.
+        self._released = None  # A generation to release once every stage has written it.
+        self._threads = []
+        for stage, jobs in zip(self.stages, self._queues):
+            thread = threading.Thread(target=self._run, args=(stage, jobs), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def write_generation(self, people):
+        """
+        Hands a finished generation to every stage.
+        This waits while a stage already has max_waiting generations waiting.
+
+        Args:
+            people (iterable): The people to write.
+        """
+        self._check()
+        generation = _Generation(list(people), len(self.stages))
+        for jobs in self._queues:
+            jobs.put(generation)
+        self._last = generation
+        # The generation before is released once it is written, while this one is being written.
+        self._release_written()
+
+    def release(self, people):
+        """
+        Cuts written people off from their ancestors, as expand_tree does when keep is False.
+        The stages may still be writing them, so the generation handed over last is only released
+        once every stage has written it: when the next generation is handed over, or the pipeline is flushed.
+
+        Args:
+            people (iterable): The people that have been handed to the stages.
+        """
+        self._release_written()
+        people = list(people)
+        if self._last is None or self._last.people != people:
+            # Anyone else is released once everything handed over so far has been written.
+            self.flush()
+            release(people)
+            return
+        self._released = self._last
+
+    def flush(self):
+        """
+        Waits until every stage has written every generation, and has written out what it collected.
+        """
+        for jobs in self._queues:
+            jobs.put(_FLUSH)
+        for jobs in self._queues:
+            jobs.join()
+        self._release_written()
+        self._check()
+
+    def close(self):
+        """
+        Flushes the stages, stops their threads and closes them.
+        """
+        if len(self._threads) == 0:
+            return
+        try:
+            self.flush()
+        finally:
+            for jobs in self._queues:
+                jobs.put(None)
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+            for stage in self.stages:
+                if hasattr(stage, 'close'):
+                    stage.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self, stage, jobs):
+        """
+        Writes the generations in a stage's queue, until it is told to stop. This runs in the stage's thread.
+        """
+        while True:
+            job = jobs.get()
+            try:
+                if job is None:
+                    return
+                # After an error the stage only empties its queue, so expand_tree is not left waiting.
+                if self._error is None:
+                    if job is _FLUSH:
+                        stage.flush()
+                    else:
+                        stage.write_generation(job.people)
+            except BaseException as error:
+                if self._error is None:
+                    self._error = error
+            finally:
+                if job is not None and job is not _FLUSH:
+                    job.done()
+                jobs.task_done()
+
+    def _release_written(self):
+        """
+        Releases the generation waiting to be released, after every stage has written it.
+        """
+        if self._released is not None:
+            self._released.written.wait()
+            release(self._released.people)
+            self._released = None
+
+    def _check(self):
+        """
+        Raises the error a stage raised, if one did.
+        """
+        if self._error is not None:
+            raise RuntimeError('A stage of the pipeline failed.') from self._error
+
+
+class _Generation:
+    """
+    A generation handed to the stages, which knows when every stage has written it.
+    """
+
+    def __init__(self, people, stages):
+        self.people = people
+        self._left = stages
+        self._lock = threading.Lock()
+        self.written = threading.Event()
+        if stages == 0:
+            self.written.set()
+
+    def done(self):
+        """
+        Records that a stage has written the generation.
+        """
+        with self._lock:
+            self._left = self._left - 1
+            if self._left == 0:
+                self.written.set()
@@ -0,0 +1,121 @@
+"""
+Random streams for the simulation.
+Without a seed, everything draws from the global random generator, as before.
+With a seed, every person and relationship draws from its own stream,
+made from the seed and its lineage key, so the same seed gives the same tree
+whatever order the people are expanded in.
+"""
+
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is only needed for the vectorized samplers.
+    np = None
+
+# The root seed of the run, None if the run is not seeded.
+_root_seed = None
+
+# Generator used for vectorized draws in runs without a seed, made the first time it is needed.
+_np_rng = None
+
+
+def set_seed(seed):
+    """
+    Sets the root seed that every stream is made from.
+
+    Args:
+        seed (int): The root seed, or None to go back to the global random generator.
+    """
+    global _root_seed
+    _root_seed = seed
+
+
+def get_seed():
+    """
+    Returns the root seed of the run.
+
+    Returns:
+        seed (int): The root seed, None if the run is not seeded.
+    """
+    return _root_seed
+
+
+def stream(path, purpose):
+    """
+    Returns the random stream for one use of a person or relationship.
+
+    Args:
+        path (str): The lineage key of the person or relationship, see lineage_key.
+        purpose (str): What the stream is used for, so every use gets its own stream.
+
+    Returns:
+        rng (random.Random or module): The stream, or the random module if the run is not seeded.
+    """
+    if _root_seed is None:
+        return random
+    # Seeding from a string hashes it with sha512, so it is the same in every process.
+    return random.Random(str(_root_seed) + '/' + path + '/' + purpose)
+
+
+def numpy_stream(rng):
+    """
+    Returns the NumPy generator to use alongside a random stream.
+
+    Args:
+        rng (random.Random or module): The random stream.
+
+    Returns:
+        generator (numpy.random.Generator): A generator seeded from the stream,
+            or the shared generator if the run is not seeded.
+    """
+    global _np_rng
+    if rng is not random:
+        return np.random.default_rng(rng.getrandbits(64))
+    if _np_rng is None:
+        _np_rng = np.random.default_rng()
+    return _np_rng
+
+
+def seed_random(number):
+    """
+    Seeds the global random generator and the shared NumPy generator, for runs without a root seed.
+
+    Args:
+        number (int): The seed.
+    """
+    global _np_rng
+    random.seed(number)
+    if np is not None:
+        _np_rng = np.random.default_rng(number)
+
+
+def get_state():
+    """
+    Returns everything needed to carry on drawing where the run is now, for example in a checkpoint.
+
+    Returns:
+        state (tuple): The root seed, the state of the global random generator
+            and the state of the shared NumPy generator, or None if it has not been made.
+    """
+    np_state = None if _np_rng is None else _np_rng.bit_generator.state
+    return (_root_seed, random.getstate(), np_state)
+
+
+def set_state(state):
+    """
+    Carries on drawing from a state returned by get_state.
+
+    Args:
+        state (tuple): The state to carry on from.
+    """
+    global _np_rng
+    root_seed, random_state, np_state = state
+    set_seed(root_seed)
+    random.setstate(random_state)
+    if np_state is None:
+        _np_rng = None
+    else:
+        _np_rng = np.random.default_rng()
+        _np_rng.bit_generator.state = np_state
@@ -0,0 +1,382 @@
+"""
+Saves and opens trees as binary snapshots.
+A snapshot has a header, a table of fixed-width person records, a table of fixed-width
+couple records and a table of strings for names, houses and tags. Records are sorted by ID,
+so a person can be found with a binary search straight from the memory-mapped file,
+without reading the rest of it.
+"""
+
+import mmap
+import struct
+from bisect import bisect_left
+from collections import namedtuple
+from pedigree_chart_classes import Couple, Descendant
+from pedigree_chart_columns import PARTNER, ROOT, Population
+from pedigree_chart_csv import CsvWriter, read_csv
+from pedigree_chart_ids import reserve_ids
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is only needed to look at whole columns of a snapshot.
+    np = None
+
+MAGIC = b'PEDSNAP1'
+VERSION = 1
+
+# Magic, version, number of people, couples and strings, and where each table starts.
+HEADER = struct.Struct('<8sIIQQQQQQ')
+# ID, parents, birth, death, name, house, label, gender, sexuality.
+# Parents is the ID of the couple the person was born from, or ROOT or PARTNER.
+# Name, house and label are positions in the string table, label is -1 if it is worked out from the tree.
+PERSON = struct.Struct('<qqiiiiibb2x')
+# ID, partner1, partner2, begin, end, tag, label, legit.
+COUPLE = struct.Struct('<qqqiiiib7x')
+# Where each string ends in the string data.
+OFFSET = struct.Struct('<Q')
+
+PersonRecord = namedtuple('PersonRecord', 'id parents birth death name house label gender sexuality')
+CoupleRecord = namedtuple('CoupleRecord', 'id partner1 partner2 begin end tag label legit')
+
+if np is not None:
+    PERSON_DTYPE = np.dtype({'names': ['id', 'parents', 'birth', 'death', 'name', 'house', 'label',
+                                       'gender', 'sexuality'],
+                             'formats': ['<i8', '<i8', '<i4', '<i4', '<i4', '<i4', '<i4', 'i1', 'i1'],
+                             'offsets': [0, 8, 16, 20, 24, 28, 32, 36, 37],
+                             'itemsize': PERSON.size})
+    COUPLE_DTYPE = np.dtype({'names': ['id', 'partner1', 'partner2', 'begin', 'end', 'tag', 'label', 'legit'],
+                             'formats': ['<i8', '<i8', '<i8', '<i4', '<i4', '<i4', '<i4', 'i1'],
+                             'offsets': [0, 8, 16, 24, 28, 32, 36, 40],
+                             'itemsize': COUPLE.size})
+
+
+class _Ids:
+    """
+    The IDs of a table of records, read from the file as they are needed, for binary searches.
+    """
+
+    def __init__(self, buffer, start, size, count):
+        self.buffer = buffer
+        self.start = start
+        self.size = size
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return struct.unpack_from('<q', self.buffer, self.start + index * self.size)[0]
+
+
+class Snapshot:
+    """
+    This class is used to look at a snapshot file without loading it.
+    The file is memory-mapped, so opening it is instant whatever its size,
+    and only the records that are looked at are read.
+    Methods are __init__, close, string, person, couple, people, couples, column, __len__.
+    """
+
+    def __init__(self, filename):
+        """
+        Opens a snapshot file.
+
+        Args:
+            filename (str): The name of the snapshot file.
+        """
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.person_count, self.couple_count, self.string_count,
+         self._people_start, self._couples_start, self._strings_start) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(filename + ' is not a snapshot file.')
+        if version != VERSION:
+            self.close()
+            raise ValueError(filename + ' is snapshot version ' + str(version) + ', only version ' +
+                             str(VERSION) + ' can be read.')
+        self._data_start = self._strings_start + (self.string_count + 1) * OFFSET.size
+        self._person_ids = _Ids(self._map, self._people_start, PERSON.size, self.person_count)
+        self._couple_ids = _Ids(self._map, self._couples_start, COUPLE.size, self.couple_count)
+
+    def close(self):
+        """
+        Closes the file.
+        Columns handed out by column() read straight from the memory map, so while any of them
+        is still in use the map cannot be closed. The snapshot then lets go of the map,
+        the columns keep it open, and it is closed when the last of them is gone.
+        """
+        if self._map is None:
+            return
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._map = None
+        self._person_ids = None
+        self._couple_ids = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.person_count
+
+    def string(self, index):
+        """
+        Returns a string from the string table.
+
+        Args:
+            index (int): The position of the string.
+
+        Returns:
+            text (str): The string, None if index is -1.
+        """
+        if index < 0:
+            return None
+        start = OFFSET.unpack_from(self._map, self._strings_start + index * OFFSET.size)[0]
+        end = OFFSET.unpack_from(self._map, self._strings_start + (index + 1) * OFFSET.size)[0]
+        return self._map[self._data_start + start:self._data_start + end].decode('utf-8')
+
+    def _person(self, index):
+        values = PERSON.unpack_from(self._map, self._people_start + index * PERSON.size)
+        return PersonRecord(values[0], values[1], values[2], values[3], self.string(values[4]),
+                            self.string(values[5]), self.string(values[6]), values[7], values[8])
+
+    def _couple(self, index):
+        values = COUPLE.unpack_from(self._map, self._couples_start + index * COUPLE.size)
+        return CoupleRecord(values[0], values[1], values[2], values[3], values[4],
+                            self.string(values[5]), self.string(values[6]), bool(values[7]))
+
+    def person(self, person_id):
+        """
+        Finds a person by their ID.
+
+        Args:
+            person_id (int): The ID of the person.
+
+        Returns:
+            record (PersonRecord): The person.
+        """
+        index = bisect_left(self._person_ids, person_id)
+        if index == self.person_count or self._person_ids[index] != person_id:
+            raise KeyError(person_id)
+        return self._person(index)
+
+    def couple(self, couple_id):
+        """
+        Finds a couple by their ID.
+
+        Args:
+            couple_id (int): The ID of the couple.
+
+        Returns:
+            record (CoupleRecord): The couple.
+        """
+        index = bisect_left(self._couple_ids, couple_id)
+        if index == self.couple_count or self._couple_ids[index] != couple_id:
+            raise KeyError(couple_id)
+        return self._couple(index)
+
+    def people(self):
+        """
+        Generates every person, in order of ID.
+
+        Returns:
+            generator: PersonRecord for every person.
+        """
+        for index in range(self.person_count):
+            yield self._person(index)
+
+    def couples(self):
+        """
+        Generates every couple, in order of ID.
+
+        Returns:
+            generator: CoupleRecord for every couple.
+        """
+        for index in range(self.couple_count):
+            yield self._couple(index)
+
+    def column(self, name, table='people'):
+        """
+        Returns a column of a table as a NumPy array that reads straight from the file.
+        The column is not a copy, and stays usable after the snapshot is closed.
+
+        Args:
+            name (str): The name of the column, such as 'birth' or 'legit'.
+            table (str): 'people' or 'couples'.
+
+        Returns:
+            column (numpy.ndarray): The column, without copying it.
+        """
+        if np is None:
+            raise ImportError('NumPy is needed to look at the columns of a snapshot.')
+        if table == 'people':
+            records = np.frombuffer(self._map, dtype=PERSON_DTYPE, count=self.person_count,
+                                    offset=self._people_start)
+        else:
+            records = np.frombuffer(self._map, dtype=COUPLE_DTYPE, count=self.couple_count,
+                                    offset=self._couples_start)
+        return records[name]
+
+
+def write_snapshot(filename, fam_dict):
+    """
+    Saves a tree as a snapshot.
+
+    Args:
+        filename (str): The name of the snapshot file.
+        fam_dict (dict): The tree, a dictionary of Descendant objects, a LazyTree or a Population.
+    """
+    print('\nWRITING SNAPSHOT:', filename)
+    if isinstance(fam_dict, Population):
+        population = fam_dict
+    else:
+        population = Population.from_tree(fam_dict)
+    people = population.people
+    couples = population.couples
+    # Labels that cannot be worked out from the tree go in the string table with the names.
+    labels = {row: population.string(label) for row, label in population.labels.items()}
+    couple_labels = {row: population.string(label) for row, label in population.couple_labels.items()}
+
+    person_records = bytearray()
+    for row in sorted(range(len(people['id'])), key=people['id'].__getitem__):
+        parents = people['parents'][row]
+        if parents >= 0:
+            parents = couples['id'][parents]
+        person_records += PERSON.pack(people['id'][row], parents, people['birth'][row], people['death'][row],
+                                      people['name'][row], people['house'][row], labels.get(row, -1),
+                                      people['gender'][row], people['sexuality'][row])
+    couple_records = bytearray()
+    for row in sorted(range(len(couples['id'])), key=couples['id'].__getitem__):
+        couple_records += COUPLE.pack(couples['id'][row], people['id'][couples['partner1'][row]],
+                                      people['id'][couples['partner2'][row]], couples['begin'][row],
+                                      couples['end'][row], couples['tag'][row], couple_labels.get(row, -1),
+                                      couples['legit'][row])
+    offsets = bytearray(OFFSET.pack(0))
+    data = bytearray()
+    for text in population.strings:
+        data += text.encode('utf-8')
+        offsets += OFFSET.pack(len(data))
+
+    people_start = HEADER.size
+    couples_start = people_start + len(person_records)
+    strings_start = couples_start + len(couple_records)
+    with open(filename, 'wb') as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, VERSION, 0, len(people['id']), len(couples['id']),
+                                        len(population.strings), people_start, couples_start, strings_start))
+        snapshot_file.write(person_records)
+        snapshot_file.write(couple_records)
+        snapshot_file.write(offsets)
+        snapshot_file.write(data)
+
+
+def read_snapshot(filename, fam_dict):
+    """
+    Loads a snapshot into a dictionary of Descendant and Couple objects, as read_csv does.
+
+    Args:
+        filename (str): The name of the snapshot file.
+        fam_dict (dict): The dictionary to store the descendants in, by ID.
+    """
+    print('\nREADING SNAPSHOT:', filename)
+    with Snapshot(filename) as snapshot:
+        people = {}
+        kids = []
+        descendants = []
+        for record in snapshot.people():
+            person = Descendant.restore(record.id, record.name, record.house, record.gender,
+                                        record.sexuality, record.birth, record.death, [0, 0, True])
+            if record.label is not None:
+                person.label = record.label
+            people[record.id] = person
+            if record.parents >= 0:
+                kids.append((person, record.parents))
+            if record.parents != PARTNER:
+                descendants.append(person)
+        marriages = {}
+        # Relationships are added to the partners in the order they were made in.
+        records = sorted(snapshot.couples(), key=lambda record: (not record.legit, record.begin, record.id))
+        for record in records:
+            partner1 = people[record.partner1]
+            partner2 = people[record.partner2]
+            couple = Couple.restore(record.id, partner1, partner2, record.begin, record.end,
+                                    record.legit, record.tag)
+            if record.label is not None:
+                couple.label = record.label
+            # A descendant matched by the marriage market keeps the parents they were born to.
+            if snapshot.person(record.partner2).parents == PARTNER:
+                partner2.parents = (couple, partner2.sexuality, record.legit)
+            partner1.add_marriage(couple)
+            partner2.add_marriage(couple)
+            marriages[record.id] = couple
+        # Children are added in the order they were born.
+        kids.sort(key=lambda kid: (kid[0].birth, kid[0].id))
+        for person, parents in kids:
+            person.parents = marriages[parents]
+            marriages[parents].add_kid(person)
+        # The descendants are stored once they are linked, so a FamilyTree can tell who is unmarried.
+        for person in descendants:
+            fam_dict[person.id] = person
+        reserve_ids(max(list(people) + list(marriages), default=-1))
+
+
+def csv_to_snapshot(csv_filename, snapshot_filename):
+    """
+    Converts a CSV file, as written by make_csv, to a snapshot.
+
+    Args:
+        csv_filename (str): The name of the CSV file.
+        snapshot_filename (str): The name of the snapshot file to write.
+    """
+    fam_dict = {}
+    read_csv(csv_filename, fam_dict)
+    write_snapshot(snapshot_filename, fam_dict)
+
+
+def snapshot_to_csv(snapshot_filename, csv_filename):
+    """
+    Converts a snapshot to a CSV file in the layout make_csv writes, straight from the records.
+
+    Args:
+        snapshot_filename (str): The name of the snapshot file.
+        csv_filename (str): The name of the CSV file to write.
+    """
+    print('\nWRITING CSV:', csv_filename)
+    with Snapshot(snapshot_filename) as snapshot, CsvWriter(csv_filename) as writer:
+        # The relationships of each descendant, so they can be written after them.
+        marriages = {}
+        for record in snapshot.couples():
+            marriages.setdefault(record.partner1, []).append(record)
+        for records in marriages.values():
+            records.sort(key=lambda record: (not record.legit, record.begin, record.id))
+        for record in snapshot.people():
+            if record.parents == PARTNER:
+                continue
+            writer.add_row(person_row(record, 'TRUE' if record.parents == ROOT else record.parents))
+            for couple in marriages.get(record.id, []):
+                partner = snapshot.person(couple.partner2)
+                if partner.parents == PARTNER:
+                    writer.add_row(person_row(partner, 'FALSE'))
+                writer.add_row([couple.id, couple.partner1, couple.partner2, couple.begin,
+                                couple.end, couple.legit])
+
+
+def person_row(record, parents):
+    """
+    Puts together a CSV row for a person record.
+
+    Args:
+        record (PersonRecord): The person.
+        parents (int or str): The value of the ParentsID column.
+
+    Returns:
+        row (list): The row.
+    """
+    return [record.id, record.name, record.house, record.gender, record.sexuality,
+            record.birth, record.death, parents]
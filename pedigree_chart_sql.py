@@ -5,7 +5,12 @@
 """
 
 import mysql.connector
-from pedigree_chart_classes import Couple
+from pedigree_chart_classes import Couple, lineage_path, married_in
+from pedigree_chart_columns import Population
+
+# The commands to insert rows into the people and marriages tables.
+PERSON_SQL = "INSERT INTO people ( name_label, first_name, house, gender, sexuality, dob, dod, parents_label)VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+MARRIAGE_SQL = "INSERT INTO marriages (marriage_label, partner1_label, partner2_label, start_year, end_year, legit) VALUES (%s, %s, %s, %s, %s, %s)"
 
 
 def create_person_val(fam_dict):
@@ -15,6 +20,9 @@ def create_person_val(fam_dict):
     Return:
      val (list) : All the necessary data from Dict arranged into items and rows.
     """
+    # A Population already holds the rows in its columns.
+    if isinstance(fam_dict, Population):
+        return list(fam_dict.person_rows(True, False))
     val = []
 
     # For every person in the dictionary:
@@ -22,17 +30,18 @@ def create_person_val(fam_dict):
         # If person is a descendant of someone else,
         # the data in the parents ID column is their parentID.
         if isinstance(person.parents, Couple):
-            parents_label = person.parents.label
+            parents_label = person.parents.id
             val = add_bio(val, person, parents_label)
         # If person is a the initial node, the data in the parents ID column is set as True.
-        elif person.label.split(person.name)[1] == ('0'):
+        elif lineage_path(person) == '0':
             parents_label = True
             val = add_bio(val, person, parents_label)
         # For all the partners, the data in the parents ID column is set as False.
+        # A descendant matched as a partner has their own row already.
         for couple in person.marriages:
-            person = couple.partner2
-            parents_label = False
-            val = add_bio(val, person, parents_label)
+            if couple.partner1 == person and married_in(couple.partner2):
+                parents_label = False
+                val = add_bio(val, couple.partner2, parents_label)
     return val
 
 
@@ -43,13 +52,13 @@ def add_bio(val, person, parent_label):
     Args:
     val (list): The list to append the person's biographical information to.
     person (Descendant): The person whose biographical information should be added.
-    parent_label (str): The label of the person's parent.
+    parent_label (int): The ID of the person's parents.
 
     Returns:
     list: The updated list of biographical information, with the new information appended.
     """
 
-    bio = (person.label,
+    bio = (person.id,
             person.name,
             person.house,
             person.gender,
@@ -69,15 +78,20 @@ def create_marriage_val(fam_dict):
      val (list) : All the necessary data from Dict arranged into items and rows.
 
     """
+    if isinstance(fam_dict, Population):
+        return list(fam_dict.couple_rows())
     val = []
 
     # For every person in the dictionary,
     for person in fam_dict.values():
         # For evry relationship the person has had, arrange its data into a list.
         for couple in person.marriages:
-            data = (couple.label,
-                    couple.partner1.label,
-                    couple.partner2.label,
+            # Each relationship is added once, with the partner who heads it.
+            if couple.partner1 != person:
+                continue
+            data = (couple.id,
+                    couple.partner1.id,
+                    couple.partner2.id,
                     couple.begin,
                     couple.end,
                     couple.legit)
@@ -108,7 +122,7 @@ def write_person_table(fam_dict):
     mycursor = mydb.cursor()
 
     # Define command to make the table, and its arguments.
-    sql = "INSERT INTO people ( name_label, first_name, house, gender, sexuality, dob, dod, parents_label)VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+    sql = PERSON_SQL
 
     val = create_person_val(fam_dict) # Define arguments in command.
 
@@ -127,7 +141,7 @@ def write_marriage_table(fam_dict):
 
     mycursor = mydb.cursor()
 
-    sql = "INSERT INTO marriages (marriage_label, partner1_label, partner2_label, start_year, end_year, legit) VALUES (%s, %s, %s, %s, %s, %s)" # Define command to make the table, and its arguments.
+    sql = MARRIAGE_SQL # Define command to make the table, and its arguments.
 
     val = create_marriage_val(fam_dict) # Define arguments in command.
 
@@ -177,14 +191,18 @@ def read_table(table_name):
 def request_person_record(name_label):
     """
     Find individual in the database.
+
+    Args:
+        name_label (int): The ID of the individual, which the name_label column holds.
+            pedigree_chart_subgraph.find_person finds the ID of a person from their label.
     """
 
     mydb = establish_connection()
     mycursor = mydb.cursor()
 
     # Define command, and insert the individuals ID.
-    sql = "SELECT * FROM people WHERE name_label ='" + name_label + "'"
-    mycursor.execute(sql)
+    sql = "SELECT * FROM people WHERE name_label = %s"
+    mycursor.execute(sql, (name_label,))
 
     myresult = mycursor.fetchall()
 
@@ -201,3 +219,55 @@ def make_database(fam_dict):
     delete_table("marriages")
     write_marriage_table(fam_dict)
     write_person_table(fam_dict)
+
+
+class DatabaseWriter:
+    """
+    This class is used to insert people into the database one generation at a time.
+    It can be given to expand_tree as a sink, or as a stage of a Pipeline.
+    The connection is made when the first generation is written, so in a Pipeline
+    it is only used by the stage's own thread.
+    Methods are __init__, write_generation, flush, close.
+    """
+
+    def __init__(self, reset=True):
+        """
+        Creates an instance of the DatabaseWriter class.
+
+        Args:
+            reset (bool): Empty the people and marriages tables before the first generation is written,
+                as make_database does.
+        """
+        self.reset = reset
+        self._db = None
+
+    def write_generation(self, people):
+        """
+        Inserts the rows of a group of people, and of their partners and relationships, and commits them.
+
+        Args:
+            people (iterable): The people to write.
+        """
+        if self._db is None:
+            if self.reset:
+                delete_table("people")
+                delete_table("marriages")
+            self._db = establish_connection()
+        generation = {person.id: person for person in people}
+        mycursor = self._db.cursor()
+        mycursor.executemany(MARRIAGE_SQL, create_marriage_val(generation))
+        mycursor.executemany(PERSON_SQL, create_person_val(generation))
+        self._db.commit()
+
+    def flush(self):
+        """
+        Every generation is committed as it is written, so there is nothing to do.
+        """
+
+    def close(self):
+        """
+        Closes the connection to the database.
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
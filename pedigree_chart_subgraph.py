@@ -0,0 +1,202 @@
+"""
+Exports the part of a family tree around one person, so it is small enough to display.
+The people are found by following parents, relationships and children out from the person,
+so the cost depends on how many people are exported, not on how big the tree is.
+"""
+
+from pedigree_chart_classes import Couple, married_in
+from pedigree_chart_display import DotWriter
+
+# The directions the neighbourhood of a person can be taken in.
+ANCESTORS = 'ancestors'
+DESCENDANTS = 'descendants'
+BOTH = 'both'
+
+
+def find_person(fam_dict, subject):
+    """
+    Finds a person in a tree by their ID or their label.
+    A label is the person's name followed by their lineage path, such as 'Oda0L06',
+    so the person is found by following the path down from the first ancestor.
+
+    Args:
+        fam_dict (dict): A dictionary representing the family tree.
+        subject (int or str): The ID of the person, or their label.
+
+    Returns:
+        Descendant: The person.
+    """
+    if isinstance(subject, str) and subject.isdigit():
+        subject = int(subject)
+    if not isinstance(subject, str):
+        return fam_dict[subject]
+    # The name is everything before the lineage path, which starts with the path of the first ancestor.
+    start = 0
+    while start < len(subject) and not subject[start].isdigit():
+        start = start + 1
+    name, path = subject[:start], subject[start:]
+    if len(fam_dict) > 0:
+        root = first_ancestor(next(iter(fam_dict.values())))
+        root_path = str(root.parents[0])
+        if path.startswith(root_path):
+            person = follow_path(root, path[len(root_path):])
+            if person is not None and person.name == name:
+                return person
+    # The tree may have more than one first ancestor, or people who were read with their labels,
+    # so go through it as a last resort.
+    for person in fam_dict.values():
+        if person.label == subject:
+            return person
+    raise KeyError(subject)
+
+
+def first_ancestor(person):
+    """
+    Returns the first ancestor a person descends from, through the partners who head each relationship.
+
+    Args:
+        person (Descendant): The person.
+
+    Returns:
+        Descendant: The first ancestor.
+    """
+    while True:
+        if isinstance(person.parents, Couple):
+            person = person.parents.partner1
+        elif married_in(person):
+            # A partner takes their place from the relationship they married into.
+            person = person.parents[0].partner1
+        else:
+            return person
+
+
+def follow_path(person, path):
+    """
+    Follows a lineage path down from a person, such as 'L06' for the seventh child of their first marriage.
+    A tag and a child's number are written one after the other, so every way of splitting them is tried.
+
+    Args:
+        person (Descendant): The person the path starts from.
+        path (str): The rest of the lineage path.
+
+    Returns:
+        Descendant: The person at the end of the path, or None if there is nobody there.
+    """
+    if path == '':
+        return person
+    if path[0] not in 'LI':
+        return None
+    end = 1
+    while end < len(path) and path[end].isdigit():
+        end = end + 1
+    digits = path[1:end]
+    for split in range(1, len(digits)):
+        tag, number = path[0] + digits[:split], digits[split:]
+        # Numbers are written without leading zeros.
+        if (len(digits[:split]) > 1 and digits[0] == '0') or (len(number) > 1 and number[0] == '0'):
+            continue
+        for couple in person.marriages:
+            if couple.tag == tag and couple.partner1 == person and int(number) < len(couple.kids):
+                found = follow_path(couple.kids[int(number)], path[end:])
+                if found is not None:
+                    return found
+    return None
+
+
+def neighbourhood(fam_dict, subject, direction=BOTH, generations=2, house=None, legit_only=False):
+    """
+    Collects the people and relationships within some generations of a person.
+    Both partners of every relationship are collected, so every connection has its boxes,
+    but only the people who pass the filters are followed further.
+
+    Args:
+        fam_dict (dict): A dictionary representing the family tree.
+        subject (int or str): The ID or label of the person.
+        direction (str): ANCESTORS, DESCENDANTS or BOTH.
+        generations (int): How many generations to go up, down or both.
+        house (str): If given, only follow people of this house.
+        legit_only (bool): Only follow legitimate relationships.
+
+    Returns:
+        people (dict): The people, by ID, in the order they were found.
+        couples (dict): The relationships, by ID, each with the IDs of its children that were collected.
+    """
+    if direction not in (ANCESTORS, DESCENDANTS, BOTH):
+        raise ValueError('The direction must be ancestors, descendants or both.')
+    person = find_person(fam_dict, subject)
+    people = {person.id: person}
+    couples = {}
+
+    def follow(relative):
+        # The person the neighbourhood is taken around is always followed.
+        return house is None or relative.house == house or relative.id == person.id
+
+    def add_couple(couple):
+        if couple.id not in couples:
+            couples[couple.id] = (couple, set())
+            for partner in (couple.partner1, couple.partner2):
+                people.setdefault(partner.id, partner)
+        return couples[couple.id][1]
+
+    # Go up through the parents, a generation at a time.
+    if direction != DESCENDANTS:
+        level = [person]
+        seen = {person.id}
+        for _ in range(generations):
+            parents = []
+            for child in level:
+                couple = child.parents
+                if not isinstance(couple, Couple) or (legit_only and not couple.legit):
+                    continue
+                add_couple(couple).add(child.id)
+                for parent in (couple.partner1, couple.partner2):
+                    # Partners who married in have no parents in the tree.
+                    if parent.id not in seen and not married_in(parent) and follow(parent):
+                        seen.add(parent.id)
+                        parents.append(parent)
+            level = parents
+    # Go down through the relationships and children, a generation at a time.
+    if direction != ANCESTORS:
+        level = [person]
+        seen = {person.id}
+        for _ in range(generations):
+            kids = []
+            for parent in level:
+                for couple in parent.marriages:
+                    if legit_only and not couple.legit:
+                        continue
+                    kid_ids = add_couple(couple)
+                    for kid in couple.kids:
+                        if kid.id not in seen and follow(kid):
+                            seen.add(kid.id)
+                            kid_ids.add(kid.id)
+                            people.setdefault(kid.id, kid)
+                            kids.append(kid)
+            level = kids
+    return people, couples
+
+
+def write_subgraph(output, fam_dict, subject, direction=BOTH, generations=2, house=None, legit_only=False):
+    """
+    Writes Graphviz instructions for the neighbourhood of a person.
+
+    Args:
+        output (str or file): The name of the file to write to, or a text stream, as for DotWriter.
+        fam_dict (dict): A dictionary representing the family tree.
+        subject (int or str): The ID or label of the person.
+        direction (str): ANCESTORS, DESCENDANTS or BOTH.
+        generations (int): How many generations to go up, down or both.
+        house (str): If given, only follow people of this house.
+        legit_only (bool): Only follow legitimate relationships.
+
+    Returns:
+        int: The number of people written.
+    """
+    people, couples = neighbourhood(fam_dict, subject, direction, generations, house, legit_only)
+    with DotWriter(output) as writer:
+        # The boxes must be written first.
+        for person in people.values():
+            writer.write_box(person)
+        for couple, kid_ids in couples.values():
+            writer.write_couple(couple, [kid for kid in couple.kids if kid.id in kid_ids])
+    return len(people)
@@ -0,0 +1,277 @@
+"""
+Draws the family tree as an SVG picture, without Graphviz.
+The boxes and points are placed by a Layout in linear time, and the picture is written out
+as it is drawn, in large blocks, so a big tree never has to be held in memory as a picture.
+A very big tree can be cut into tiles, of a few generations or of one house each.
+"""
+
+import re
+from xml.sax.saxutils import escape
+from pedigree_chart_display import DOT_BUFFER
+from pedigree_chart_layout import BOX_HEIGHT, MARGIN, Layout
+
+# The colours of the boxes, the same as print_person gives Graphviz: azure2 for male, bisque for female.
+COLOURS = {0: '#e0eeee', 1: '#ffe4c4'}
+
+# The radius of the small points that join partners, and join children to them.
+POINT_RADIUS = 1.5
+
+# The look of the picture, written once at the top instead of on every box and line.
+STYLE = ('<style>'
+         'rect{stroke:black}.m{fill:' + COLOURS[0] + '}.f{fill:' + COLOURS[1] + '}'
+         'path{stroke:black;fill:none}circle{fill:black}'
+         'text{font-family:Times,serif;font-size:14px;text-anchor:middle}'
+         '</style>')
+
+
+class SvgWriter:
+    """
+    This class is used to write the boxes and connections of a Layout to an SVG file or stream.
+    The drawing is collected and written DOT_BUFFER characters at a time.
+    Methods are __init__, write_box, write_couple, flush, close.
+    """
+
+    def __init__(self, output, layout, view=None, buffer_size=DOT_BUFFER):
+        """
+        Opens the stream and writes the start of the picture.
+
+        Args:
+            output (str or file): The name of a file to write to, or a text stream.
+            layout (Layout): The positions of the boxes and points.
+            view (tuple): The part of the layout to show, as (left, top, width, height) in the picture,
+                or None for all of it.
+            buffer_size (int): How many characters to collect before writing them all at once.
+        """
+        self._own = isinstance(output, str)
+        self._stream = open(output, 'w', encoding="utf-8", buffering=1 << 20) if self._own else output
+        self.layout = layout
+        self.buffer_size = buffer_size
+        self._parts = []
+        self._size = 0
+        self._closed = False
+        if view is None:
+            view = (0, 0, layout.width, layout.height)
+        left, top, width, height = view
+        self._add(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+                  f'viewBox="{left:.0f} {top:.0f} {width:.0f} {height:.0f}">{STYLE}')
+
+    def write_box(self, person):
+        """
+        Draws a person's box, with their name and house above their years of birth and death.
+
+        Args:
+            person (Descendant): The person.
+        """
+        box = self.layout.box(person)
+        if box is None:
+            return
+        x, y, width = box
+        y = self.layout.height - y
+        style = 'm' if person.gender == 0 else 'f'
+        self._add(f'<rect class="{style}" x="{x - width / 2:.0f}" y="{y - BOX_HEIGHT / 2:.0f}" '
+                  f'width="{width:.0f}" height="{BOX_HEIGHT}"/>'
+                  f'<text x="{x:.0f}" y="{y - 3:.0f}">{escape(person.name)} {escape(person.house)}'
+                  f'<tspan x="{x:.0f}" dy="15">{person.birth} † {person.death}</tspan></text>')
+
+    def write_couple(self, couple, kids=None):
+        """
+        Draws the lines from both partners to the point of their relationship,
+        and from it to each of their children, going through the children once.
+
+        Args:
+            couple (Couple): The relationship.
+            kids (list): The children to connect, or None for all of them.
+                Children who are not in the layout are left out.
+        """
+        layout = self.layout
+        point = layout.marriage_point(couple)
+        if point is None:
+            return
+        height = layout.height
+        px, py = point[0], height - point[1]
+        lines = []
+        # The partners are joined at the bottom of their boxes.
+        for partner in (couple.partner1, couple.partner2):
+            box = layout.box(partner)
+            if box is not None:
+                lines.append(f'M{box[0]:.0f} {height - box[1] + BOX_HEIGHT / 2:.0f}L{px:.0f} {py:.0f}')
+        circles = [f'<circle cx="{px:.0f}" cy="{py:.0f}" r="{POINT_RADIUS}"/>']
+        left = right = bar = None
+        for kid in (couple.kids if kids is None else kids):
+            box = layout.box(kid)
+            if box is None:
+                continue
+            kx, ky = layout.kid_point(couple, kid)
+            ky = height - ky
+            left = kx if left is None else min(left, kx)
+            right = kx if right is None else max(right, kx)
+            bar = ky
+            lines.append(f'M{kx:.0f} {ky:.0f}L{kx:.0f} {height - box[1] - BOX_HEIGHT / 2:.0f}')
+            circles.append(f'<circle cx="{kx:.0f}" cy="{ky:.0f}" r="{POINT_RADIUS}"/>')
+        if bar is not None:
+            # Straight down from the relationship, and along a bar over all the children.
+            left = min(left, px)
+            right = max(right, px)
+            lines.append(f'M{px:.0f} {py:.0f}V{bar:.0f}M{left:.0f} {bar:.0f}H{right:.0f}')
+        self._add(f'<path d="{"".join(lines)}"/>' + ''.join(circles))
+
+    def flush(self):
+        """
+        Writes the collected drawing to the stream.
+        """
+        if len(self._parts) > 0:
+            self._parts.append('')
+            self._stream.write('\n'.join(self._parts))
+            self._parts = []
+            self._size = 0
+        self._stream.flush()
+
+    def close(self):
+        """
+        Writes the end of the picture, and closes the stream if the writer opened it.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._add('</svg>')
+        self.flush()
+        if self._own:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _add(self, text):
+        """
+        Collects a piece of the drawing, and writes the collected pieces once there are enough of them.
+        """
+        self._parts.append(text)
+        self._size = self._size + len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+
+def write_svg(output, fam_dict, layout=None):
+    """
+    Draws a whole family tree as an SVG picture.
+
+    Args:
+        output (str or file): The name of the file to write to, or a text stream.
+        fam_dict (dict): A dictionary representing the family tree.
+        layout (Layout): The positions, if they have already been worked out.
+
+    Returns:
+        Layout: The positions.
+    """
+    if layout is None:
+        layout = Layout(fam_dict)
+    with SvgWriter(output, layout) as writer:
+        draw_people(writer, fam_dict.values(), fam_dict)
+    return layout
+
+
+def draw_people(writer, people, members):
+    """
+    Draws a group of people, the partners who married into their relationships,
+    and the relationships they head.
+
+    Args:
+        writer (SvgWriter): The writer to draw with.
+        people (iterable): The people.
+        members (dict): Everyone who is drawn as themselves, by ID. Partners who are not in it
+            are drawn next to the person who heads their relationship, as the Layout places them.
+    """
+    for person in people:
+        for relative in unit(person, members):
+            writer.write_box(relative)
+        for couple in person.marriages:
+            # Each relationship is drawn once, from the partner who heads it.
+            if couple.partner1 == person:
+                writer.write_couple(couple)
+
+
+def unit(person, members):
+    """
+    Returns a person and the partners who are drawn next to them.
+
+    Args:
+        person (Descendant): The person.
+        members (dict): Everyone who is drawn as themselves, by ID.
+
+    Returns:
+        list: The person, followed by the partners.
+    """
+    return [person] + [couple.partner2 for couple in person.marriages
+                       if couple.partner1 == person and couple.partner2.id not in members]
+
+
+def write_tiles(prefix, fam_dict, by='generation', generations=4):
+    """
+    Cuts a family tree into several SVG pictures.
+    Tiles of generations share one layout, and each also shows the first generation of the next tile,
+    so the children the tiles are cut between can be followed from one to the next.
+    Tiles of houses each have a layout of their own, with the people of the house
+    and the partners who married into their relationships.
+
+    Args:
+        prefix (str): The start of the file names, such as 'pedigree_chart'.
+        fam_dict (dict): A dictionary representing the family tree.
+        by (str): 'generation' or 'house'.
+        generations (int): How many generations go in each tile, when cut by generation.
+
+    Returns:
+        filenames (list): The names of the files written.
+    """
+    filenames = []
+    if by == 'house':
+        houses = {}
+        for person in fam_dict.values():
+            houses.setdefault(person.house, {})[person.id] = person
+        for house, people in houses.items():
+            filename = prefix + '_' + re.sub(r'\W', '_', house) + '.svg'
+            write_svg(filename, people)
+            filenames.append(filename)
+        return filenames
+    if by != 'generation':
+        raise ValueError("Tiles are cut by 'generation' or 'house'.")
+    layout = Layout(fam_dict)
+    tiles = {}
+    for person in fam_dict.values():
+        tiles.setdefault(layout.generation(person) // generations, []).append(person)
+    for tile in sorted(tiles):
+        first = tile * generations
+        last = first + generations
+        people = tiles[tile]
+        # The first generation of the next tile is drawn too, below the rest, without their relationships.
+        below = [person for person in tiles.get(tile + 1, []) if layout.generation(person) == last]
+        boxes = [relative for person in people + below for relative in unit(person, fam_dict)]
+        filename = prefix + '_gen' + str(first) + '-' + str(last) + '.svg'
+        with SvgWriter(filename, layout, tile_view(layout, boxes)) as writer:
+            draw_people(writer, people, fam_dict)
+            for person in below:
+                for relative in unit(person, fam_dict):
+                    writer.write_box(relative)
+        filenames.append(filename)
+    return filenames
+
+
+def tile_view(layout, people):
+    """
+    Returns the part of a layout a group of people is in, with a margin around it.
+
+    Args:
+        layout (Layout): The positions.
+        people (list): The people.
+
+    Returns:
+        tuple: (left, top, width, height) in the picture.
+    """
+    boxes = [layout.box(person) for person in people]
+    left = min(x - width / 2 for x, _, width in boxes) - MARGIN
+    right = max(x + width / 2 for x, _, width in boxes) + MARGIN
+    top = layout.height - max(y for _, y, _ in boxes) - BOX_HEIGHT / 2 - MARGIN
+    bottom = layout.height - min(y for _, y, _ in boxes) + BOX_HEIGHT / 2 + MARGIN
+    return left, top, right - left, bottom - top
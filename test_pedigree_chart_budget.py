@@ -0,0 +1,26 @@
+"""
+Tests for budgets.
+"""
+
+import contextlib
+import io
+import os
+import pytest
+from pedigree_chart_budget import STATM, Budget, memory_used
+from pedigree_chart_expand_tree import expand_tree, make_initial_tree
+
+
+def test_memory_limit_is_not_a_one_way_stop():
+    if not os.path.exists(STATM):
+        pytest.skip('The memory the process is using now can not be read on this system.')
+    size = 200 * 1024 * 1024
+    buffer = bytearray(b'x') * size
+    peak = memory_used()
+    del buffer
+    # The memory that was given back is not counted any more,
+    assert memory_used() < peak - size // 2
+    # so a run with a limit under the old peak is not stopped by it.
+    budget = Budget(max_memory=peak - size // 4)
+    with contextlib.redirect_stdout(io.StringIO()):
+        expand_tree(make_initial_tree(0, seed=1), 4, seed=1, budget=budget)
+    assert budget.stopped is None
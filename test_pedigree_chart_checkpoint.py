@@ -0,0 +1,92 @@
+"""
+Tests for checkpoints and resuming expand_tree runs.
+"""
+
+import contextlib
+import io
+import pedigree_chart_expand_tree
+from pedigree_chart_budget import Budget, legit_only
+from pedigree_chart_checkpoint import Checkpoint, resume_tree
+from pedigree_chart_expand_tree import expand_tree, make_initial_tree
+from pedigree_chart_ids import reset_ids
+
+
+class Stop(Exception):
+    pass
+
+
+class StopAfter:
+    """
+    A sink that stops the run after some generations, as if the process had been killed.
+    """
+
+    def __init__(self, generations):
+        self.generations = generations
+
+    def write_generation(self, people):
+        self.generations = self.generations - 1
+        if self.generations < 0:
+            raise Stop()
+
+    def flush(self):
+        pass
+
+
+def quietly(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def test_resume_keeps_the_frontier_without_going_through_the_tree(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'run.ckpt')
+    reset_ids()
+    whole = quietly(expand_tree, make_initial_tree(0, seed=1), 5, seed=1)
+    reset_ids()
+    tree = quietly(make_initial_tree, 0, seed=1)
+    try:
+        quietly(expand_tree, tree, 5, seed=1, checkpoint=Checkpoint(filename), sink=StopAfter(3))
+    except Stop:
+        pass
+    reset_ids()
+
+    def split_dict(fam_dict):
+        raise AssertionError('The tree was gone through to find the frontier.')
+
+    monkeypatch.setattr(pedigree_chart_expand_tree, 'split_dict', split_dict)
+    resumed = quietly(resume_tree, filename)
+    assert list(resumed) == list(whole)
+    assert list(resumed.frontier) == list(whole.frontier)
+
+
+def test_resume_keeps_the_budget(tmp_path):
+    filename = str(tmp_path / 'run.ckpt')
+    reset_ids()
+    whole = quietly(expand_tree, make_initial_tree(0, seed=1), 5, seed=1, budget=Budget(policies=[legit_only]))
+    reset_ids()
+    tree = quietly(make_initial_tree, 0, seed=1)
+    try:
+        quietly(expand_tree, tree, 5, seed=1, checkpoint=Checkpoint(filename), sink=StopAfter(3),
+                budget=Budget(policies=[legit_only]))
+    except Stop:
+        pass
+    reset_ids()
+    resumed = quietly(resume_tree, filename, budget=Budget(policies=[legit_only]))
+    assert list(resumed) == list(whole)
+
+
+def test_resume_does_not_carry_on_past_the_budget(tmp_path):
+    filename = str(tmp_path / 'run.ckpt')
+    reset_ids()
+    budget = Budget(max_people=100)
+    stopped = quietly(expand_tree, make_initial_tree(0, seed=1), 8, seed=1, checkpoint=Checkpoint(filename),
+                      budget=budget)
+    assert budget.stopped == 'people'
+    reset_ids()
+    resumed = quietly(resume_tree, filename)
+    assert list(resumed) == list(stopped)
+    # With a bigger budget the run carries on, and stops again when it runs out.
+    budget = Budget(max_people=1000)
+    resumed = quietly(resume_tree, filename, budget=budget)
+    assert budget.stopped == 'people' and len(resumed) > len(stopped)
+    reset_ids()
+    assert list(quietly(resume_tree, filename)) == list(resumed)
@@ -0,0 +1,141 @@
+"""
+Tests for the lineage keys that seed every person's and relationship's random streams,
+and for the years drawn between relationships.
+"""
+
+import random
+import pedigree_chart_classes
+from pedigree_chart_classes import MARRIAGE_CHANCE, Couple, Descendant, lineage_key, lineage_path, lineage_stream
+from pedigree_chart_random import set_seed
+
+PEOPLE = 4000
+MARRIAGE_AGE = 16
+DEATH = 60
+MARRIAGE_YEARS = 12
+
+
+def make_person(person_id, parents):
+    return Descendant.restore(person_id, 'Oda', 'Stark', 0, 0, 0, 60, parents)
+
+
+def test_keys_of_tags_and_children_do_not_run_together():
+    root = make_person(1, [0, 0, True])
+    partner = make_person(2, [0, 0, True])
+    first = Couple.restore(3, root, partner, 20, 40, True, 'L1')
+    tenth = Couple.restore(4, root, partner, 30, 40, True, 'L10')
+    root.add_marriage(first)
+    root.add_marriage(tenth)
+    kid = make_person(5, first)
+    first.add_kid(kid)
+    # The first child of the marriage L1 and the marriage L10 have the same lineage path,
+    assert lineage_path(kid) == tenth.label == '0L10'
+    # but not the same key, so they do not draw the same numbers.
+    assert lineage_key(kid) == '0/L1.0'
+    assert lineage_key(tenth) == '0/L10'
+    set_seed(7)
+    try:
+        assert lineage_stream(kid, 'couple').random() != lineage_stream(tenth, 'couple').random()
+    finally:
+        set_seed(None)
+
+
+def chi_square(first, second, bins):
+    """
+    Returns the two sample chi-square statistic of the counts of two lists of years, in bins of years.
+    """
+    total = 0.0
+    for low, high in bins:
+        a = sum(low <= year < high for year in first)
+        b = sum(low <= year < high for year in second)
+        if a + b > 0:
+            total = total + (a * len(second) - b * len(first)) ** 2 / (len(first) * len(second) * (a + b))
+    return total
+
+
+def next_year(rng, chance, begin, death):
+    """
+    The reference: goes through the years one at a time, with a chance of a relationship in each.
+    """
+    for year in range(begin, death):
+        if rng.random() < chance:
+            return year
+    return death
+
+
+def legit_years_by_year(rng):
+    years = []
+    count_begin = MARRIAGE_AGE
+    while count_begin < DEATH:
+        # A run of years with no marriage in it is gone through again until there is one.
+        year = DEATH
+        while year == DEATH:
+            year = next_year(rng, MARRIAGE_CHANCE, count_begin, DEATH)
+        while year < DEATH:
+            years.append(year)
+            count_begin = max(year + MARRIAGE_YEARS, year + 1)
+            year = next_year(rng, MARRIAGE_CHANCE, year + 1, DEATH)
+    return years
+
+
+def illegit_years_by_year(rng, gender):
+    years = []
+    if (rng.randint(0, 4) == 0 and gender == 0) or (rng.randint(0, 15) == 0 and gender == 1):
+        partner_count = rng.randint(1, 6)
+        year = MARRIAGE_AGE - 1
+        while partner_count > 0:
+            chance = 1 / (31 - partner_count + len(years))
+            year = next_year(rng, chance, year + 1, DEATH)
+            if year >= DEATH:
+                break
+            years.append(year)
+            partner_count = partner_count - 1
+    return years
+
+
+def drawn_years(monkeypatch, method, seed, gender=0):
+    """
+    Returns the years of the relationships that a Descendant method makes for many people.
+    """
+    rng = random.Random(seed)
+    partner = make_person(0, [0, 0, True])
+
+    def partnership(descendant, begin, legit, label, vectorized=False, market=None):
+        couple = Couple.restore(0, descendant, partner, begin, begin + MARRIAGE_YEARS, legit, label)
+        descendant.add_marriage(couple)
+        return couple
+
+    monkeypatch.setattr(pedigree_chart_classes, 'generate_partnership', partnership)
+    monkeypatch.setattr(pedigree_chart_classes, 'lineage_stream', lambda owner, purpose: rng)
+    people = []
+    for person_id in range(PEOPLE):
+        person = Descendant.restore(person_id, 'Oda', 'Stark', gender, 0, 0, DEATH, [0, 0, True])
+        people.append(list(getattr(person, method)(MARRIAGE_AGE)))
+    return people
+
+
+def test_legit_marriage_years_match_the_year_by_year_draw(monkeypatch):
+    drawn = drawn_years(monkeypatch, 'legit_marriage_years', 1)
+    rng = random.Random(2)
+    reference = [legit_years_by_year(rng) for _ in range(PEOPLE)]
+    counts = sum(len(years) for years in drawn), sum(len(years) for years in reference)
+    assert abs(counts[0] - counts[1]) < 0.03 * counts[1]
+    # The years of the first marriages have the same distribution: 9 bins, 8 degrees of freedom,
+    # and 26.1 is the 99.9th percentile.
+    bins = [(year, year + 5) for year in range(MARRIAGE_AGE, DEATH, 5)]
+    first = [years[0] for years in drawn], [years[0] for years in reference]
+    assert chi_square(first[0], first[1], bins) < 26.1
+    # So do the numbers of marriages each person has.
+    numbers = [len(years) for years in drawn], [len(years) for years in reference]
+    assert chi_square(numbers[0], numbers[1], [(1, 2), (2, 3), (3, 4), (4, 5), (5, 99)]) < 18.5
+
+
+def test_illegit_marriage_years_match_the_year_by_year_draw(monkeypatch):
+    for gender in (0, 1):
+        drawn = drawn_years(monkeypatch, 'illegit_marriage_years', 3, gender)
+        rng = random.Random(4)
+        reference = [illegit_years_by_year(rng, gender) for _ in range(PEOPLE)]
+        counts = sum(len(years) for years in drawn), sum(len(years) for years in reference)
+        assert abs(counts[0] - counts[1]) < 0.1 * counts[1]
+        bins = [(year, year + 11) for year in range(MARRIAGE_AGE, DEATH, 11)]
+        first = [years[0] for years in drawn if years], [years[0] for years in reference if years]
+        assert chi_square(first[0], first[1], bins) < 16.3
@@ -0,0 +1,52 @@
+"""
+Tests for the columnar population store.
+"""
+
+import contextlib
+import io
+from pedigree_chart_classes import Couple
+from pedigree_chart_columns import ROOT, Population
+from pedigree_chart_expand_tree import expand_tree, make_initial_tree
+from pedigree_chart_subgraph import neighbourhood
+
+
+def make_tree(generations=4, seed=1):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return expand_tree(make_initial_tree(0, seed=seed), generations, seed=seed)
+
+
+def test_partial_tree_without_parents():
+    tree = make_tree()
+    frontier = dict(tree.frontier)
+    population = Population.from_tree(frontier)
+    assert len(population) == len(frontier)
+    for person_id, person in frontier.items():
+        view = population[person_id]
+        # The parents are not in the tree, but the person keeps their label.
+        assert population.people['parents'][population._index[person_id]] == ROOT
+        assert view.label == person.label
+        assert view.name == person.name and view.death == person.death
+
+
+def test_neighbourhood_with_children_before_parents():
+    tree = make_tree()
+    subject = next(person for person in tree.values()
+                   if len(person.marriages) > 0 and isinstance(person.parents, Couple))
+    people, _ = neighbourhood(tree, subject.id, 'both', 2)
+    population = Population.from_tree(people)
+    for person_id, person in people.items():
+        if person_id in population:
+            assert population[person_id].label == person.label
+    # The subject's parents are added after the subject, and are joined to them.
+    view = population[subject.id]
+    assert view.parents.partner1.id == subject.parents.partner1.id
+    assert subject.id in [kid.id for kid in view.parents.kids]
+
+
+def test_tree_that_was_not_kept():
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree = expand_tree(make_initial_tree(0, seed=2), 4, seed=2, keep=False)
+    population = Population.from_tree(tree)
+    assert len(population) == len(tree)
+    for person_id, person in tree.items():
+        assert population[person_id].label == person.label
@@ -0,0 +1,52 @@
+"""
+Tests for the frontier index of a FamilyTree.
+"""
+
+import contextlib
+import io
+from pedigree_chart_csv import make_csv, read_csv
+from pedigree_chart_expand_tree import FamilyTree, expand_tree, make_initial_tree, split_dict
+from pedigree_chart_snapshot import read_snapshot, write_snapshot
+
+
+def quietly(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def unmarried(fam_dict):
+    return set(split_dict(fam_dict)[1])
+
+
+def test_loaders_keep_the_frontier(tmp_path):
+    tree = quietly(expand_tree, make_initial_tree(0, seed=1), 4, seed=1)
+    quietly(make_csv, str(tmp_path / 'tree.csv'), tree)
+    quietly(write_snapshot, str(tmp_path / 'tree.snap'), tree)
+    for load, filename in ((read_csv, 'tree.csv'), (read_snapshot, 'tree.snap')):
+        loaded = quietly(make_initial_tree, 0)
+        quietly(load, str(tmp_path / filename), loaded)
+        assert set(loaded.frontier) == unmarried(loaded)
+        assert len(loaded.frontier) > 1
+        size = len(loaded)
+        quietly(expand_tree, loaded, 2)
+        assert len(loaded) > size + 1
+
+
+def test_mutators_keep_the_frontier():
+    tree = quietly(expand_tree, make_initial_tree(0, seed=2), 3, seed=2)
+    people = dict(tree)
+    copy = FamilyTree()
+    copy.update(people)
+    assert set(copy.frontier) == unmarried(copy)
+    married = next(key for key, person in people.items() if len(person.marriages) > 0)
+    single = next(iter(tree.frontier))
+    copy.pop(single)
+    copy.pop(married)
+    assert single not in copy.frontier
+    copy.setdefault(single, people[single])
+    copy |= {married: people[married]}
+    assert set(copy.frontier) == unmarried(copy)
+    key, _ = copy.popitem()
+    assert key not in copy.frontier
+    copy.clear()
+    assert copy.frontier == {}
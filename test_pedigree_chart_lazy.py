@@ -0,0 +1,61 @@
+"""
+Tests for the lazy tree.
+"""
+
+import contextlib
+import io
+import re
+from pedigree_chart_display import make_dot, print_instructions
+from pedigree_chart_expand_tree import expand_tree, make_initial_tree
+from pedigree_chart_lazy import LazyTree
+from pedigree_chart_random import set_seed
+
+
+def make_lazy(capacity, seed=1):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree = make_initial_tree(0, seed=seed)
+    return LazyTree(tree, 4, capacity=capacity)
+
+
+def render(fam_dict):
+    output = io.StringIO()
+    make_dot(output, fam_dict)
+    return output.getvalue()
+
+
+def missing_boxes(text):
+    """
+    Returns the people that connections lead to, but that have no box.
+    """
+    boxes = set(re.findall(r'^(\d+) \[label=', text, re.MULTILINE))
+    ends = set(re.findall(r'(?:^|->)\s*(\d+)\s*(?=;|->)', text, re.MULTILINE))
+    return ends - boxes
+
+
+def test_render_matches_the_eager_tree():
+    lazy = render(make_lazy(50))
+    assert missing_boxes(lazy) == set()
+    with contextlib.redirect_stdout(io.StringIO()):
+        eager = render(expand_tree(make_initial_tree(0, seed=1), 4, seed=1))
+    set_seed(None)
+    # The IDs are different, but the boxes are the same.
+    boxes = lambda text: sorted(re.sub(r'^\d+ ', '', line) for line in text.split('\n') if 'label=" ' in line)
+    assert boxes(lazy) == boxes(eager)
+
+
+def test_evicting_tree_works_with_print_instructions():
+    for seed in (1, 2, 3):
+        for capacity in (1, 5):
+            lazy = make_lazy(capacity, seed)
+            # Looking people up first evicts and regenerates lineages before the tree is printed.
+            for label in list(lazy)[::7]:
+                lazy[label]
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                print_instructions(lazy)
+            text = output.getvalue()
+            # Every box is written once, however often its lineage was generated.
+            boxes = re.findall(r'^(\d+) \[label=', text, re.MULTILINE)
+            assert len(boxes) == len(set(boxes)) > len(lazy) // 2
+            assert missing_boxes(text) == set()
+    set_seed(None)
@@ -0,0 +1,50 @@
+"""
+Tests for binary snapshots.
+"""
+
+import contextlib
+import io
+import pytest
+from pedigree_chart_csv import make_csv, read_csv
+from pedigree_chart_expand_tree import expand_tree, make_initial_tree, release
+from pedigree_chart_snapshot import Snapshot, snapshot_to_csv, write_snapshot
+
+
+def test_close_with_live_column(tmp_path):
+    pytest.importorskip('numpy')
+    filename = str(tmp_path / 'tree.snap')
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree = expand_tree(make_initial_tree(0, seed=1), 4, seed=1)
+        write_snapshot(filename, tree)
+    with Snapshot(filename) as snapshot:
+        births = snapshot.column('birth')
+        legit = snapshot.column('legit', 'couples')
+        expected = [snapshot.person(person_id).birth for person_id in snapshot.column('id')]
+    # Leaving the block does not fail, and the columns still read from the file.
+    assert births.tolist() == expected
+    assert len(legit) == snapshot.couple_count
+    # Closing again does nothing.
+    snapshot.close()
+
+
+def test_partial_tree_round_trip(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree = expand_tree(make_initial_tree(0, seed=1), 4, seed=1)
+    # The frontier without its parents, and the same people once they have been released from them.
+    orphaned = dict(tree.frontier)
+    released = dict(tree.frontier)
+    release(released.values())
+    for partial in (orphaned, released):
+        written = str(tmp_path / 'written.csv')
+        converted = str(tmp_path / 'converted.csv')
+        with contextlib.redirect_stdout(io.StringIO()):
+            make_csv(written, partial)
+            write_snapshot(str(tmp_path / 'tree.snap'), partial)
+            snapshot_to_csv(str(tmp_path / 'tree.snap'), converted)
+        with open(written) as first, open(converted) as second:
+            assert first.read() == second.read()
+        # Everyone is read back as a descendant, not as a partner.
+        loaded = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            read_csv(written, loaded)
+        assert sorted(loaded) == sorted(partial)